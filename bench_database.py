@@ -0,0 +1,81 @@
+"""
+Benchmark accesso database: callback concorrenti al secondo
+
+Confronta le query sincrone chiamate dentro le coroutine (comportamento
+precedente, blocca l'event loop) con le versioni awaitable di database_async.
+Ogni "callback" simulata esegue le stesse letture di un click sul menu
+trasporti: utente, config, zone e prossimi orari bus.
+
+Richiede le variabili d'ambiente Supabase (.env). Esegue solo letture.
+
+Uso:
+    python bench_database.py [numero_callback]
+"""
+import asyncio
+import sys
+import time
+
+import database
+import database_async
+from config import ADMIN_CHAT_ID
+
+
+def _callback_sync():
+    database.get_user(ADMIN_CHAT_ID)
+    database.get_config()
+    database.get_zone_attive()
+    database.get_prossimi_orari_bus("23A", "Punta Sabbioni", limit=3)
+
+
+async def callback_bloccante():
+    """Callback come prima: query sincrone dentro la coroutine"""
+    _callback_sync()
+
+
+async def callback_async():
+    """Callback con database_async: l'event loop resta libero"""
+    await database_async.get_user(ADMIN_CHAT_ID)
+    await database_async.get_config()
+    await database_async.get_zone_attive()
+    await database_async.get_prossimi_orari_bus("23A", "Punta Sabbioni", limit=3)
+
+
+async def _misura_lag(stop: asyncio.Event, risultati: list):
+    """Misura il ritardo massimo dell'event loop (tick ogni 10ms)"""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        risultati.append(time.perf_counter() - t0 - 0.01)
+
+
+async def _esegui(nome: str, callback, n: int):
+    stop = asyncio.Event()
+    lag = []
+    ticker = asyncio.create_task(_misura_lag(stop, lag))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(callback() for _ in range(n)))
+    durata = time.perf_counter() - t0
+
+    stop.set()
+    await ticker
+
+    lag_max = max(lag) * 1000 if lag else durata * 1000
+    print(f"{nome:<12} {n} callback in {durata:.2f}s  "
+          f"-> {n / durata:.1f} callback/s  (lag max event loop: {lag_max:.0f} ms)")
+
+
+async def main(n: int):
+    # Riscalda connessioni e cache prima di misurare
+    _callback_sync()
+    await callback_async()
+
+    await _esegui("bloccante", callback_bloccante, n)
+    await _esegui("async", callback_async, n)
+
+    database_async.shutdown()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    asyncio.run(main(n))
@@ -0,0 +1,195 @@
+"""
+Micro-benchmark estrazione farmacia di turno su pagine HTML salvate
+
+Verifica offline correttezza e velocità del parser (farmacie_parser) sulle
+pagine in fixtures/farmacie/, confrontandolo con l'estrazione precedente
+(regex ricompilate e più passate per blocco).
+
+Uso:
+    python bench_farmacie.py                # verifica + benchmark
+    python bench_farmacie.py --aggiorna     # scarica le pagine attuali nelle fixture
+    python bench_farmacie.py --scrivi-attesi  # rigenera fixtures/farmacie/attesi.json
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import asdict
+
+import farmacie_parser
+from farmacie_api import COMUNI, Farmacia, _extract_farmacia_turno, _get_coordinates, _parse_telefono
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "farmacie")
+ATTESI_PATH = os.path.join(FIXTURE_DIR, "attesi.json")
+
+# Nome file fixture -> comune
+FIXTURE = {
+    "cavallino_treporti.html": "Cavallino-Treporti",
+    "jesolo.html": "Jesolo",
+}
+
+
+def _estrai_precedente(html: str, comune_nome: str):
+    """Estrazione precedente, mantenuta come riferimento per correttezza e tempi"""
+    turno_indicators = [
+        r'Turno[:\s]+', r'fino a domani', r'tutto il giorno', r'Tutto il giorno', r'TURNO',
+        r'notturno', r'Notturno', r'0:00\s*-', r'24\s*ore', r'h\s*24',
+    ]
+    turno_pattern = '|'.join(turno_indicators)
+    blocks = re.split(r'(?=FARMACIA\s+[A-Z])', html, flags=re.IGNORECASE)
+
+    for block in blocks:
+        if not re.search(r'FARMACIA', block, re.IGNORECASE):
+            continue
+        if not re.search(turno_pattern, block, re.IGNORECASE):
+            continue
+
+        nome_match = re.search(r'(FARMACIA\s+[A-Z][A-Za-z\s\']+?)(?:<|,|\(|\d{5})', block, re.IGNORECASE)
+        if not nome_match:
+            nome_match = re.search(r'(FARMACIA\s+[A-Z][A-Za-z\s\']{2,20})', block, re.IGNORECASE)
+        if not nome_match:
+            continue
+        nome = re.sub(r'\s+', ' ', nome_match.group(1).strip())
+
+        indirizzo = ""
+        # Con la stessa correzione della sigla maiuscola di farmacie_parser
+        ind_match = re.search(
+            r'((?:Via|Viale|Piazza|P\.?zza|Corso|Largo)\s+[^<,]+?(?:,\s*\d+)?)\s*[-–]?\s*(?:\d{5}|\b(?-i:[A-Z]{2,})\b)',
+            block, re.IGNORECASE
+        )
+        if ind_match:
+            indirizzo = re.sub(r'\s+', ' ', ind_match.group(1).strip())
+
+        telefono = ""
+        tel_match = re.search(r'(?:Tel[:\s]*|📞\s*)?(\d{10,11}|\d{3,4}[\s\-]?\d{6,7})', block)
+        if tel_match:
+            telefono = _parse_telefono(tel_match.group(1))
+
+        turno_info = ""
+        turno_match = re.search(r'(Turno[:\s]+[^<]+?)(?:<|\n|$)', block, re.IGNORECASE)
+        if turno_match:
+            turno_info = turno_match.group(1).strip()
+        else:
+            orario_match = re.search(r'(\d{1,2}[:.]\d{2}\s*[-–]\s*\d{1,2}[:.]\d{2}[^<]*fino a domani[^<]*)', block, re.IGNORECASE)
+            if orario_match:
+                turno_info = orario_match.group(1).strip()
+
+        orario = ""
+        orario_match = re.search(r'(\d{1,2}[:.]\d{2}\s*[-–]\s*\d{1,2}[:.]\d{2})', block)
+        if orario_match:
+            orario = orario_match.group(1).replace('.', ':')
+        if turno_info:
+            orario = turno_info
+
+        lat, lon = _get_coordinates(comune_nome)
+        if nome:
+            return Farmacia(
+                nome=nome, indirizzo=indirizzo or comune_nome, telefono=telefono,
+                orario=orario or "Di turno", comune=comune_nome, turno_info=turno_info,
+                lat=lat, lon=lon
+            )
+    return None
+
+
+def _carica_fixture() -> dict:
+    pagine = {}
+    for nome_file, comune in FIXTURE.items():
+        path = os.path.join(FIXTURE_DIR, nome_file)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                pagine[nome_file] = (comune, f.read())
+    return pagine
+
+
+def _misura(funzione, pagine: dict, ripetizioni: int) -> float:
+    """Microsecondi medi per pagina"""
+    t0 = time.perf_counter()
+    for _ in range(ripetizioni):
+        for comune, html in pagine.values():
+            funzione(html, comune)
+    return (time.perf_counter() - t0) / (ripetizioni * len(pagine)) * 1e6
+
+
+def _senza_memo(html: str, comune: str):
+    farmacie_parser._memo.clear()
+    return _extract_farmacia_turno(html, comune)
+
+
+def verifica(pagine: dict) -> bool:
+    """Confronta il parser con i risultati attesi e con l'estrazione precedente"""
+    attesi = {}
+    if os.path.exists(ATTESI_PATH):
+        with open(ATTESI_PATH, "r", encoding="utf-8") as f:
+            attesi = json.load(f)
+
+    ok = True
+    for nome_file, (comune, html) in pagine.items():
+        nuovo = _senza_memo(html, comune)
+        precedente = _estrai_precedente(html, comune)
+        nuovo_dict = asdict(nuovo) if nuovo else None
+        esito = nuovo == precedente and (nome_file not in attesi or attesi[nome_file] == nuovo_dict)
+        ok = ok and esito
+        print(f"{'OK ' if esito else 'ERR'} {nome_file}: {nuovo.nome if nuovo else 'nessuna farmacia di turno'}")
+    return ok
+
+
+def scrivi_attesi(pagine: dict):
+    attesi = {}
+    for nome_file, (comune, html) in pagine.items():
+        farmacia = _senza_memo(html, comune)
+        attesi[nome_file] = asdict(farmacia) if farmacia else None
+    with open(ATTESI_PATH, "w", encoding="utf-8") as f:
+        json.dump(attesi, f, ensure_ascii=False, indent=2)
+    print(f"Scritto {ATTESI_PATH}")
+
+
+async def aggiorna_fixture():
+    """Scarica le pagine attuali di farmaciediturno.org nelle fixture"""
+    from farmacie_api import _fetch_html
+    from http_clients import close
+
+    codici = {comune: cod for comune, cod in COMUNI.items()}
+    for nome_file, comune in FIXTURE.items():
+        html = await _fetch_html(codici[comune])
+        if html:
+            with open(os.path.join(FIXTURE_DIR, nome_file), "w", encoding="utf-8") as f:
+                f.write(html)
+            print(f"Salvata {nome_file} ({len(html)} caratteri)")
+        else:
+            print(f"Impossibile scaricare {comune}")
+    await close()
+
+
+def main():
+    if "--aggiorna" in sys.argv:
+        asyncio.run(aggiorna_fixture())
+        return
+
+    pagine = _carica_fixture()
+    if not pagine:
+        print(f"Nessuna fixture in {FIXTURE_DIR}")
+        sys.exit(1)
+
+    if "--scrivi-attesi" in sys.argv:
+        scrivi_attesi(pagine)
+        return
+
+    print("=== CORRETTEZZA ===")
+    ok = verifica(pagine)
+
+    ripetizioni = 2000
+    print("\n=== VELOCITÀ (µs per pagina) ===")
+    t_precedente = _misura(_estrai_precedente, pagine, ripetizioni)
+    t_parser = _misura(_senza_memo, pagine, ripetizioni)
+    t_memo = _misura(_extract_farmacia_turno, pagine, ripetizioni)
+    print(f"precedente:        {t_precedente:8.1f}")
+    print(f"parser:            {t_parser:8.1f}  (x{t_precedente / t_parser:.1f})")
+    print(f"parser + memo:     {t_memo:8.1f}  (x{t_precedente / t_memo:.1f})")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
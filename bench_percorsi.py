@@ -0,0 +1,124 @@
+"""
+Benchmark journey planner (percorsi.py) su tutte le coppie zona × destinazione
+
+Per ogni zona di partenza e destinazione calcola le prossime 3 partenze a orari
+diversi della giornata (feriale e festivo), controlla la coerenza dei percorsi
+(tratte in sequenza, tempo di cambio rispettato) e riporta i tempi per query.
+
+Di default legge orari_bus e fermate_bus da Supabase (.env, solo letture).
+Con --sintetico usa un orario generato, senza database.
+
+Uso:
+    python bench_percorsi.py
+    python bench_percorsi.py --sintetico
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+import orari_index
+import percorsi
+
+# Orari di partenza provati per ogni coppia
+ORE = [f"{h:02d}:{m:02d}" for h in range(5, 24) for m in (0, 30)]
+
+
+def _carica_sintetico():
+    """Orario generato: corse bus ogni 30 min, traghetti ogni 30/60 min"""
+    tratte_bus = {
+        "23A": [("Cavallino", 0), ("Ca' Ballarin", 8), ("Ca' Vio", 12), ("Ca' Pasquali", 16), ("Ca' Savio", 22), ("Punta Sabbioni", 28)],
+        "23B": [("Cavallino", 0), ("Ca' Ballarin", 10), ("Ca' Vio", 15), ("Ca' Pasquali", 20), ("Ca' Savio", 27), ("Punta Sabbioni", 35)],
+        "96": [("Cavallino", 0), ("Ca' Pasquali", 14), ("Ca' Savio", 20), ("Punta Sabbioni", 26)],
+    }
+    fermate = [
+        {"linea_codice": linea, "nome": nome, "ordine": i, "tempo_da_capolinea": t}
+        for linea, tratta in tratte_bus.items() for i, (nome, t) in enumerate(tratta)
+    ]
+
+    def corse(linea, fermata, direzione, tipo, inizio, fine, passo):
+        return [
+            {"linea_codice": linea, "fermata_nome": fermata, "direzione": direzione,
+             "tipo_giorno": tipo, "ora": f"{m // 60:02d}:{m % 60:02d}:00"}
+            for m in range(inizio, fine, passo)
+        ]
+
+    righe = []
+    for linea, tratta in tratte_bus.items():
+        fine = tratta[-1][1]
+        for nome, t in tratta:
+            righe += corse(linea, nome, "andata", "fF", 5 * 60 + 20 + t, 23 * 60, 30)
+            righe += corse(linea, nome, "ritorno", "fF", 5 * 60 + 40 + fine - t, 23 * 60 + 30, 30)
+
+    # Traghetti: nessuna riga in fermate_bus, orari a ogni fermata come in orari_bus
+    tratte_traghetto = {
+        "12": ([("Punta Sabbioni", 0), ("Treporti", 10), ("Burano", 30), ("Mazzorbo", 33), ("Murano Faro", 40), ("Fondamente Nove", 45)],
+               "fF", 6 * 60 + 10, 6 * 60 + 40, 22 * 60, 60),
+        "14": ([("Punta Sabbioni", 0), ("Lido S.M.E.", 15), ("San Marco", 30)], "fF", 6 * 60, 6 * 60 + 15, 24 * 60, 30),
+        "15": ([("Punta Sabbioni", 0), ("San Marco", 30)], "f", 7 * 60, 7 * 60 + 40, 19 * 60, 60),
+    }
+    for linea, (tratta, tipo, andata, ritorno, fine_giorno, passo) in tratte_traghetto.items():
+        fine = tratta[-1][1]
+        for nome, t in tratta:
+            righe += corse(linea, nome, "andata", tipo, andata + t, fine_giorno - fine + t, passo)
+            righe += corse(linea, nome, "ritorno", tipo, ritorno + fine - t, fine_giorno - t, passo)
+
+    per_tipo, per_fermata = orari_index._costruisci(righe)
+    per_nome, ordinate, offset = orari_index._costruisci_fermate(fermate)
+    orari_index._indice = dict(orari_index._indice, per_tipo=per_tipo, per_fermata=per_fermata,
+                               righe=len(righe), loaded_at=time.time())
+    orari_index._fermate = dict(orari_index._fermate, per_nome=per_nome, ordinate=ordinate,
+                                offset=offset, righe=len(fermate), loaded_at=time.time())
+
+
+def _coerente(risultato: dict) -> bool:
+    tratte = risultato["tratte"]
+    for prima, dopo in zip(tratte, tratte[1:]):
+        if prima["a"] != dopo["da"] or dopo["partenza_min"] < prima["arrivo_min"] + percorsi.CAMBIO_MINUTI:
+            return False
+    return all(t["arrivo_min"] > t["partenza_min"] for t in tratte)
+
+
+def main():
+    if "--sintetico" in sys.argv:
+        _carica_sintetico()
+    elif not (orari_index.carica() and orari_index.carica_fermate()):
+        print("Impossibile caricare orari_bus/fermate_bus")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    percorsi.costruisci()
+    print(f"Rete: {percorsi.get_stats()}  costruita in {(time.perf_counter() - t0) * 1000:.1f} ms\n")
+
+    # Un lunedì e una domenica
+    oggi = date.today()
+    feriale = oggi + timedelta(days=(7 - oggi.weekday()) % 7)
+    festivo = feriale + timedelta(days=6)
+
+    tempi = []
+    errori = 0
+    print(f"{'zona':<16}{'destinazione':<14}{'trovati':>8}  esempio (08:00 feriale)")
+    for zona, origine in percorsi.ZONA_FERMATA.items():
+        for dest, arrivo in percorsi.DESTINAZIONE_FERMATA.items():
+            trovati = 0
+            for giorno in (feriale, festivo):
+                for ora in ORE:
+                    t = time.perf_counter()
+                    risultati = percorsi.prossimi_percorsi(origine, arrivo, ora, 3, giorno=giorno)
+                    tempi.append(time.perf_counter() - t)
+                    trovati += len(risultati)
+                    errori += sum(1 for r in risultati if not _coerente(r))
+
+            esempio = percorsi.prossimi_percorsi(origine, arrivo, "08:00", 1, giorno=feriale)
+            desc = " → ".join(f"{t['linea']} {t['partenza']}-{t['arrivo']}" for t in esempio[0]["tratte"]) if esempio else "-"
+            print(f"{zona:<16}{dest:<14}{trovati:>8}  {desc}")
+
+    tempi.sort()
+    n = len(tempi)
+    print(f"\n{n} query (3 partenze ciascuna): media {sum(tempi) / n * 1000:.3f} ms, "
+          f"p95 {tempi[int(n * 0.95)] * 1000:.3f} ms, max {tempi[-1] * 1000:.3f} ms")
+    print(f"Percorsi incoerenti: {errori}")
+    sys.exit(1 if errori else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Benchmark routing callback_data: trie di router.py contro la vecchia catena if/elif
+
+La catena di action_menu (==, startswith, replace, split e re.match compilate ad
+ogni chiamata) è riprodotta qui solo per la parte di riconoscimento, senza
+chiamare gli handler. Su un mix realistico di click (molti trasporti, poi eventi,
+idee e menu) misura il tempo medio per callback e controlla che le due versioni
+scelgano lo stesso handler con gli stessi parametri.
+
+Importa handlers.py (serve l'ambiente del bot: .env, python-telegram-bot),
+non fa query né chiamate Telegram.
+
+Uso:
+    python bench_router.py [ripetizioni]
+"""
+import random
+import sys
+import time
+
+import handlers
+
+# (callback_data, peso) - distribuzione indicativa dei click
+MIX = [
+    ("menu_trasporti", 8), ("tras_arrivo", 5), ("tras_dest_3", 6),
+    ("tras_percorso_3_2_23A", 6), ("tras_viaggio_3_2_23A_14-30", 5),
+    ("tras_orari_3_2_23A_now", 5), ("tras_dep_3_2_23A_1_14-30", 4),
+    ("tras_fraz_viaggio_1_4_96_30", 4), ("tras_fraz_quando_1_4_96", 3),
+    ("tras_fraz_linea_1_4", 3), ("tras_fraz_1_4", 3), ("tras_frazione", 2),
+    ("tras_ferry_orari_punta_sabbioni_andata", 3), ("tras_ferry_dest_burano", 2),
+    ("tras_bus_linea_5", 2), ("tras_prezzi_op_2", 1), ("tras_fermata_3_2", 2),
+    ("tras_orario_custom_3_2_23A", 1), ("tras_ritorno_3_2", 1),
+    ("menu_eventi", 5), ("evt_oggi", 4), ("evt_list_sett_0_p2", 3),
+    ("evt_cat_musica_p1", 2), ("evt_detail_412", 3), ("evt_cal_2026_7", 2),
+    ("evt_cal_giorno_2026_7_14", 2), ("noop", 1),
+    ("menu_meteo", 6), ("menu_mare", 3), ("menu_idee", 3), ("idee_spiaggia_cavallino", 2),
+    ("idee_laguna_burano", 1), ("fort_detail_forte_vecchio", 1),
+    ("menu_sos_farmacie", 2), ("menu_back", 4),
+]
+
+
+def _parti(callback_data: str, prefisso: str) -> list:
+    return callback_data.replace(prefisso, "").split("_")
+
+
+def _zona(parts: list):
+    return int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
+
+
+def catena_if(callback_data: str):
+    """Riconoscimento come la vecchia catena di action_menu: (handler, parametri) o None"""
+    import re
+
+    menu_key = callback_data.replace("menu_", "") if callback_data.startswith("menu_") else ""
+    menu = {
+        "meteo": "handle_meteo", "mare": "handle_mare", "maree": "handle_maree",
+        "idee": "handle_idee_oggi", "cosa_fare": "handle_idee_oggi", "idee_oggi": "handle_idee_oggi",
+        "pioggia": "handle_pioggia", "spiagge": "handle_spiagge", "fortini": "handle_fortini",
+        "attivita": "handle_attivita", "eventi": "handle_eventi",
+    }
+    for chiave, nome in menu.items():
+        if menu_key == chiave:
+            return nome, {}
+
+    if callback_data == "idee_spiagge":
+        return "handle_idee_spiagge", {}
+    if callback_data.startswith("idee_spiaggia_"):
+        return "handle_idee_spiaggia_dettaglio", {"spiaggia_id": callback_data.replace("idee_spiaggia_", "")}
+    if callback_data == "idee_fortini":
+        return "handle_idee_fortini", {}
+    if callback_data.startswith("idee_fortino_"):
+        return "handle_idee_fortino_dettaglio", {"fortino_id": callback_data.replace("idee_fortino_", "")}
+    if callback_data == "idee_attivita":
+        return "handle_idee_attivita", {}
+    if callback_data.startswith("idee_att_"):
+        return "handle_idee_attivita_categoria", {"categoria": callback_data.replace("idee_att_", "")}
+    if callback_data == "idee_pioggia":
+        return "handle_idee_pioggia", {}
+    if callback_data == "idee_laguna":
+        return "handle_idee_laguna", {}
+    if callback_data.startswith("idee_laguna_"):
+        return "handle_idee_laguna_dettaglio", {"luogo_id": callback_data.replace("idee_laguna_", "")}
+
+    if callback_data == "evt_home":
+        return "handle_eventi", {}
+    if callback_data in ("evt_oggi", "evt_domani", "evt_sett_0", "evt_sett_1"):
+        return "handle_eventi_lista", {"periodo": callback_data.replace("evt_", ""), "pagina": 0}
+    if callback_data.startswith("evt_list_"):
+        match = re.match(r"evt_list_(\w+)_p(\d+)", callback_data)
+        if match:
+            return "handle_eventi_lista", {"periodo": match.group(1), "pagina": int(match.group(2))}
+    if callback_data == "evt_categoria":
+        return "handle_eventi_categorie", {}
+    if callback_data.startswith("evt_cat_"):
+        match = re.match(r"evt_cat_(\w+)_p(\d+)", callback_data)
+        if match:
+            return "handle_eventi_lista", {"periodo": "sett_0", "pagina": int(match.group(2)), "categoria": match.group(1)}
+    if callback_data.startswith("evt_detail_"):
+        try:
+            return "handle_evento_dettaglio", {"evento_id": int(callback_data.replace("evt_detail_", ""))}
+        except ValueError:
+            pass
+    if callback_data == "evt_cal":
+        return "handle_eventi_calendario", {}
+    if callback_data.startswith("evt_cal_") and not callback_data.startswith("evt_cal_giorno_"):
+        match = re.match(r"evt_cal_(\d+)_(\d+)", callback_data)
+        if match:
+            return "handle_eventi_calendario", {"anno": int(match.group(1)), "mese": int(match.group(2))}
+    if callback_data.startswith("evt_cal_giorno_"):
+        match = re.match(r"evt_cal_giorno_(\d+)_(\d+)_(\d+)", callback_data)
+        if match:
+            return "handle_eventi_giorno", {"anno": int(match.group(1)), "mese": int(match.group(2)), "giorno": int(match.group(3))}
+    if callback_data == "noop":
+        return "_callback_noop", {}
+
+    if menu_key == "trasporti" or callback_data == "tras_home":
+        return "handle_trasporti", {}
+    if callback_data == "tras_arrivo":
+        return "handle_trasporti_arrivo", {}
+    if callback_data.startswith("tras_dest_"):
+        try:
+            return "handle_trasporti_zona", {"destinazione_id": int(callback_data.replace("tras_dest_", ""))}
+        except ValueError:
+            pass
+    if callback_data.startswith("tras_percorso_"):
+        try:
+            parts = _parti(callback_data, "tras_percorso_")
+            return "handle_trasporti_quando", {"destinazione_id": int(parts[0]), "zona_id": _zona(parts),
+                                               "linea_codice": parts[2] if len(parts) > 2 else "23A"}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_viaggio_"):
+        try:
+            parts = _parti(callback_data, "tras_viaggio_")
+            ora = parts[3] if len(parts) > 3 else ""
+            return "handle_trasporti_percorso", {
+                "destinazione_id": int(parts[0]), "zona_id": _zona(parts),
+                "linea_codice": parts[2] if len(parts) > 2 else "23A",
+                "ora_partenza": ora.replace("-", ":") if "-" in ora and len(ora) == 5 else None}
+        except (ValueError, IndexError):
+            pass
+    if callback_data == "tras_frazione":
+        return "handle_trasporti_frazione", {}
+    if callback_data.startswith("tras_fraz_viaggio_"):
+        try:
+            parts = _parti(callback_data, "tras_fraz_viaggio_")
+            return "handle_trasporti_frazione_viaggio", {
+                "da_zona_id": int(parts[0]), "a_zona_id": int(parts[1]), "linea_codice": parts[2],
+                "offset_minuti": int(parts[3]) if len(parts) > 3 else 0}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_fraz_quando_"):
+        try:
+            parts = _parti(callback_data, "tras_fraz_quando_")
+            return "handle_trasporti_frazione_quando", {"da_zona_id": int(parts[0]), "a_zona_id": int(parts[1]), "linea_codice": parts[2]}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_fraz_linea_"):
+        try:
+            parts = _parti(callback_data, "tras_fraz_linea_")
+            return "handle_trasporti_frazione_linea", {"da_zona_id": int(parts[0]), "a_zona_id": int(parts[1])}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_fraz_"):
+        try:
+            parts = _parti(callback_data, "tras_fraz_")
+            return "handle_trasporti_frazione_percorso", {"da_zona_id": int(parts[0]), "a_zona_id": int(parts[1]) if len(parts) > 1 else None}
+        except (ValueError, IndexError):
+            pass
+    if callback_data == "tras_bus":
+        return "handle_trasporti_bus", {}
+    if callback_data.startswith("tras_bus_linea_"):
+        try:
+            return "handle_trasporti_linea", {"linea_id": int(callback_data.replace("tras_bus_linea_", "")), "tipo": "bus"}
+        except ValueError:
+            pass
+    if callback_data == "tras_ferry":
+        return "handle_trasporti_ferry", {}
+    if callback_data.startswith("tras_ferry_linea_"):
+        try:
+            return "handle_trasporti_linea", {"linea_id": int(callback_data.replace("tras_ferry_linea_", "")), "tipo": "ferry"}
+        except ValueError:
+            pass
+    if callback_data.startswith("tras_ferry_dest_"):
+        return "handle_trasporti_ferry_destinazione", {"dest_key": callback_data.replace("tras_ferry_dest_", "")}
+    if callback_data.startswith("tras_ferry_orari_"):
+        parts = callback_data.replace("tras_ferry_orari_", "").rsplit("_", 1)
+        if len(parts) == 2:
+            return "handle_trasporti_ferry_orari", {"dest_key": parts[0], "direzione": parts[1]}
+    if callback_data.startswith("tras_ferry_info_"):
+        return "handle_trasporti_ferry_info", {"dest_key": callback_data.replace("tras_ferry_info_", "")}
+    if callback_data == "tras_prezzi":
+        return "handle_trasporti_prezzi", {}
+    if callback_data.startswith("tras_prezzi_op_"):
+        try:
+            return "handle_trasporti_prezzi_operatore", {"operatore_id": int(callback_data.replace("tras_prezzi_op_", ""))}
+        except ValueError:
+            pass
+    if callback_data.startswith("tras_orari_"):
+        try:
+            parts = _parti(callback_data, "tras_orari_")
+            ora = parts[3] if len(parts) > 3 else ""
+            return "handle_trasporti_orari", {
+                "destinazione_id": int(parts[0]), "zona_id": _zona(parts),
+                "linea_codice": parts[2] if len(parts) > 2 else "23A",
+                "ora_partenza": ora.replace("-", ":") if "-" in ora else None}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_dep_"):
+        try:
+            parts = _parti(callback_data, "tras_dep_")
+            if len(parts) > 4:
+                return "handle_trasporti_dep_select", {
+                    "destinazione_id": int(parts[0]), "zona_id": _zona(parts), "linea_codice": parts[2],
+                    "dep_index": int(parts[3]), "ora_partenza": parts[4].replace("-", ":") if "-" in parts[4] else None}
+            return "handle_trasporti_dep_select", {
+                "destinazione_id": int(parts[0]), "zona_id": _zona(parts), "linea_codice": "23A",
+                "dep_index": int(parts[2]) if len(parts) > 2 else 0}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_ritorno_"):
+        try:
+            parts = _parti(callback_data, "tras_ritorno_")
+            return "handle_trasporti_ritorno", {"destinazione_id": int(parts[0]), "zona_id": _zona(parts)}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_orario_custom_"):
+        try:
+            parts = _parti(callback_data, "tras_orario_custom_")
+            return "handle_trasporti_orario_custom", {"destinazione_id": int(parts[0]), "zona_id": _zona(parts),
+                                                      "linea_codice": parts[2] if len(parts) > 2 else "23A"}
+        except (ValueError, IndexError):
+            pass
+    if callback_data.startswith("tras_fermata_"):
+        try:
+            parts = _parti(callback_data, "tras_fermata_")
+            return "handle_trasporti_fermata", {"destinazione_id": int(parts[0]), "zona_id": int(parts[1]) if len(parts) > 1 else None}
+        except (ValueError, IndexError):
+            pass
+    if callback_data == "tras_isole":
+        return "handle_trasporti_isole", {}
+    if callback_data == "tras_paese":
+        return "handle_trasporti_paese", {}
+
+    if callback_data == "fort_zone":
+        return "handle_fortini_zone", {}
+    if callback_data.startswith("fort_zona_"):
+        return "handle_fortini_lista", {"zona_key": callback_data.replace("fort_zona_", "")}
+    if callback_data.startswith("fort_detail_"):
+        return "handle_fortini_dettaglio", {"fortino_id": callback_data.replace("fort_detail_", "")}
+    if callback_data == "fort_percorsi":
+        return "handle_percorsi_lista", {}
+    if callback_data.startswith("fort_percorso_"):
+        return "handle_percorsi_dettaglio", {"percorso_id": callback_data.replace("fort_percorso_", "")}
+
+    sos = {
+        "ristoranti": "handle_ristoranti", "sos": "handle_sos", "sos_emergenza": "handle_sos_emergenza",
+        "sos_guardia_medica": "handle_sos_guardia_medica", "sos_ospedali": "handle_sos_ospedali",
+        "sos_farmacie": "handle_sos_farmacie", "sos_numeri": "handle_sos_numeri",
+    }
+    for chiave, nome in sos.items():
+        if menu_key == chiave:
+            return nome, {}
+    return None
+
+
+def trie(callback_data: str):
+    """Riconoscimento con il router di handlers.py, nello stesso formato di catena_if"""
+    trovata = handlers._get_menu_router().trova(callback_data)
+    if trovata is None:
+        return None
+    rotta, parametri = trovata
+    return rotta.gestore.__name__, parametri
+
+
+def _misura(nome: str, riconosci, callbacks: list) -> float:
+    t0 = time.perf_counter()
+    for callback_data in callbacks:
+        riconosci(callback_data)
+    durata = time.perf_counter() - t0
+    per_callback = durata / len(callbacks) * 1e9
+    print(f"{nome:<12} {per_callback:8.0f} ns/callback  ({len(callbacks)} callback in {durata * 1000:.0f}ms)")
+    return per_callback
+
+
+def main():
+    ripetizioni = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    random.seed(1)
+    valori, pesi = zip(*MIX)
+    callbacks = random.choices(valori, weights=pesi, k=ripetizioni)
+
+    router = handlers._get_menu_router()
+    print(f"Rotte registrate: {len(router)}")
+
+    diverse = [c for c in valori if catena_if(c) != trie(c)]
+    for callback_data in diverse:
+        print(f"  DIVERSO {callback_data}: {catena_if(callback_data)} != {trie(callback_data)}")
+
+    catena = _misura("if/elif", catena_if, callbacks)
+    albero = _misura("trie", trie, callbacks)
+    print(f"\nSpeedup: {catena / albero:.1f}x")
+
+    # Dettaglio sulle rotte più profonde della vecchia catena
+    profonde = [c for c in valori if c.startswith(("tras_dep_", "tras_fermata_", "tras_orario_custom_"))] * (ripetizioni // 10)
+    print("\nSolo rotte in fondo alla catena (tras_dep/fermata/orario_custom):")
+    catena = _misura("if/elif", catena_if, profonde)
+    albero = _misura("trie", trie, profonde)
+    print(f"Speedup: {catena / albero:.1f}x")
+
+    if diverse:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
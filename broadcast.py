@@ -0,0 +1,132 @@
+"""
+Invio massivo messaggi (morning briefing)
+
+- Pool di worker limitato che preleva gli invii da una coda
+- Token bucket globale tarato sui limiti Telegram (~30 msg/s per bot,
+  1 msg/s per chat)
+- RetryAfter: tutti i worker si fermano per il tempo indicato da Telegram,
+  poi l'invio viene ritentato
+- Report finale con inviati, errori, throughput e latenza p95
+"""
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+from config import BROADCAST_WORKERS, BROADCAST_RATE, BROADCAST_MAX_RETRY
+
+logger = logging.getLogger(__name__)
+
+# Limite Telegram per singola chat (secondi tra due messaggi)
+PER_CHAT_INTERVAL = 1.0
+
+
+class TokenBucket:
+    """Token bucket asincrono: `rate` token al secondo, fino a `capacity` accumulati"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Blocca l'erogazione per `seconds` (RetryAfter) e svuota il bucket"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordinati = sorted(values)
+    return ordinati[min(len(ordinati) - 1, int(len(ordinati) * p))]
+
+
+async def broadcast(bot, messaggi: List[Tuple[int, str, object]],
+                    workers: int = BROADCAST_WORKERS, rate: float = BROADCAST_RATE) -> dict:
+    """
+    Invia una lista di (chat_id, testo, reply_markup).
+    Ritorna il report di consegna.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in messaggi:
+        queue.put_nowait(item)
+
+    bucket = TokenBucket(rate)
+    ultimo_invio = {}  # chat_id -> monotonic ultimo invio (limite per chat)
+    latenze: List[float] = []
+    report = {"totale": len(messaggi), "inviati": 0, "errori": 0, "bloccati": 0, "retry": 0}
+
+    async def invia(chat_id: int, text: str, reply_markup) -> None:
+        for tentativo in range(BROADCAST_MAX_RETRY + 1):
+            attesa = ultimo_invio.get(chat_id, 0) + PER_CHAT_INTERVAL - time.monotonic()
+            if attesa > 0:
+                await asyncio.sleep(attesa)
+            await bucket.acquire()
+
+            t0 = time.perf_counter()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup, parse_mode="HTML")
+                latenze.append(time.perf_counter() - t0)
+                ultimo_invio[chat_id] = time.monotonic()
+                report["inviati"] += 1
+                return
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+                logger.warning(f"Flood control Telegram: pausa {retry_after}s (chat {chat_id})")
+                bucket.pause(retry_after)
+                report["retry"] += 1
+            except Forbidden:
+                # Utente ha bloccato il bot
+                report["bloccati"] += 1
+                return
+            except TelegramError as e:
+                logger.error(f"Errore invio a {chat_id}: {e}")
+                report["errori"] += 1
+                return
+
+        logger.error(f"Invio a {chat_id} fallito dopo {BROADCAST_MAX_RETRY} retry")
+        report["errori"] += 1
+
+    async def worker():
+        while True:
+            try:
+                chat_id, text, reply_markup = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await invia(chat_id, text, reply_markup)
+            except Exception as e:
+                logger.error(f"Errore invio a {chat_id}: {e}")
+                report["errori"] += 1
+
+    inizio = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(messaggi))))))
+    durata = time.perf_counter() - inizio
+
+    report["durata_s"] = round(durata, 2)
+    report["msg_al_secondo"] = round(report["inviati"] / durata, 1) if durata > 0 else 0.0
+    report["latenza_p95_ms"] = round(_percentile(latenze, 0.95) * 1000, 1)
+    report["latenza_media_ms"] = round(sum(latenze) / len(latenze) * 1000, 1) if latenze else 0.0
+    return report
@@ -0,0 +1,167 @@
+"""
+Codec compatto e versionato per callback_data (Telegram: massimo 64 byte)
+
+Le callback dei trasporti portavano lo stato come stringa separata da "_"
+(tras_percorso_{dest}_{zona}_{linea}): fragile con codici che contengono "_" e
+lunga. Qui lo stato è impacchettato in binario e codificato base64url:
+
+    "z_" + base64url(senza padding) di:
+        byte 0      versione schema (VERSIONE)
+        byte 1      id schermata (SCHERMATE)
+        campi       nell'ordine dello schema, codificati per tipo
+
+Tipi dei campi:
+- u   intero >= 0, varint (LEB128)
+- i   intero con segno, varint zigzag
+- z   zona opzionale: None e 0 (nessuna zona) -> 0, n -> n + 1, varint
+- s   stringa UTF-8, lunghezza varint + byte
+- t   orario "HH:MM" opzionale (None o non valido -> 0, minuti dalla mezzanotte + 1), varint
+- b   booleano, un byte
+
+Per cambiare uno schema si aggiunge una nuova versione in _SCHEMI e si alza
+VERSIONE: i bottoni già inviati con la versione precedente restano decodificabili.
+"""
+import base64
+from typing import Dict, Tuple
+
+VERSIONE = 1
+PREFISSO = "z_"
+LIMITE_BYTE = 64   # limite Telegram per callback_data
+
+# versione -> id schermata -> (nome, campi (nome, tipo))
+_SCHEMI: Dict[int, Dict[int, Tuple[str, tuple]]] = {
+    1: {
+        1: ("percorso", (("destinazione_id", "u"), ("zona_id", "z"), ("linea_codice", "s"))),
+        2: ("viaggio", (("destinazione_id", "u"), ("zona_id", "z"), ("linea_codice", "s"), ("ora_partenza", "t"))),
+        3: ("orari", (("destinazione_id", "u"), ("zona_id", "z"), ("linea_codice", "s"), ("ora_partenza", "t"))),
+        4: ("dep", (("destinazione_id", "u"), ("zona_id", "z"), ("linea_codice", "s"), ("dep_index", "u"), ("ora_partenza", "t"))),
+        5: ("orario_custom", (("destinazione_id", "u"), ("zona_id", "z"), ("linea_codice", "s"))),
+        6: ("fraz_quando", (("da_zona_id", "u"), ("a_zona_id", "u"), ("linea_codice", "s"))),
+        7: ("fraz_viaggio", (("da_zona_id", "u"), ("a_zona_id", "u"), ("linea_codice", "s"), ("offset_minuti", "i"))),
+    }
+}
+
+# nome schermata -> (id, campi) della versione corrente
+SCHERMATE: Dict[str, Tuple[int, tuple]] = {
+    nome: (schermata_id, campi) for schermata_id, (nome, campi) in _SCHEMI[VERSIONE].items()
+}
+
+
+def _varint(n: int, out: bytearray) -> None:
+    if n < 0:
+        raise ValueError(f"Varint negativo: {n}")
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _leggi_varint(dati: bytes, pos: int) -> Tuple[int, int]:
+    n = 0
+    shift = 0
+    while True:
+        if pos >= len(dati) or shift > 63:
+            raise ValueError("Varint troncato")
+        byte = dati[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _minuti(ora: str) -> int:
+    ore, minuti = ora.split(":")[:2]
+    ore, minuti = int(ore), int(minuti)
+    if not (0 <= ore < 24 and 0 <= minuti < 60):
+        raise ValueError(f"Orario non valido: {ora}")
+    return ore * 60 + minuti
+
+
+def _scrivi(tipo: str, valore, out: bytearray) -> None:
+    if tipo == "u":
+        _varint(int(valore), out)
+    elif tipo == "i":
+        valore = int(valore)
+        _varint(valore * 2 if valore >= 0 else -valore * 2 - 1, out)
+    elif tipo == "z":
+        _varint(int(valore) + 1 if valore else 0, out)
+    elif tipo == "s":
+        testo = str(valore).encode("utf-8")
+        _varint(len(testo), out)
+        out.extend(testo)
+    elif tipo == "t":
+        try:
+            minuti = _minuti(valore) + 1 if valore else 0
+        except ValueError:
+            # Come il vecchio formato: un orario non valido vale "nessun orario"
+            minuti = 0
+        _varint(minuti, out)
+    elif tipo == "b":
+        out.append(1 if valore else 0)
+    else:
+        raise ValueError(f"Tipo campo sconosciuto: {tipo}")
+
+
+def _leggi(tipo: str, dati: bytes, pos: int):
+    if tipo == "b":
+        if pos >= len(dati):
+            raise ValueError("Payload troncato")
+        return dati[pos] == 1, pos + 1
+    n, pos = _leggi_varint(dati, pos)
+    if tipo == "u":
+        return n, pos
+    if tipo == "i":
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+    if tipo == "z":
+        return (n - 1 if n else None), pos
+    if tipo == "s":
+        fine = pos + n
+        if fine > len(dati):
+            raise ValueError("Stringa troncata")
+        return dati[pos:fine].decode("utf-8"), fine
+    if tipo == "t":
+        if not n:
+            return None, pos
+        minuti = n - 1
+        if minuti >= 24 * 60:
+            raise ValueError("Orario non valido")
+        return f"{minuti // 60:02d}:{minuti % 60:02d}", pos
+    raise ValueError(f"Tipo campo sconosciuto: {tipo}")
+
+
+def codifica(schermata: str, **campi) -> str:
+    """callback_data compatta per la schermata (ValueError se supera i 64 byte)"""
+    schermata_id, schema = SCHERMATE[schermata]
+    out = bytearray((VERSIONE, schermata_id))
+    for nome, tipo in schema:
+        _scrivi(tipo, campi.get(nome), out)
+    callback_data = PREFISSO + base64.urlsafe_b64encode(bytes(out)).rstrip(b"=").decode("ascii")
+    if len(callback_data.encode("ascii")) > LIMITE_BYTE:
+        raise ValueError(f"callback_data oltre {LIMITE_BYTE} byte: {schermata} {campi}")
+    return callback_data
+
+
+def decodifica(payload: str) -> Tuple[str, dict]:
+    """(schermata, campi) dal testo dopo PREFISSO; ValueError se non valido o versione sconosciuta"""
+    try:
+        dati = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+    except Exception as e:
+        raise ValueError(f"Base64 non valido: {e}")
+    if len(dati) < 2:
+        raise ValueError("Payload troppo corto")
+    versione, schermata_id = dati[0], dati[1]
+    schema = _SCHEMI.get(versione, {}).get(schermata_id)
+    if schema is None:
+        raise ValueError(f"Schermata sconosciuta: v{versione}/{schermata_id}")
+    nome, campi_schema = schema
+    campi = {}
+    pos = 2
+    for campo, tipo in campi_schema:
+        campi[campo], pos = _leggi(tipo, dati, pos)
+    return nome, campi
+
@@ -25,6 +25,60 @@ SENTRY_DSN = os.getenv("SENTRY_DSN", "")
 # Cache TTL (secondi)
 CACHE_TTL = 300  # 5 minuti
 
+# Cache stato utenti (secondi, numero massimo di chat in memoria)
+USER_CACHE_TTL = 600  # 10 minuti
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "5000"))
+
+# Scrittura in batch di last_update_id (intervallo in ms, righe massime in attesa)
+LAST_UPDATE_FLUSH_MS = int(os.getenv("LAST_UPDATE_FLUSH_MS", "2000"))
+LAST_UPDATE_FLUSH_ROWS = int(os.getenv("LAST_UPDATE_FLUSH_ROWS", "200"))
+LAST_UPDATE_MAX_TENTATIVI = int(os.getenv("LAST_UPDATE_MAX_TENTATIVI", "5"))  # poi l'id è scartato
+
+# Deduplica update_id (backend e numero di update_id ricordati)
+DEDUP_BACKEND = os.getenv("DEDUP_BACKEND", "memory")
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "10000"))
+
+# Cache meteo/mare (secondi): validità, anticipo aggiornamento, età massima dati serviti
+METEO_CACHE_TTL = 600  # 10 minuti
+METEO_REFRESH_AHEAD = 60
+METEO_MAX_STALE = 6 * 3600  # 6 ore (API non raggiungibile)
+
+# Cache maree Stormglass (file JSON, giorni scaricati dal job giornaliero)
+TIDE_CACHE_PATH = os.getenv("TIDE_CACHE_PATH", os.path.join(os.path.dirname(__file__), "data", "tides.json"))
+TIDE_PREFETCH_DAYS = 7
+
+# Cache farmacie di turno (file JSON, sopravvive ai riavvii)
+FARMACIE_CACHE_PATH = os.getenv("FARMACIE_CACHE_PATH", os.path.join(os.path.dirname(__file__), "data", "farmacie.json"))
+
+# Morning briefing: worker concorrenti, messaggi al secondo (limite Telegram ~30), retry su flood
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_MAX_RETRY = 3
+
+# Indice orari bus/traghetti in memoria: intervallo controllo versione dati (secondi)
+ORARI_REFRESH_INTERVAL = int(os.getenv("ORARI_REFRESH_INTERVAL", "900"))  # 15 minuti
+
+# Dati di riferimento trasporti (zone, destinazioni, linee...): intervallo controllo versione (secondi)
+RIFERIMENTI_REFRESH_INTERVAL = int(os.getenv("RIFERIMENTI_REFRESH_INTERVAL", "600"))  # 10 minuti
+
+# Indice eventi in memoria: intervallo controllo versione dati (secondi)
+EVENTI_REFRESH_INTERVAL = int(os.getenv("EVENTI_REFRESH_INTERVAL", "300"))  # 5 minuti
+
+# Tabelloni partenze pre-calcolati ogni minuto: corse per fermata/linea/direzione
+TABELLONI_PARTENZE = 12
+
+# Statistiche /stats in memoria: intervallo riconciliazione con il database (secondi)
+STATS_RICONCILIA_INTERVAL = int(os.getenv("STATS_RICONCILIA_INTERVAL", "600"))  # 10 minuti
+
+# Mirror SQLite locale delle tabelle di sola lettura (mirror.py) e intervallo sync
+MIRROR_PATH = os.getenv("MIRROR_PATH", os.path.join(os.path.dirname(__file__), "data", "mirror.sqlite3"))
+MIRROR_SYNC_INTERVAL = int(os.getenv("MIRROR_SYNC_INTERVAL", "300"))  # 5 minuti
+# Tabelle senza updated_at: ogni quanto riscaricarle per vedere gli UPDATE sul posto
+MIRROR_VERIFICA_INTERVAL = int(os.getenv("MIRROR_VERIFICA_INTERVAL", "3600"))  # 1 ora
+
+# Thread dedicati alle query Supabase (database_async)
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "16"))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
@@ -3,9 +3,15 @@ Database Supabase - connessione, cache e query
 """
 import time
 import logging
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping
 from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY, CACHE_TTL
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, CACHE_TTL, USER_CACHE_TTL, USER_CACHE_MAX,
+    LAST_UPDATE_FLUSH_MS, LAST_UPDATE_FLUSH_ROWS, LAST_UPDATE_MAX_TENTATIVI
+)
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +20,11 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Cache globale
 _cache = {
-    "testi": {},
-    "config": {},
+    "testi": MappingProxyType({}),
+    "testi_lingue": MappingProxyType({}),   # lingua -> {chiave: testo con fallback}
+    "config": MappingProxyType({}),
+    "testi_firma": None,                    # versione mirror dell'ultimo caricamento
+    "config_firma": None,
     "eventi_oggi": None,
     "eventi_oggi_data": None,
     "testi_loaded_at": 0,
@@ -24,73 +33,221 @@ _cache = {
 }
 
 
+# Cache stato utenti: chat_id -> (riga utenti, timestamp caricamento)
+# Ordinata per ultimo accesso (LRU), aggiornata in write-through da update_user
+_user_cache: "OrderedDict[int, tuple]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {"hits": 0, "misses": 0}
+
+# Buffer scritture last_update_id: chat_id -> ultimo update_id da salvare
+# Svuotato in batch dal thread writer ogni LAST_UPDATE_FLUSH_MS o LAST_UPDATE_FLUSH_ROWS righe
+_pending_update_ids: Dict[int, int] = {}
+_pending_lock = threading.Lock()
+# chat_id -> scritture fallite consecutive (oltre LAST_UPDATE_MAX_TENTATIVI l'id è scartato)
+_pending_tentativi: Dict[int, int] = {}
+_pending_event = threading.Event()
+_writer_thread: Optional[threading.Thread] = None
+_writer_stats = {"queued": 0, "written": 0, "batches": 0, "scartati": 0}
+
+
 def _is_cache_valid(cache_key: str) -> bool:
     """Verifica se la cache è ancora valida"""
     loaded_at = _cache.get(f"{cache_key}_loaded_at", 0)
     return (time.time() - loaded_at) < CACHE_TTL
 
 
-def get_testi() -> Dict[str, Dict[str, str]]:
-    """Carica testi dal DB con cache 5 minuti"""
-    if _is_cache_valid("testi") and _cache["testi"]:
-        return _cache["testi"]
+# Lingue della tabella testi: per ognuna una tabella piatta chiave -> testo
+# con il fallback già risolto (lingua -> italiano -> chiave)
+LINGUE_TESTI = ("it", "en", "de")
 
-    try:
-        response = supabase.table("testi").select("*").execute()
-        T = {}
-        for row in response.data:
-            if row.get("chiave"):
-                T[row["chiave"]] = {
-                    "it": row.get("it", ""),
-                    "en": row.get("en", ""),
-                    "de": row.get("de", "")
-                }
-        _cache["testi"] = T
-        _cache["testi_loaded_at"] = time.time()
-        logger.info(f"Cache testi ricaricata: {len(T)} chiavi")
-        return T
-    except Exception as e:
-        logger.error(f"Errore caricamento testi: {e}")
-        return _cache.get("testi", {})
+_testi_config_lock = threading.Lock()
 
 
-def get_config() -> Dict[str, str]:
-    """Carica config dal DB con cache 5 minuti"""
-    if _is_cache_valid("config") and _cache["config"]:
-        return _cache["config"]
+def _firma_tabella(tabella: str):
+    """
+    Versione economica della tabella: dal mirror se sincronizzata, altrimenti
+    versione_remota (una query). None se non determinabile: si rilegge e si confronta il contenuto.
+    """
+    import mirror
+    versione = mirror.versione(tabella)
+    if versione is not None:
+        return ("mirror",) + versione
+    return versione_remota(tabella)
+
+
+def _righe_tabella(tabella: str) -> list:
+    import mirror
+    righe = mirror.righe(tabella)
+    if righe is None:
+        righe = supabase.table(tabella).select("*").execute().data
+    return righe
+
+
+def _costruisci_testi(righe: list):
+    """Testi per chiave e tabelle piatte per lingua, immutabili"""
+    T = {}
+    for row in righe:
+        if row.get("chiave"):
+            T[row["chiave"]] = MappingProxyType({
+                "it": row.get("it", ""),
+                "en": row.get("en", ""),
+                "de": row.get("de", "")
+            })
+    piatti = {
+        lingua: MappingProxyType({
+            chiave: valori[lingua] or valori["it"] or chiave
+            for chiave, valori in T.items()
+        })
+        for lingua in LINGUE_TESTI
+    }
+    return MappingProxyType(T), MappingProxyType(piatti)
 
-    try:
-        response = supabase.table("config").select("*").execute()
-        config = {}
-        for row in response.data:
-            if row.get("chiave"):
-                config[row["chiave"]] = row.get("valore", "")
-        _cache["config"] = config
-        _cache["config_loaded_at"] = time.time()
-        logger.info(f"Cache config ricaricata: {len(config)} chiavi")
-        return config
-    except Exception as e:
-        logger.error(f"Errore caricamento config: {e}")
-        return _cache.get("config", {})
+
+def refresh_testi_config(force: bool = False) -> list:
+    """
+    Ricarica testi e config fuori dal percorso delle richieste (job in main.py).
+    La versione economica (mirror o versione_remota) evita di rileggere la tabella
+    quando non è cambiata; se non è disponibile si rilegge e si confronta il contenuto.
+    I nuovi dizionari (immutabili) sostituiscono i vecchi con un solo assegnamento.
+    Ritorna le tabelle cambiate.
+    """
+    cambiate = []
+    with _testi_config_lock:
+        for tabella in ("testi", "config"):
+            try:
+                firma = _firma_tabella(tabella)
+                if not force and firma is not None and firma == _cache[f"{tabella}_firma"]:
+                    _cache[f"{tabella}_loaded_at"] = time.time()
+                    continue
+                righe = _righe_tabella(tabella)
+                if tabella == "testi":
+                    T, piatti = _costruisci_testi(righe)
+                    if T != _cache["testi"]:
+                        _cache["testi_lingue"] = piatti
+                        _cache["testi"] = T
+                        cambiate.append(tabella)
+                        # Schermate pre-renderizzate costruite sui testi precedenti
+                        import schermate
+                        schermate.invalida()
+                    logger.info(f"Cache testi ricaricata: {len(T)} chiavi")
+                else:
+                    config = MappingProxyType({
+                        row["chiave"]: row.get("valore", "")
+                        for row in righe if row.get("chiave")
+                    })
+                    if config != _cache["config"]:
+                        _cache["config"] = config
+                        cambiate.append(tabella)
+                    logger.info(f"Cache config ricaricata: {len(config)} chiavi")
+                _cache[f"{tabella}_firma"] = firma
+                _cache[f"{tabella}_loaded_at"] = time.time()
+            except Exception as e:
+                logger.error(f"Errore caricamento {tabella}: {e}")
+    return cambiate
+
+
+def testi_config_caricati() -> bool:
+    return bool(_cache["testi_loaded_at"] and _cache["config_loaded_at"])
+
+
+def _carica_testi_config():
+    """Primo caricamento (prima che giri il job): l'unico caso che legge sul percorso della richiesta"""
+    if not testi_config_caricati():
+        refresh_testi_config()
+
+
+def get_testi() -> Mapping[str, Mapping[str, str]]:
+    """Testi per chiave (aggiornati in background da refresh_testi_config)"""
+    if not _cache["testi_loaded_at"]:
+        _carica_testi_config()
+    return _cache["testi"]
+
+
+def get_config() -> Mapping[str, str]:
+    """Config per chiave (aggiornata in background da refresh_testi_config)"""
+    if not _cache["config_loaded_at"]:
+        _carica_testi_config()
+    return _cache["config"]
 
 
 def get_text(chiave: str, lingua: str = "it") -> str:
     """Ottiene testo tradotto, fallback a italiano"""
-    T = get_testi()
-    if chiave in T:
-        if T[chiave].get(lingua):
-            return T[chiave][lingua]
-        if T[chiave].get("it"):
-            return T[chiave]["it"]
-    return chiave
+    if not _cache["testi_loaded_at"]:
+        _carica_testi_config()
+    piatti = _cache["testi_lingue"]
+    tabella = piatti.get(lingua) or piatti.get("it", {})
+    return tabella.get(chiave, chiave)
+
+
+def _user_cache_get(chat_id: int) -> Optional[Dict[str, Any]]:
+    """Legge utente dalla cache (None se assente o scaduto)"""
+    with _user_cache_lock:
+        entry = _user_cache.get(chat_id)
+        if entry and (time.time() - entry[1]) < USER_CACHE_TTL:
+            _user_cache.move_to_end(chat_id)
+            _user_cache_stats["hits"] += 1
+            return dict(entry[0])
+        if entry:
+            del _user_cache[chat_id]
+        _user_cache_stats["misses"] += 1
+        return None
+
+
+def _user_cache_put(chat_id: int, user: Dict[str, Any]):
+    """Salva utente in cache, eliminando i meno usati oltre USER_CACHE_MAX"""
+    with _user_cache_lock:
+        _user_cache[chat_id] = (dict(user), time.time())
+        _user_cache.move_to_end(chat_id)
+        while len(_user_cache) > USER_CACHE_MAX:
+            _user_cache.popitem(last=False)
+
+
+def _user_cache_update(chat_id: int, updates: Dict[str, Any]):
+    """Applica gli aggiornamenti alla copia in cache (write-through)"""
+    with _user_cache_lock:
+        entry = _user_cache.get(chat_id)
+        if entry:
+            entry[0].update(updates)
+
+
+def invalidate_user(chat_id: int):
+    """Rimuove utente dalla cache (la prossima lettura va sul DB)"""
+    with _user_cache_lock:
+        _user_cache.pop(chat_id, None)
+
+
+def get_user_cache_stats() -> dict:
+    """Statistiche cache utenti per /stats"""
+    with _user_cache_lock:
+        hits = _user_cache_stats["hits"]
+        misses = _user_cache_stats["misses"]
+        size = len(_user_cache)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": (hits / total * 100) if total else 0.0,
+        "size": size
+    }
 
 
 def get_user(chat_id: int) -> Optional[Dict[str, Any]]:
-    """Cerca utente per chat_id"""
+    """Cerca utente per chat_id (servito dalla cache se presente)"""
+    cached = _user_cache_get(chat_id)
+    if cached is not None:
+        return cached
+
     try:
         response = supabase.table("utenti").select("*").eq("chat_id", chat_id).execute()
         if response.data and len(response.data) > 0:
-            return response.data[0]
+            user = response.data[0]
+            # Un last_update_id ancora nel buffer è più recente di quello sul DB
+            with _pending_lock:
+                pending = _pending_update_ids.get(chat_id)
+            if pending and pending > (user.get("last_update_id") or 0):
+                user["last_update_id"] = pending
+            _user_cache_put(chat_id, user)
+            return user
         return None
     except Exception as e:
         logger.error(f"Errore ricerca utente {chat_id}: {e}")
@@ -110,7 +267,10 @@ def create_user(chat_id: int) -> Optional[Dict[str, Any]]:
         }
         response = supabase.table("utenti").insert(data).execute()
         logger.info(f"Utente creato: {chat_id}")
-        return response.data[0] if response.data else None
+        if response.data:
+            _user_cache_put(chat_id, response.data[0])
+            return response.data[0]
+        return None
     except Exception as e:
         logger.error(f"Errore creazione utente {chat_id}: {e}")
         return None
@@ -122,8 +282,9 @@ def increment_utenti_count() -> bool:
         config = get_config()
         current = int(config.get("utenti_count", "0"))
         supabase.table("config").update({"valore": str(current + 1)}).eq("chiave", "utenti_count").execute()
-        # Invalida cache config
-        _cache["config_loaded_at"] = 0
+        # Aggiorna la copia in memoria senza ricaricare la tabella
+        with _testi_config_lock:
+            _cache["config"] = MappingProxyType(dict(_cache["config"], utenti_count=str(current + 1)))
         return True
     except Exception as e:
         logger.error(f"Errore incremento contatore: {e}")
@@ -131,15 +292,124 @@ def increment_utenti_count() -> bool:
 
 
 def update_user(chat_id: int, updates: Dict[str, Any]) -> bool:
-    """Aggiorna campi utente"""
+    """Aggiorna campi utente (e la copia in cache)"""
+    if "last_update_id" in updates:
+        # Scrittura diretta più recente: il valore nel buffer è superato
+        with _pending_lock:
+            if _pending_update_ids.get(chat_id, 0) <= updates["last_update_id"]:
+                _pending_update_ids.pop(chat_id, None)
     try:
         supabase.table("utenti").update(updates).eq("chat_id", chat_id).execute()
+        _user_cache_update(chat_id, updates)
         return True
     except Exception as e:
         logger.error(f"Errore aggiornamento utente {chat_id}: {e}")
+        # Stato incerto: la prossima lettura ricarica dal DB
+        invalidate_user(chat_id)
         return False
 
 
+def queue_last_update_id(chat_id: int, update_id: int):
+    """
+    Registra last_update_id senza scrivere subito sul DB.
+    La cache utenti viene aggiornata immediatamente (il check duplicati in
+    handle_update vede subito l'id), la scrittura avviene in batch dal
+    thread writer tenendo solo l'ultimo id per chat_id.
+    """
+    _user_cache_update(chat_id, {"last_update_id": update_id})
+    with _pending_lock:
+        if update_id > _pending_update_ids.get(chat_id, 0):
+            _pending_update_ids[chat_id] = update_id
+        _writer_stats["queued"] += 1
+        pending = len(_pending_update_ids)
+
+    _start_writer()
+    if pending >= LAST_UPDATE_FLUSH_ROWS:
+        _pending_event.set()
+
+
+def _rimetti_in_coda(fallite: Dict[int, int]):
+    """Rimette in coda gli id non superati nel frattempo; oltre LAST_UPDATE_MAX_TENTATIVI li scarta"""
+    with _pending_lock:
+        for chat_id, update_id in fallite.items():
+            tentativi = _pending_tentativi.get(chat_id, 0) + 1
+            if tentativi >= LAST_UPDATE_MAX_TENTATIVI:
+                _pending_tentativi.pop(chat_id, None)
+                _writer_stats["scartati"] += 1
+                logger.error(f"Scarto last_update_id {update_id} per {chat_id} dopo {tentativi} tentativi")
+                continue
+            _pending_tentativi[chat_id] = tentativi
+            if update_id > _pending_update_ids.get(chat_id, 0):
+                _pending_update_ids[chat_id] = update_id
+
+
+def flush_last_update_ids() -> int:
+    """
+    Scrive sul DB i last_update_id in attesa con un solo UPDATE in blocco (RPC
+    aggiorna_last_update_ids, vedi DEPLOY.md). Solo righe utenti esistenti e solo
+    se l'id è più recente di quello salvato. Se l'RPC fallisce, riprova riga per
+    riga per isolare le righe che falliscono. Ritorna righe inviate.
+    """
+    with _pending_lock:
+        batch = dict(_pending_update_ids)
+        _pending_update_ids.clear()
+
+    if not batch:
+        return 0
+
+    rows = [{"chat_id": chat_id, "last_update_id": update_id} for chat_id, update_id in batch.items()]
+    try:
+        supabase.rpc("aggiorna_last_update_ids", {"righe": rows}).execute()
+        fallite = {}
+    except Exception as e:
+        logger.error(f"Errore scrittura batch last_update_id ({len(rows)} righe): {e}")
+        fallite = {}
+        for chat_id, update_id in batch.items():
+            try:
+                # Come il COALESCE dell'RPC: anche le righe con last_update_id NULL (utenti nuovi)
+                supabase.table("utenti").update({"last_update_id": update_id}) \
+                    .eq("chat_id", chat_id) \
+                    .or_(f"last_update_id.is.null,last_update_id.lt.{update_id}") \
+                    .execute()
+            except Exception as e:
+                logger.error(f"Errore scrittura last_update_id {chat_id}: {e}")
+                fallite[chat_id] = update_id
+
+    if fallite:
+        _rimetti_in_coda(fallite)
+    with _pending_lock:
+        for chat_id in batch:
+            if chat_id not in fallite:
+                _pending_tentativi.pop(chat_id, None)
+        _writer_stats["written"] += len(rows) - len(fallite)
+        _writer_stats["batches"] += 1
+    return len(rows) - len(fallite)
+
+
+def _writer_loop():
+    """Thread writer: flush periodico o quando il buffer è pieno"""
+    while True:
+        _pending_event.wait(LAST_UPDATE_FLUSH_MS / 1000)
+        _pending_event.clear()
+        flush_last_update_ids()
+
+
+def _start_writer():
+    """Avvia il thread writer al primo utilizzo"""
+    global _writer_thread
+    if _writer_thread is None:
+        with _pending_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer_loop, name="last-update-writer", daemon=True)
+                _writer_thread.start()
+
+
+def get_writer_stats() -> dict:
+    """Statistiche writer last_update_id per /stats"""
+    with _pending_lock:
+        return dict(_writer_stats, pending=len(_pending_update_ids))
+
+
 def save_lingua(chat_id: int, lingua: str, update_id: int) -> bool:
     """Salva lingua e aggiorna stato"""
     return update_user(chat_id, {
@@ -211,18 +481,18 @@ def save_last_bot_msg(chat_id: int, msg_id: int, step: str) -> bool:
 
 
 def check_duplicate_update(chat_id: int, update_id: int) -> bool:
-    """Verifica se update è duplicato. Ritorna True se duplicato."""
-    user = get_user(chat_id)
-    if user and user.get("last_update_id", 0) >= update_id:
+    """Verifica se update è duplicato. Ritorna True se duplicato (finestra in memoria, nessuna query)."""
+    from dedup import is_duplicate
+    if is_duplicate(update_id):
         logger.info(f"Update duplicato ignorato: chat_id={chat_id}, update_id={update_id}")
         return True
     return False
 
 
 def invalidate_cache():
-    """Forza ricaricamento cache"""
-    _cache["testi_loaded_at"] = 0
-    _cache["config_loaded_at"] = 0
+    """Forza ricaricamento cache (testi e config al prossimo refresh_testi_config)"""
+    _cache["testi_firma"] = None
+    _cache["config_firma"] = None
     _cache["eventi_loaded_at"] = 0
 
 
@@ -257,9 +527,18 @@ def get_evento_oggi(lang: str = "it") -> Optional[str]:
     - attivo: boolean (opzionale)
     """
     from datetime import date
+    import eventi_index
 
     oggi = date.today().isoformat()
 
+    if eventi_index.is_loaded():
+        eventi = eventi_index.in_corso(oggi)
+        if eventi:
+            row = eventi[0]
+            titolo = row.get(f"titolo_{lang}") or row.get("titolo_it") or row.get("titolo") or ""
+            return titolo if titolo else None
+        return None
+
     # Verifica cache: valida se stesso giorno e non scaduta
     if (_is_cache_valid("eventi") and
             _cache["eventi_oggi_data"] == oggi and
@@ -270,28 +549,36 @@ def get_evento_oggi(lang: str = "it") -> Optional[str]:
             return titolo if titolo else None
         return None
 
+    import mirror
+
     try:
         # Cerca eventi attivi dove oggi è nel range data_inizio - data_fine
-        response = supabase.table("eventi") \
-            .select("*") \
-            .lte("data_inizio", oggi) \
-            .gte("data_fine", oggi) \
-            .eq("attivo", True) \
-            .order("data_inizio") \
-            .limit(1) \
-            .execute()
+        righe = mirror.seleziona(
+            "eventi",
+            [("data_inizio", "<=", oggi), ("data_fine", ">=", oggi), ("attivo", "=", True)],
+            ordine="data_inizio", limit=1
+        )
+        if righe is None:
+            righe = supabase.table("eventi") \
+                .select("*") \
+                .lte("data_inizio", oggi) \
+                .gte("data_fine", oggi) \
+                .eq("attivo", True) \
+                .order("data_inizio") \
+                .limit(1) \
+                .execute().data
 
         # Aggiorna cache (anche se vuoto, per evitare query ripetute)
-        if response.data and len(response.data) > 0:
-            _cache["eventi_oggi"] = response.data[0]
+        if righe:
+            _cache["eventi_oggi"] = righe[0]
         else:
             _cache["eventi_oggi"] = {}
         _cache["eventi_oggi_data"] = oggi
         _cache["eventi_loaded_at"] = time.time()
         logger.info(f"Cache eventi ricaricata per {oggi}")
 
-        if response.data and len(response.data) > 0:
-            row = response.data[0]
+        if righe:
+            row = righe[0]
             titolo = row.get(f"titolo_{lang}") or row.get("titolo_it") or row.get("titolo") or ""
             return titolo if titolo else None
         return None
@@ -326,9 +613,64 @@ def get_utenti_attivi() -> list:
         return []
 
 
+# Tabelle per cui è già stato segnalato che manca una versione economica
+_versione_mancante: set = set()
+
+
+def versione_remota(tabella: str) -> Optional[tuple]:
+    """
+    Versione economica di una tabella su Supabase, senza scaricarla:
+    (max updated_at, righe) se c'è la colonna, altrimenti righe + md5 del contenuto
+    calcolati dal database (RPC versione_tabella, vedi DEPLOY.md).
+    None se non determinabile (segnalato una volta sola per tabella).
+    """
+    try:
+        response = supabase.table(tabella) \
+            .select("updated_at", count="exact") \
+            .order("updated_at", desc=True) \
+            .limit(1) \
+            .execute()
+        massimo = response.data[0]["updated_at"] if response.data else None
+        return ("updated_at", massimo, response.count or 0)
+    except Exception:
+        pass
+
+    try:
+        dati = supabase.rpc("versione_tabella", {"tabella": tabella}).execute().data
+        return ("hash", dati["righe"], dati["hash"])
+    except Exception as e:
+        if tabella not in _versione_mancante:
+            _versione_mancante.add(tabella)
+            logger.warning(f"Versione {tabella} non disponibile (serve updated_at o l'RPC versione_tabella): {e}")
+        return None
+
+
+def get_statistiche_utenti() -> Optional[dict]:
+    """
+    Conteggi utenti (totali, onboarding completo, attivi 7 giorni) in una sola query
+    aggregata: funzione SQL statistiche_utenti (vedi DEPLOY.md).
+    None se la funzione non è disponibile.
+    """
+    try:
+        response = supabase.rpc("statistiche_utenti").execute()
+        data = response.data[0] if isinstance(response.data, list) and response.data else response.data
+        if not isinstance(data, dict):
+            return None
+        return {
+            "utenti_totali": data.get("utenti_totali") or 0,
+            "utenti_completi": data.get("utenti_completi") or 0,
+            "utenti_attivi_7g": data.get("utenti_attivi_7g") or 0
+        }
+    except Exception as e:
+        logger.warning(f"statistiche_utenti non disponibile: {e}")
+        return None
+
+
 def get_stats() -> dict:
     """
     Restituisce statistiche per il comando /stats admin.
+    Se una query fallisce i conteggi relativi restano a 0 e "parziale" è True
+    (la riconciliazione periodica li scarta).
     """
     from datetime import datetime, timedelta
 
@@ -340,41 +682,61 @@ def get_stats() -> dict:
         "eventi_attivi": 0
     }
 
-    try:
-        # Utenti totali
-        response = supabase.table("utenti").select("id", count="exact").execute()
-        stats["utenti_totali"] = response.count or 0
+    utenti = get_statistiche_utenti()
+    if utenti is not None:
+        stats.update(utenti)
+    else:
+        try:
+            # Utenti totali
+            response = supabase.table("utenti").select("id", count="exact").execute()
+            stats["utenti_totali"] = response.count or 0
 
-        # Utenti con onboarding completo
-        response = supabase.table("utenti").select("id", count="exact").eq("stato_onboarding", "completo").execute()
-        stats["utenti_completi"] = response.count or 0
+            # Utenti con onboarding completo
+            response = supabase.table("utenti").select("id", count="exact").eq("stato_onboarding", "completo").execute()
+            stats["utenti_completi"] = response.count or 0
 
-        # Utenti attivi negli ultimi 7 giorni (basato su updated_at o last_update_id)
-        sette_giorni_fa = (datetime.now() - timedelta(days=7)).isoformat()
-        response = supabase.table("utenti").select("id", count="exact").gte("updated_at", sette_giorni_fa).execute()
-        stats["utenti_attivi_7g"] = response.count or 0
+            # Utenti attivi negli ultimi 7 giorni (basato su updated_at o last_update_id)
+            sette_giorni_fa = (datetime.now() - timedelta(days=7)).isoformat()
+            response = supabase.table("utenti").select("id", count="exact").gte("updated_at", sette_giorni_fa).execute()
+            stats["utenti_attivi_7g"] = response.count or 0
 
-    except Exception as e:
-        logger.error(f"Errore get_stats utenti: {e}")
+        except Exception as e:
+            logger.error(f"Errore get_stats utenti: {e}")
+            stats["parziale"] = True
 
     try:
+        import mirror
+        import eventi_index
+        from datetime import date
+        oggi = date.today().isoformat()
+
+        if eventi_index.is_loaded():
+            stats["eventi_totali"] = eventi_index.get_stats()["totali"]
+            stats["eventi_attivi"] = eventi_index.conta(oggi, oggi)
+            return stats
+
+        filtri_attivi = [("data_inizio", "<=", oggi), ("data_fine", ">=", oggi), ("attivo", "=", True)]
+
         # Eventi totali
-        response = supabase.table("eventi").select("id", count="exact").execute()
-        stats["eventi_totali"] = response.count or 0
+        totali = mirror.conta("eventi")
+        if totali is None:
+            totali = supabase.table("eventi").select("id", count="exact").execute().count
+        stats["eventi_totali"] = totali or 0
 
         # Eventi attivi oggi
-        from datetime import date
-        oggi = date.today().isoformat()
-        response = supabase.table("eventi") \
-            .select("id", count="exact") \
-            .lte("data_inizio", oggi) \
-            .gte("data_fine", oggi) \
-            .eq("attivo", True) \
-            .execute()
-        stats["eventi_attivi"] = response.count or 0
+        attivi = mirror.conta("eventi", filtri_attivi)
+        if attivi is None:
+            attivi = supabase.table("eventi") \
+                .select("id", count="exact") \
+                .lte("data_inizio", oggi) \
+                .gte("data_fine", oggi) \
+                .eq("attivo", True) \
+                .execute().count
+        stats["eventi_attivi"] = attivi or 0
 
     except Exception as e:
         logger.error(f"Errore get_stats eventi: {e}")
+        stats["parziale"] = True
 
     return stats
 
@@ -391,11 +753,24 @@ def get_eventi_prossimi(giorni: int = 7, limit: int = None) -> list:
         Lista di eventi ordinati per data_inizio
     """
     from datetime import date, timedelta
+    import mirror
+    import eventi_index
 
     try:
         oggi = date.today()
         fine_periodo = oggi + timedelta(days=giorni)
 
+        if eventi_index.is_loaded():
+            return [dict(e) for e in eventi_index.sovrapposti(oggi.isoformat(), fine_periodo.isoformat(), limit=limit)]
+
+        righe = mirror.seleziona(
+            "eventi",
+            [("data_inizio", "<=", fine_periodo.isoformat()), ("data_fine", ">=", oggi.isoformat()), ("attivo", "=", True)],
+            ordine="data_inizio", limit=limit
+        )
+        if righe is not None:
+            return righe
+
         query = supabase.table("eventi") \
             .select("*") \
             .lte("data_inizio", fine_periodo.isoformat()) \
@@ -424,6 +799,18 @@ def get_eventi_count(giorni: int = 7) -> int:
         oggi = date.today()
         fine_periodo = oggi + timedelta(days=giorni)
 
+        import eventi_index
+        if eventi_index.is_loaded():
+            return eventi_index.conta(oggi.isoformat(), fine_periodo.isoformat())
+
+        import mirror
+        count = mirror.conta(
+            "eventi",
+            [("data_inizio", "<=", fine_periodo.isoformat()), ("data_fine", ">=", oggi.isoformat()), ("attivo", "=", True)]
+        )
+        if count is not None:
+            return count
+
         response = supabase.table("eventi") \
             .select("id", count="exact") \
             .lte("data_inizio", fine_periodo.isoformat()) \
@@ -444,6 +831,20 @@ def get_evento_imperdibile() -> Optional[dict]:
     try:
         oggi = date.today().isoformat()
 
+        import eventi_index
+        if eventi_index.is_loaded():
+            imperdibili = [e for e in eventi_index.in_corso(oggi) if e.get("imperdibile") is True]
+            return dict(imperdibili[0]) if imperdibili else None
+
+        import mirror
+        righe = mirror.seleziona(
+            "eventi",
+            [("data_inizio", "<=", oggi), ("data_fine", ">=", oggi), ("attivo", "=", True), ("imperdibile", "=", True)],
+            limit=1
+        )
+        if righe is not None:
+            return righe[0] if righe else None
+
         response = supabase.table("eventi") \
             .select("*") \
             .lte("data_inizio", oggi) \
@@ -472,7 +873,20 @@ def get_eventi_periodo(data_inizio: str, data_fine: str, limit: int = None, offs
         offset: offset per paginazione
         categoria: filtra per categoria (opzionale)
     """
+    import mirror
+    import eventi_index
+
     try:
+        if eventi_index.is_loaded():
+            return [dict(e) for e in eventi_index.sovrapposti(data_inizio, data_fine, categoria, limit=limit, offset=offset)]
+
+        filtri = [("data_inizio", "<=", data_fine), ("data_fine", ">=", data_inizio), ("attivo", "=", True)]
+        if categoria:
+            filtri.append(("categoria", "=", categoria))
+        righe = mirror.seleziona("eventi", filtri, ordine="data_inizio", limit=limit, offset=offset)
+        if righe is not None:
+            return righe
+
         query = supabase.table("eventi") \
             .select("*") \
             .lte("data_inizio", data_fine) \
@@ -498,7 +912,20 @@ def get_eventi_periodo(data_inizio: str, data_fine: str, limit: int = None, offs
 
 def get_eventi_count_periodo(data_inizio: str, data_fine: str, categoria: str = None) -> int:
     """Conta eventi in un periodo specifico."""
+    import mirror
+    import eventi_index
+
     try:
+        if eventi_index.is_loaded():
+            return eventi_index.conta(data_inizio, data_fine, categoria)
+
+        filtri = [("data_inizio", "<=", data_fine), ("data_fine", ">=", data_inizio), ("attivo", "=", True)]
+        if categoria:
+            filtri.append(("categoria", "=", categoria))
+        count = mirror.conta("eventi", filtri)
+        if count is not None:
+            return count
+
         query = supabase.table("eventi") \
             .select("id", count="exact") \
             .lte("data_inizio", data_fine) \
@@ -515,9 +942,77 @@ def get_eventi_count_periodo(data_inizio: str, data_fine: str, categoria: str =
         return 0
 
 
+def get_eventi_pagina(data_inizio: str, data_fine: str, limit: int, pagina: int = 0,
+                      dopo: tuple = None, categoria: str = None) -> dict:
+    """
+    Una pagina di eventi del periodo e il totale, in una sola chiamata.
+
+    Args:
+        data_inizio: data inizio periodo (YYYY-MM-DD)
+        data_fine: data fine periodo (YYYY-MM-DD)
+        limit: eventi per pagina
+        pagina: numero pagina (da 0), usato per l'offset se manca il cursore
+        dopo: cursore (data_inizio, id) dell'ultimo evento della pagina precedente (keyset)
+        categoria: filtra per categoria (opzionale)
+
+    Returns:
+        {"eventi": [...], "totale": n, "cursore": (data_inizio, id) dell'ultimo evento o None}
+    """
+    import mirror
+    import eventi_index
+
+    try:
+        if eventi_index.is_loaded():
+            righe, totale = eventi_index.pagina(data_inizio, data_fine, categoria, limit=limit,
+                                                dopo=dopo, offset=pagina * limit)
+            righe = [dict(e) for e in righe]
+        else:
+            filtri = [("data_inizio", "<=", data_fine), ("data_fine", ">=", data_inizio), ("attivo", "=", True)]
+            if categoria:
+                filtri.append(("categoria", "=", categoria))
+            righe = mirror.seleziona("eventi", filtri, ordine=("data_inizio", "id"), limit=limit, offset=pagina * limit)
+            if righe is not None:
+                totale = mirror.conta("eventi", filtri) or 0
+            else:
+                # Righe e totale nella stessa richiesta (count="exact" ignora limit/offset)
+                query = supabase.table("eventi") \
+                    .select("*", count="exact") \
+                    .lte("data_inizio", data_fine) \
+                    .gte("data_fine", data_inizio) \
+                    .eq("attivo", True)
+                if categoria:
+                    query = query.eq("categoria", categoria)
+                if dopo:
+                    query = query.or_(f"data_inizio.gt.{dopo[0]},and(data_inizio.eq.{dopo[0]},id.gt.{dopo[1]})")
+                query = query.order("data_inizio").order("id").limit(limit)
+                if pagina and not dopo:
+                    query = query.offset(pagina * limit)
+                response = query.execute()
+                righe = response.data or []
+                # Con il cursore il conteggio copre solo gli eventi successivi
+                totale = (response.count or 0) + (pagina * limit if dopo else 0)
+
+        cursore = (righe[-1]["data_inizio"], righe[-1].get("id")) if righe else None
+        return {"eventi": righe, "totale": totale, "cursore": cursore}
+    except Exception as e:
+        logger.error(f"Errore get_eventi_pagina: {e}")
+        return {"eventi": [], "totale": 0, "cursore": None}
+
+
 def get_evento_by_id(evento_id: int) -> Optional[dict]:
     """Restituisce un evento per ID."""
+    import mirror
+    import eventi_index
+
     try:
+        if eventi_index.is_loaded():
+            evento = eventi_index.evento(evento_id)
+            return dict(evento) if evento else None
+
+        righe = mirror.seleziona("eventi", [("id", "=", evento_id), ("attivo", "=", True)], limit=1)
+        if righe is not None:
+            return righe[0] if righe else None
+
         response = supabase.table("eventi") \
             .select("*") \
             .eq("id", evento_id) \
@@ -535,7 +1030,23 @@ def get_evento_by_id(evento_id: int) -> Optional[dict]:
 
 def get_eventi_giorno(data: str) -> list:
     """Restituisce tutti gli eventi di un giorno specifico."""
+    import mirror
+    import eventi_index
+
     try:
+        if eventi_index.is_loaded():
+            # Come .order("orario"): NULL in fondo
+            eventi = sorted(eventi_index.in_corso(data), key=lambda e: (e.get("orario") is None, e.get("orario") or ""))
+            return [dict(e) for e in eventi]
+
+        righe = mirror.seleziona(
+            "eventi",
+            [("data_inizio", "<=", data), ("data_fine", ">=", data), ("attivo", "=", True)],
+            ordine="orario"
+        )
+        if righe is not None:
+            return righe
+
         response = supabase.table("eventi") \
             .select("*") \
             .lte("data_inizio", data) \
@@ -554,73 +1065,84 @@ def get_giorni_con_eventi(anno: int, mese: int) -> list:
     """Restituisce lista di giorni del mese che hanno eventi."""
     from datetime import date
     import calendar
+    import eventi_index
 
     try:
+        if eventi_index.is_loaded():
+            return eventi_index.giorni_mese(anno, mese)
+
         # Primo e ultimo giorno del mese
         primo_giorno = date(anno, mese, 1)
         ultimo_giorno = date(anno, mese, calendar.monthrange(anno, mese)[1])
 
-        response = supabase.table("eventi") \
-            .select("data_inizio, data_fine") \
-            .lte("data_inizio", ultimo_giorno.isoformat()) \
-            .gte("data_fine", primo_giorno.isoformat()) \
-            .eq("attivo", True) \
-            .execute()
+        import mirror
+        righe = mirror.seleziona(
+            "eventi",
+            [("data_inizio", "<=", ultimo_giorno.isoformat()), ("data_fine", ">=", primo_giorno.isoformat()), ("attivo", "=", True)]
+        )
+        if righe is None:
+            righe = supabase.table("eventi") \
+                .select("data_inizio, data_fine") \
+                .lte("data_inizio", ultimo_giorno.isoformat()) \
+                .gte("data_fine", primo_giorno.isoformat()) \
+                .eq("attivo", True) \
+                .execute().data
 
-        giorni_con_eventi = set()
-        if response.data:
-            for evento in response.data:
-                # Aggiungi tutti i giorni coperti dall'evento
-                try:
-                    inizio = date.fromisoformat(evento["data_inizio"])
-                    fine = date.fromisoformat(evento["data_fine"])
-                    current = max(inizio, primo_giorno)
-                    end = min(fine, ultimo_giorno)
-                    while current <= end:
-                        if current.month == mese:
-                            giorni_con_eventi.add(current.day)
-                        current = date(current.year, current.month, current.day + 1) if current.day < 28 else current.replace(day=current.day + 1)
-                except:
-                    pass
-
-        return sorted(list(giorni_con_eventi))
+        # Giorni coperti dagli eventi (difference array, senza scorrere i giorni di ogni evento)
+        return eventi_index.giorni_da_bitmap(eventi_index.bitmap_giorni(righe or [], anno, mese))
     except Exception as e:
         logger.error(f"Errore get_giorni_con_eventi: {e}")
         return []
 
 
 def get_categorie_eventi() -> list:
-    """Restituisce le categorie disponibili con conteggio eventi attivi."""
+    """
+    Restituisce le categorie presenti con conteggio eventi attivi non ancora finiti.
+    Dall'indice eventi (in cache per giorno e versione dati), altrimenti una sola
+    query aggregata in Python.
+    """
+    from collections import Counter
     from datetime import date
+    import mirror
+    import eventi_index
 
-    categorie = ["mercato", "sagra", "musica", "cultura", "sport", "famiglia"]
     oggi = date.today().isoformat()
-    result = []
 
-    for cat in categorie:
-        try:
-            response = supabase.table("eventi") \
-                .select("id", count="exact") \
+    try:
+        if eventi_index.is_loaded():
+            return [dict(c) for c in eventi_index.categorie(oggi)]
+
+        righe = mirror.seleziona("eventi", [("data_fine", ">=", oggi), ("attivo", "=", True)])
+        if righe is None:
+            righe = supabase.table("eventi") \
+                .select("categoria") \
                 .gte("data_fine", oggi) \
                 .eq("attivo", True) \
-                .eq("categoria", cat) \
-                .execute()
-            count = response.count or 0
-            if count > 0:
-                result.append({"categoria": cat, "count": count})
-        except:
-            pass
+                .execute().data
 
-    return result
+        return eventi_index.ordina_categorie(Counter(r.get("categoria") for r in righe or []))
+    except Exception as e:
+        logger.error(f"Errore get_categorie_eventi: {e}")
+        return []
 
 
 # ============ TRASPORTI ============
 
+def _riferimenti():
+    """Snapshot dati di riferimento (riferimenti.py) se caricato, altrimenti None"""
+    import riferimenti
+    return riferimenti if riferimenti.is_loaded() else None
+
+
 def get_operatori_attivi(tipo: str = None) -> list:
     """
     Restituisce operatori attivi, opzionalmente filtrati per tipo.
     tipo: 'bus' o 'ferry' (None = tutti)
     """
+    rif = _riferimenti()
+    if rif:
+        return [dict(o) for o in rif.righe("operatori") if o.get("attivo") and (not tipo or o.get("tipo") == tipo)]
+
     try:
         query = supabase.table("operatori") \
             .select("*") \
@@ -639,6 +1161,11 @@ def get_operatori_attivi(tipo: str = None) -> list:
 
 def get_operatore_by_id(operatore_id: int) -> Optional[dict]:
     """Restituisce un operatore specifico per ID."""
+    rif = _riferimenti()
+    if rif:
+        operatore = rif.per_id("operatori", operatore_id)
+        return dict(operatore) if operatore else None
+
     try:
         response = supabase.table("operatori") \
             .select("*") \
@@ -655,6 +1182,10 @@ def get_operatore_by_id(operatore_id: int) -> Optional[dict]:
 
 def get_linee_by_tipo(tipo: str) -> list:
     """Restituisce tutte le linee attive di un tipo (bus/traghetto)."""
+    rif = _riferimenti()
+    if rif:
+        return [dict(l) for l in rif.righe("linee") if l.get("attivo") and l.get("tipo") == tipo]
+
     try:
         response = supabase.table("linee") \
             .select("*, operatori(nome, sito_web)") \
@@ -670,6 +1201,11 @@ def get_linee_by_tipo(tipo: str) -> list:
 
 def get_linea_by_id(linea_id: int) -> Optional[dict]:
     """Restituisce una linea specifica per ID."""
+    rif = _riferimenti()
+    if rif:
+        linea = rif.per_id("linee", linea_id)
+        return dict(linea) if linea and linea.get("attivo") else None
+
     try:
         response = supabase.table("linee") \
             .select("*, operatori(nome, sito_web)") \
@@ -687,6 +1223,10 @@ def get_linea_by_id(linea_id: int) -> Optional[dict]:
 
 def get_zone_attive() -> list:
     """Restituisce tutte le zone attive ordinate geograficamente."""
+    rif = _riferimenti()
+    if rif:
+        return [dict(z) for z in rif.righe("zone") if z.get("attivo")]
+
     try:
         response = supabase.table("zone") \
             .select("*") \
@@ -699,8 +1239,34 @@ def get_zone_attive() -> list:
         return []
 
 
+def get_zona_by_id(zona_id: int) -> Optional[dict]:
+    """Restituisce una zona attiva per ID."""
+    rif = _riferimenti()
+    if rif:
+        zona = rif.per_id("zone", zona_id)
+        return dict(zona) if zona and zona.get("attivo") else None
+
+    try:
+        response = supabase.table("zone") \
+            .select("*") \
+            .eq("id", zona_id) \
+            .eq("attivo", True) \
+            .limit(1) \
+            .execute()
+        if response.data and len(response.data) > 0:
+            return response.data[0]
+        return None
+    except Exception as e:
+        logger.error(f"Errore get_zona_by_id: {e}")
+        return None
+
+
 def get_destinazioni_attive() -> list:
     """Restituisce tutte le destinazioni attive."""
+    rif = _riferimenti()
+    if rif:
+        return [dict(d) for d in rif.righe("destinazioni") if d.get("attivo")]
+
     try:
         response = supabase.table("destinazioni") \
             .select("*") \
@@ -715,6 +1281,11 @@ def get_destinazioni_attive() -> list:
 
 def get_destinazione_by_id(destinazione_id: int) -> Optional[dict]:
     """Restituisce una destinazione specifica per ID."""
+    rif = _riferimenti()
+    if rif:
+        destinazione = rif.per_id("destinazioni", destinazione_id)
+        return dict(destinazione) if destinazione and destinazione.get("attivo") else None
+
     try:
         response = supabase.table("destinazioni") \
             .select("*") \
@@ -732,6 +1303,11 @@ def get_destinazione_by_id(destinazione_id: int) -> Optional[dict]:
 
 def get_percorsi_by_destinazione(destinazione_codice: str) -> list:
     """Restituisce tutti i percorsi per una destinazione (by codice)."""
+    rif = _riferimenti()
+    if rif:
+        return [dict(p) for p in rif.righe("percorsi")
+                if p.get("attivo") and p.get("destinazione_codice") == destinazione_codice]
+
     try:
         response = supabase.table("percorsi") \
             .select("*, linee(nome, tipo, operatori(nome, link))") \
@@ -747,6 +1323,10 @@ def get_percorsi_by_destinazione(destinazione_codice: str) -> list:
 
 def get_tariffe_by_operatore(operatore_id: int) -> list:
     """Restituisce tariffe di un operatore."""
+    rif = _riferimenti()
+    if rif:
+        return [dict(t) for t in rif.righe("tariffe") if t.get("attivo") and t.get("operatore_id") == operatore_id]
+
     try:
         response = supabase.table("tariffe") \
             .select("*") \
@@ -762,6 +1342,10 @@ def get_tariffe_by_operatore(operatore_id: int) -> list:
 
 def get_tariffe_by_linea(linea_id: int) -> list:
     """Restituisce tariffe di una linea specifica."""
+    rif = _riferimenti()
+    if rif:
+        return [dict(t) for t in rif.righe("tariffe") if t.get("attivo") and t.get("linea_id") == linea_id]
+
     try:
         response = supabase.table("tariffe") \
             .select("*") \
@@ -811,6 +1395,13 @@ def get_prossimi_orari_bus(linea_codice: str, fermata_nome: str, direzione: str
         # Per ora usiamo sempre "fF" finché non ci sono dati separati
         tipo_giorno_db = "fF"
 
+        # Indice in memoria (orari_index): nessuna query se già caricato
+        import orari_index
+        risultati = orari_index.prossimi_orari(linea_codice, fermata_nome, direzione, ora_min, tipo_giorno_db, limit)
+        if risultati is not None:
+            logger.debug(f"[ORARI_BUS] Indice: linea={linea_codice}, fermata={fermata_nome}, dir={direzione}, ora>={ora_min} -> {[r.get('ora') for r in risultati]}")
+            return risultati
+
         # LOG DETTAGLIATO QUERY
         logger.info(f"[ORARI_BUS] Query: linea={linea_codice}, fermata={fermata_nome}, dir={direzione}, tipo={tipo_giorno_db}, ora>={ora_min}, limit={limit}")
 
@@ -898,6 +1489,15 @@ def get_orari_traghetto(linea_codice: str, fermata_nome: str, direzione: str = "
                     orario_dict["ora"] = ora_raw[:5]
             return orario_dict
 
+        # Indice in memoria (orari_index): nessuna query se già caricato
+        import orari_index
+        ora_min = None
+        if ora_partenza:
+            ora_min = ora_partenza if len(ora_partenza) > 5 else f"{ora_partenza}:00"
+        risultati = orari_index.orari_fermata(linea_codice, fermata_nome, direzione, ora_min, limit)
+        if risultati is not None:
+            return risultati
+
         # Query base
         query = supabase.table("orari_bus") \
             .select("*") \
@@ -928,6 +1528,10 @@ def get_fermata_bus(linea_codice: str, fermata_nome: str) -> Optional[dict]:
     Returns:
         {nome, zona, ordine, tempo_da_capolinea, ...}
     """
+    import orari_index
+    if orari_index.fermate_loaded():
+        return orari_index.fermata(linea_codice, fermata_nome)
+
     try:
         response = supabase.table("fermate_bus") \
             .select("*") \
@@ -951,6 +1555,10 @@ def get_fermate_linea(linea_codice: str, direzione: str = "andata") -> list:
     Returns:
         Lista di fermate ordinate per ordine
     """
+    import orari_index
+    if orari_index.fermate_loaded():
+        return orari_index.fermate_linea(linea_codice)
+
     try:
         response = supabase.table("fermate_bus") \
             .select("*") \
@@ -971,6 +1579,10 @@ def get_tempo_tra_fermate(linea_codice: str, fermata_partenza: str, fermata_arri
     Returns:
         Tempo in minuti, o None se non trovato
     """
+    import orari_index
+    if orari_index.fermate_loaded():
+        return orari_index.tempo_tra_fermate(linea_codice, fermata_partenza, fermata_arrivo)
+
     try:
         fermata_p = get_fermata_bus(linea_codice, fermata_partenza)
         fermata_a = get_fermata_bus(linea_codice, fermata_arrivo)
@@ -1019,8 +1631,12 @@ def calcola_arrivo_fermata(ora_partenza: str, linea_codice: str, fermata_partenz
         Orario arrivo (HH:MM) o None
     """
     from datetime import datetime, timedelta
+    import orari_index
 
     try:
+        if orari_index.fermate_loaded():
+            return orari_index.arrivo_fermata(ora_partenza, linea_codice, fermata_partenza, fermata_arrivo)
+
         tempo = get_tempo_tra_fermate(linea_codice, fermata_partenza, fermata_arrivo)
         if tempo is None:
             return None
@@ -1048,18 +1664,22 @@ def get_fortini_by_zona(zona: str) -> list:
     Returns:
         Lista di fortini ordinati
     """
+    import mirror
+
     try:
         # Ordine ruolo: hub=1, tappa=2, isolato=3
-        response = supabase.table("fortini") \
-            .select("*") \
-            .eq("zona", zona) \
-            .execute()
+        righe = mirror.seleziona("fortini", [("zona", "=", zona)])
+        if righe is None:
+            righe = supabase.table("fortini") \
+                .select("*") \
+                .eq("zona", zona) \
+                .execute().data
 
-        if response.data:
+        if righe:
             # Ordina per ruolo_percorso
             ruolo_ordine = {"hub": 1, "tappa": 2, "isolato": 3}
             fortini = sorted(
-                response.data,
+                righe,
                 key=lambda f: ruolo_ordine.get(f.get("ruolo_percorso", "isolato"), 3)
             )
             return fortini
@@ -1071,7 +1691,13 @@ def get_fortini_by_zona(zona: str) -> list:
 
 def get_fortino_by_id(fortino_id: str) -> Optional[dict]:
     """Restituisce un fortino specifico per ID."""
+    import mirror
+
     try:
+        righe = mirror.seleziona("fortini", [("id", "=", fortino_id)], limit=1)
+        if righe is not None:
+            return righe[0] if righe else None
+
         response = supabase.table("fortini") \
             .select("*") \
             .eq("id", fortino_id) \
@@ -1088,7 +1714,13 @@ def get_fortino_by_id(fortino_id: str) -> Optional[dict]:
 
 def get_percorsi_fortini_attivi() -> list:
     """Restituisce tutti i percorsi fortini attivi."""
+    import mirror
+
     try:
+        righe = mirror.seleziona("percorsi", ordine="id")
+        if righe is not None:
+            return righe
+
         response = supabase.table("percorsi") \
             .select("*") \
             .order("id") \
@@ -1110,18 +1742,22 @@ def get_fortini_in_percorso(percorso_id: str) -> list:
     Returns:
         Lista di fortini con ordine nel percorso
     """
-    try:
-        # Join percorsi_fortini con fortini
-        response = supabase.table("percorsi_fortini") \
-            .select("ordine, fortini(*)") \
-            .eq("percorso_id", percorso_id) \
-            .order("ordine") \
-            .execute()
+    import mirror
 
-        if response.data:
+    try:
+        # Join percorsi_fortini con fortini (nel mirror la embed è già nella riga)
+        righe = mirror.seleziona("percorsi_fortini", [("percorso_id", "=", percorso_id)], ordine="ordine")
+        if righe is None:
+            righe = supabase.table("percorsi_fortini") \
+                .select("ordine, fortini(*)") \
+                .eq("percorso_id", percorso_id) \
+                .order("ordine") \
+                .execute().data
+
+        if righe:
             # Estrai fortini con ordine
             result = []
-            for item in response.data:
+            for item in righe:
                 fortino = item.get("fortini", {})
                 if fortino:
                     fortino["ordine_percorso"] = item.get("ordine", 0)
@@ -1135,7 +1771,13 @@ def get_fortini_in_percorso(percorso_id: str) -> list:
 
 def get_percorso_by_id(percorso_id: str) -> Optional[dict]:
     """Restituisce un percorso specifico per ID."""
+    import mirror
+
     try:
+        righe = mirror.seleziona("percorsi", [("id", "=", percorso_id)], limit=1)
+        if righe is not None:
+            return righe[0] if righe else None
+
         response = supabase.table("percorsi") \
             .select("*") \
             .eq("id", percorso_id) \
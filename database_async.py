@@ -0,0 +1,99 @@
+"""
+Database asincrono - versioni awaitable delle funzioni di database.py
+
+Il client Supabase è sincrono: ogni query chiamata direttamente da un handler
+async blocca l'intero event loop (e quindi tutte le altre chat).
+Questo modulo espone, per ogni funzione pubblica di database.py, una versione
+awaitable che esegue la query in un pool di thread dedicato.
+
+Uso negli handler:
+    import database_async as db
+    user = await db.get_user(chat_id)
+"""
+import asyncio
+import functools
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from config import DB_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Pool di thread condiviso per le query (il client httpx di Supabase è thread-safe)
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+
+# Wrapper già generati (nome funzione -> coroutine function)
+_wrappers = {}
+
+# Funzioni che lavorano solo in memoria: restituite sincrone, senza passare
+# dal pool (non devono attendere dietro query lente)
+NON_BLOCCANTI = {
+    "queue_last_update_id",
+    "get_user_cache_stats",
+    "get_writer_stats",
+    "check_duplicate_update",
+}
+
+# Funzioni servite dalla memoria una volta caricati testi e config (job in main.py):
+# awaitable ma eseguite direttamente sul loop, senza passare dal pool
+IN_MEMORIA = {
+    "get_testi",
+    "get_config",
+    "get_text",
+}
+
+
+async def run(func, *args, **kwargs):
+    """Esegue una funzione sincrona nel pool DB senza bloccare l'event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _make_async(func):
+    """Crea la versione awaitable di una funzione di database.py"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+def _make_in_memoria(func):
+    """Versione awaitable che legge dalla memoria (dal pool solo al primo caricamento)"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if database.testi_config_caricati():
+            return func(*args, **kwargs)
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+def __getattr__(name: str):
+    """
+    Risolve db.<funzione> restituendo la versione awaitable della funzione
+    omonima di database.py. Le funzioni aggiunte a database.py sono
+    disponibili automaticamente, senza doverle duplicare qui.
+    """
+    if name in _wrappers:
+        return _wrappers[name]
+
+    if name.startswith("_"):
+        raise AttributeError(f"module 'database_async' has no attribute '{name}'")
+
+    attr = getattr(database, name)
+    if name in NON_BLOCCANTI:
+        return attr
+    if name in IN_MEMORIA:
+        _wrappers[name] = _make_in_memoria(attr)
+        return _wrappers[name]
+    if inspect.isfunction(attr) and attr.__module__ == database.__name__:
+        _wrappers[name] = _make_async(attr)
+        return _wrappers[name]
+    return attr
+
+
+def shutdown():
+    """Chiude il pool di thread (chiamato allo shutdown del bot)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("Pool DB asincrono chiuso")
@@ -0,0 +1,120 @@
+"""
+Deduplica update Telegram in memoria
+
+Telegram riprova il webhook se non riceve risposta in tempo, quindi lo stesso
+update_id può arrivare più volte. Invece di confrontarlo con last_update_id
+sul database, teniamo una finestra degli ultimi update_id visti:
+- ring buffer (deque) + set per il check O(1)
+- watermark: gli update_id usciti dalla finestra (più vecchi) sono sempre duplicati,
+  sfruttando il fatto che gli update_id di Telegram sono crescenti
+- Telegram però può ripartire da un update_id casuale dopo una settimana senza
+  update: un salto all'indietro più ampio della finestra è trattato come reset
+  (finestra e watermark azzerati), non come un duplicato
+
+Il backend è sostituibile (es. condiviso tra più repliche): "memory" è quello
+locale, usato di default e come ripiego.
+"""
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict
+
+from config import DEDUP_BACKEND, DEDUP_WINDOW
+
+logger = logging.getLogger(__name__)
+
+
+class DedupBackend:
+    """Interfaccia backend deduplica"""
+
+    def check_and_add(self, update_id: int) -> bool:
+        """Registra update_id. Ritorna True se era già stato visto."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryDedupBackend(DedupBackend):
+    """Finestra locale degli ultimi `window` update_id (ring buffer + set)"""
+
+    def __init__(self, window: int = DEDUP_WINDOW):
+        self._ring = deque()
+        self._seen = set()
+        self._window = window
+        self._watermark = 0  # update_id più alto uscito dalla finestra
+        self._lock = threading.Lock()
+        self._duplicati = 0
+        self._reset = 0
+
+    def check_and_add(self, update_id: int) -> bool:
+        with self._lock:
+            if update_id < self._watermark - self._window:
+                # Troppo vecchio per essere un retry: update_id ripartito da capo
+                logger.warning(f"Reset update_id rilevato ({update_id} < watermark {self._watermark}), finestra azzerata")
+                self._ring.clear()
+                self._seen.clear()
+                self._watermark = 0
+                self._reset += 1
+
+            if update_id <= self._watermark or update_id in self._seen:
+                self._duplicati += 1
+                return True
+
+            self._ring.append(update_id)
+            self._seen.add(update_id)
+            if len(self._ring) > self._window:
+                vecchio = self._ring.popleft()
+                self._seen.discard(vecchio)
+                if vecchio > self._watermark:
+                    self._watermark = vecchio
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "finestra": len(self._ring),
+                "duplicati": self._duplicati,
+                "reset": self._reset
+            }
+
+
+# Registro backend: nome -> factory
+_backends: Dict[str, Callable[[], DedupBackend]] = {
+    "memory": MemoryDedupBackend,
+}
+
+_backend: DedupBackend = None
+
+
+def register_backend(name: str, factory: Callable[[], DedupBackend]):
+    """Registra un backend alternativo (es. condiviso tra repliche)"""
+    _backends[name] = factory
+
+
+def get_backend() -> DedupBackend:
+    """Backend attivo, creato al primo utilizzo secondo DEDUP_BACKEND"""
+    global _backend
+    if _backend is None:
+        factory = _backends.get(DEDUP_BACKEND)
+        if factory is None:
+            logger.warning(f"Backend dedup '{DEDUP_BACKEND}' non disponibile, uso memoria locale")
+            factory = MemoryDedupBackend
+        _backend = factory()
+    return _backend
+
+
+def is_duplicate(update_id: int) -> bool:
+    """Ritorna True se update_id è già stato elaborato (e lo registra)"""
+    try:
+        return get_backend().check_and_add(update_id)
+    except Exception as e:
+        # Un backend remoto non raggiungibile non deve bloccare gli update
+        logger.error(f"Errore backend dedup: {e}")
+        return False
+
+
+def get_dedup_stats() -> dict:
+    """Statistiche deduplica per /stats"""
+    return get_backend().stats()
@@ -0,0 +1,355 @@
+"""
+Indice in memoria degli eventi attivi (tabella eventi)
+
+Gli eventi attivi sono intervalli [data_inizio, data_fine] (date ISO, confrontabili
+come stringhe). L'indice viene caricato una volta e ricaricato in background solo
+se cambia la versione dei dati; per l'insieme completo e per ogni categoria tiene:
+- gli eventi ordinati per (data_inizio, id) e l'array delle date di inizio:
+  gli eventi che iniziano dentro [da, a] sono una fetta contigua (bisect)
+- un albero di intervalli centrato: gli eventi iniziati prima di `da` e ancora
+  in corso sono una stabbing query su `da`, O(log n + k)
+- gli array ordinati di inizi e fini: il conteggio delle sovrapposizioni con
+  [da, a] è #(inizio <= a) - #(fine < da), O(log n)
+
+Così lista, conteggio, filtro categoria e paginazione della sezione eventi
+non fanno query al database.
+
+Per il calendario ogni mese è una bitmap dei giorni con eventi (bit d = giorno d),
+calcolata con un difference array sugli eventi del mese: i mesi vicini sono
+pre-calcolati al caricamento, gli altri al primo accesso, e la cache vive con
+l'indice (nuova versione dati = nuove bitmap).
+"""
+import bisect
+import calendar
+import logging
+import time
+from datetime import date
+from typing import Optional, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ordine di visualizzazione delle categorie note; le altre seguono in ordine alfabetico
+CATEGORIE = ("mercato", "sagra", "musica", "cultura", "sport", "famiglia")
+
+# Bitmap calendario pre-calcolate al caricamento: dal mese scorso ai prossimi 12
+MESI_INDIETRO = 1
+MESI_AVANTI = 12
+
+# Indice corrente, sostituito in blocco ad ogni ricarica (swap atomico)
+_indice = {
+    "tutti": None,       # indice su tutti gli eventi attivi (vedi _costruisci)
+    "categorie": {},     # categoria -> indice sugli eventi attivi di quella categoria
+    "per_id": {},        # id -> evento attivo
+    "mesi": {},          # (anno, mese) -> bitmap giorni con eventi
+    "categorie_oggi": None,  # (giorno, conteggi per categoria) calcolati per quel giorno
+    "totali": 0,         # righe della tabella, attive e non (per /stats)
+    "versione": None,
+    "loaded_at": 0
+}
+
+
+def _versione() -> Optional[tuple]:
+    """Versione dati economica: dal mirror se sincronizzato, altrimenti (max updated_at o id, righe)"""
+    import mirror
+    versione = mirror.versione("eventi")
+    if versione is not None:
+        return ("mirror",) + versione
+
+    from database import supabase
+    for colonna in ("updated_at", "id"):
+        try:
+            response = supabase.table("eventi") \
+                .select(colonna, count="exact") \
+                .order(colonna, desc=True) \
+                .limit(1) \
+                .execute()
+            massimo = response.data[0][colonna] if response.data else None
+            return (colonna, massimo, response.count or 0)
+        except Exception:
+            continue
+    logger.warning("Versione eventi non disponibile")
+    return None
+
+
+def _carica_righe() -> List[dict]:
+    import mirror
+    righe = mirror.righe("eventi")
+    if righe is not None:
+        return righe
+
+    from database import supabase
+    return supabase.table("eventi").select("*").execute().data or []
+
+
+def _albero(eventi: List[dict]) -> Optional[tuple]:
+    """
+    Albero di intervalli centrato: (centro, per_inizio, per_fine_desc, sinistra, destra).
+    Nel nodo gli eventi che contengono il centro, ordinati per inizio e per fine decrescente.
+    """
+    if not eventi:
+        return None
+    inizi = sorted(e["data_inizio"] for e in eventi)
+    centro = inizi[len(inizi) // 2]
+    sinistra = [e for e in eventi if e["data_fine"] < centro]
+    destra = [e for e in eventi if e["data_inizio"] > centro]
+    qui = [e for e in eventi if e["data_inizio"] <= centro <= e["data_fine"]]
+    return (
+        centro,
+        sorted(qui, key=lambda e: e["data_inizio"]),
+        sorted(qui, key=lambda e: e["data_fine"], reverse=True),
+        _albero(sinistra),
+        _albero(destra)
+    )
+
+
+def _in_corso(albero: Optional[tuple], giorno: str) -> List[dict]:
+    """Stabbing query: eventi con data_inizio <= giorno <= data_fine"""
+    risultato = []
+    nodo = albero
+    while nodo is not None:
+        centro, per_inizio, per_fine, sinistra, destra = nodo
+        if giorno < centro:
+            for e in per_inizio:
+                if e["data_inizio"] > giorno:
+                    break
+                risultato.append(e)
+            nodo = sinistra
+        elif giorno > centro:
+            for e in per_fine:
+                if e["data_fine"] < giorno:
+                    break
+                risultato.append(e)
+            nodo = destra
+        else:
+            risultato.extend(per_inizio)
+            break
+    return risultato
+
+
+def _ordine(evento: dict) -> tuple:
+    return (evento["data_inizio"], evento.get("id") or 0)
+
+
+def _costruisci(eventi: List[dict]) -> dict:
+    ordinati = sorted(eventi, key=_ordine)
+    return {
+        "eventi": ordinati,
+        "chiavi": [_ordine(e) for e in ordinati],
+        "inizi": [e["data_inizio"] for e in ordinati],
+        "fini": sorted(e["data_fine"] for e in ordinati),
+        "albero": _albero(ordinati)
+    }
+
+
+def carica(versione: Optional[tuple] = None) -> bool:
+    """Carica (o ricarica) gli eventi attivi e sostituisce l'indice"""
+    global _indice
+    try:
+        t0 = time.perf_counter()
+        righe = _carica_righe()
+        # Come i filtri .eq("attivo", True) / .lte/.gte sulle date: senza date l'evento non compare.
+        # Scartati anche gli intervalli invertiti (fine < inizio), che falserebbero i conteggi
+        attivi = [
+            r for r in righe
+            if r.get("attivo") is True and r.get("data_inizio") and r.get("data_fine")
+            and r["data_fine"] >= r["data_inizio"]
+        ]
+
+        per_categoria: Dict[str, list] = {}
+        for evento in attivi:
+            per_categoria.setdefault(evento.get("categoria"), []).append(evento)
+
+        tutti = _costruisci(attivi)
+        oggi = date.today()
+        mesi = {}
+        for k in range(-MESI_INDIETRO, MESI_AVANTI + 1):
+            anno, mese = divmod(oggi.year * 12 + oggi.month - 1 + k, 12)
+            mesi[(anno, mese + 1)] = _bitmap_mese(tutti, anno, mese + 1)
+
+        _indice = {
+            "tutti": tutti,
+            "categorie": {c: _costruisci(e) for c, e in per_categoria.items() if c},
+            "per_id": {str(r["id"]): r for r in righe if r.get("attivo") is True and "id" in r},
+            "mesi": mesi,
+            "categorie_oggi": None,
+            "totali": len(righe),
+            "versione": versione if versione is not None else _versione(),
+            "loaded_at": time.time()
+        }
+        logger.info(f"Indice eventi caricato: {len(attivi)} attivi su {len(righe)}, "
+                    f"{len(per_categoria)} categorie in {(time.perf_counter() - t0) * 1000:.0f}ms")
+        return True
+    except Exception as e:
+        logger.error(f"Errore caricamento indice eventi: {e}")
+        return False
+
+
+def refresh() -> bool:
+    """Ricarica l'indice solo se la versione dei dati è cambiata. Ritorna True se ricaricato."""
+    versione = _versione()
+    if versione is not None and versione == _indice["versione"] and _indice["loaded_at"]:
+        return False
+    return carica(versione)
+
+
+def is_loaded() -> bool:
+    return _indice["loaded_at"] > 0
+
+
+def _sotto_indice(categoria: Optional[str]) -> Optional[dict]:
+    if categoria:
+        return _indice["categorie"].get(categoria)
+    return _indice["tutti"]
+
+
+def sovrapposti(da: str, a: str, categoria: str = None, limit: int = None, offset: int = 0) -> List[dict]:
+    """
+    Eventi attivi con data_inizio <= a e data_fine >= da, ordinati per data_inizio
+    (come get_eventi_periodo). Le righe non vanno modificate.
+    """
+    indice = _sotto_indice(categoria)
+    if indice is None:
+        return []
+    return _sovrapposti(indice, da, a, limit, offset)
+
+
+def _sovrapposti(indice: dict, da: str, a: str, limit: int = None, offset: int = 0,
+                 dopo: tuple = None) -> List[dict]:
+    # Iniziati prima di `da` e ancora in corso, poi quelli che iniziano in [da, a]
+    prima = sorted((e for e in _in_corso(indice["albero"], da) if e["data_inizio"] < da), key=_ordine)
+    i = bisect.bisect_left(indice["inizi"], da)
+    j = bisect.bisect_right(indice["inizi"], a)
+    if dopo is not None:
+        # Keyset: solo gli eventi dopo (data_inizio, id) del cursore
+        prima = [e for e in prima if _ordine(e) > dopo]
+        i = max(i, bisect.bisect_right(indice["chiavi"], dopo))
+
+    fine = offset + limit if limit else None
+    if fine is not None and fine <= len(prima):
+        return prima[offset:fine]
+    dentro = indice["eventi"][i + max(0, offset - len(prima)):j if fine is None else min(j, i + fine - len(prima))]
+    return prima[offset:] + dentro
+
+
+def pagina(da: str, a: str, categoria: str = None, limit: int = 5,
+           dopo: tuple = None, offset: int = 0) -> Tuple[List[dict], int]:
+    """
+    Una pagina di eventi sovrapposti a [da, a] e il totale del periodo.
+    dopo: cursore (data_inizio, id) dell'ultimo evento della pagina precedente;
+    senza cursore si usa offset. Le righe non vanno modificate.
+    """
+    indice = _sotto_indice(categoria)
+    if indice is None:
+        return [], 0
+    righe = _sovrapposti(indice, da, a, limit, 0 if dopo is not None else offset,
+                         tuple(dopo) if dopo is not None else None)
+    return righe, conta(da, a, categoria)
+
+
+def conta(da: str, a: str, categoria: str = None) -> int:
+    """Numero di eventi attivi sovrapposti a [da, a], O(log n)"""
+    indice = _sotto_indice(categoria)
+    if indice is None:
+        return 0
+    return bisect.bisect_right(indice["inizi"], a) - bisect.bisect_left(indice["fini"], da)
+
+
+def bitmap_giorni(eventi: List[dict], anno: int, mese: int) -> int:
+    """
+    Bitmap dei giorni del mese coperti dagli eventi (bit d = giorno d).
+    Difference array: +1 al primo giorno coperto, -1 dopo l'ultimo, poi somma prefissa;
+    O(eventi + giorni) anche con eventi lunghi più mesi.
+    """
+    giorni = calendar.monthrange(anno, mese)[1]
+    primo = date(anno, mese, 1).isoformat()
+    ultimo = date(anno, mese, giorni).isoformat()
+
+    diff = [0] * (giorni + 2)
+    for evento in eventi:
+        inizio, fine = evento.get("data_inizio"), evento.get("data_fine")
+        if not inizio or not fine or inizio[:10] > ultimo or fine[:10] < primo or fine < inizio:
+            continue
+        diff[1 if inizio[:10] < primo else int(inizio[8:10])] += 1
+        diff[(giorni if fine[:10] > ultimo else int(fine[8:10])) + 1] -= 1
+
+    bitmap = 0
+    copertura = 0
+    for giorno in range(1, giorni + 1):
+        copertura += diff[giorno]
+        if copertura > 0:
+            bitmap |= 1 << giorno
+    return bitmap
+
+
+def giorni_da_bitmap(bitmap: int) -> List[int]:
+    return [giorno for giorno in range(1, 32) if bitmap >> giorno & 1]
+
+
+def _bitmap_mese(indice: dict, anno: int, mese: int) -> int:
+    giorni = calendar.monthrange(anno, mese)[1]
+    eventi = _sovrapposti(indice, date(anno, mese, 1).isoformat(), date(anno, mese, giorni).isoformat())
+    return bitmap_giorni(eventi, anno, mese)
+
+
+def giorni_mese(anno: int, mese: int) -> List[int]:
+    """Giorni del mese con almeno un evento attivo (bitmap in cache per versione dati)"""
+    indice = _indice
+    if indice["tutti"] is None:
+        return []
+    bitmap = indice["mesi"].get((anno, mese))
+    if bitmap is None:
+        bitmap = _bitmap_mese(indice["tutti"], anno, mese)
+        indice["mesi"][(anno, mese)] = bitmap
+    return giorni_da_bitmap(bitmap)
+
+
+def ordina_categorie(conteggi: Dict[str, int]) -> List[dict]:
+    """[{categoria, count}] per le categorie con almeno un evento, nell'ordine di CATEGORIE"""
+    ordine = sorted(
+        (c for c, n in conteggi.items() if c and n > 0),
+        key=lambda c: (CATEGORIE.index(c) if c in CATEGORIE else len(CATEGORIE), c)
+    )
+    return [{"categoria": c, "count": conteggi[c]} for c in ordine]
+
+
+def categorie(oggi: str) -> List[dict]:
+    """
+    Conteggio eventi attivi non ancora finiti (data_fine >= oggi) per ogni categoria
+    presente: una bisect sull'array delle fini di ogni categoria, in cache per giorno
+    (la cache vive con l'indice, quindi anche per versione dati). Le righe non vanno modificate.
+    """
+    indice = _indice
+    cache = indice["categorie_oggi"]
+    if cache is not None and cache[0] == oggi:
+        return cache[1]
+
+    conteggi = {
+        categoria: len(sotto["fini"]) - bisect.bisect_left(sotto["fini"], oggi)
+        for categoria, sotto in indice["categorie"].items()
+    }
+    risultato = ordina_categorie(conteggi)
+    indice["categorie_oggi"] = (oggi, risultato)
+    return risultato
+
+
+def in_corso(giorno: str) -> List[dict]:
+    """Eventi attivi in corso nel giorno, ordinati per data_inizio"""
+    indice = _indice["tutti"]
+    if indice is None:
+        return []
+    return sorted(_in_corso(indice["albero"], giorno), key=_ordine)
+
+
+def evento(evento_id) -> Optional[dict]:
+    return _indice["per_id"].get(str(evento_id))
+
+
+def get_stats() -> dict:
+    tutti = _indice["tutti"]
+    return {
+        "attivi": len(tutti["eventi"]) if tutti else 0,
+        "totali": _indice["totali"],
+        "categorie": len(_indice["categorie"]),
+        "mesi": len(_indice["mesi"]),
+        "loaded_at": _indice["loaded_at"]
+    }
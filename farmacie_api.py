@@ -4,11 +4,17 @@ Estrae SOLO la farmacia di turno (non tutte le farmacie aperte)
 Comuni supportati: Cavallino-Treporti (27044), Jesolo (27019)
 """
 import asyncio
+import json
+import os
 import re
 import time
 import logging
+from datetime import datetime, timedelta
 from typing import Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+
+from config import FARMACIE_CACHE_PATH
+from farmacie_parser import estrai_farmacia_turno
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +24,18 @@ COMUNI = {
     "Jesolo": 27019
 }
 
-# Cache farmacie (durata 3 ore)
+# Cache farmacie (durata 3 ore), persistita su file per sopravvivere ai riavvii
 CACHE_DURATION = 3 * 60 * 60  # 3 ore in secondi
 _cache = {
     "data": None,
-    "timestamp": 0
+    "timestamp": 0,
+    "loaded": False
 }
 
+# Cambio turno farmacie (ora italiana): i dati precedenti non sono più validi
+CAMBIO_TURNO_ORA = 9
+CAMBIO_TURNO_MINUTI = 0
+
 
 @dataclass
 class Farmacia:
@@ -38,9 +49,12 @@ class Farmacia:
     lon: Optional[float] = None
 
 
+_RE_NON_CIFRE = re.compile(r'[^\d]')
+
+
 def _parse_telefono(tel: str) -> str:
     """Pulisce e formatta numero di telefono"""
-    tel = re.sub(r'[^\d]', '', tel)
+    tel = _RE_NON_CIFRE.sub('', tel)
     if tel and not tel.startswith('0'):
         tel = '0' + tel
     return tel
@@ -62,7 +76,7 @@ def _get_coordinates(comune: str) -> tuple:
 
 async def _fetch_html(cod_comune: int) -> Optional[str]:
     """Scarica HTML pagina farmacie"""
-    import aiohttp
+    from http_clients import get_client
 
     url = f"https://www.farmaciediturno.org/comune.asp?cod={cod_comune}"
 
@@ -73,12 +87,11 @@ async def _fetch_html(cod_comune: int) -> Optional[str]:
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                if response.status == 200:
-                    return await response.text()
-                logger.warning(f"HTTP {response.status} per comune {cod_comune}")
-                return None
+        response = await get_client().get(url, headers=headers, timeout=10)
+        if response.status_code == 200:
+            return response.text
+        logger.warning(f"HTTP {response.status_code} per comune {cod_comune}")
+        return None
     except Exception as e:
         logger.error(f"Errore fetch: {e}")
         return None
@@ -86,7 +99,7 @@ async def _fetch_html(cod_comune: int) -> Optional[str]:
 
 def _extract_farmacia_turno(html: str, comune_nome: str) -> Optional[Farmacia]:
     """
-    Estrae SOLO la farmacia di turno dall'HTML.
+    Estrae SOLO la farmacia di turno dall'HTML (motore in farmacie_parser).
 
     Indicatori farmacia di turno:
     - Testo "Turno:" seguito da info
@@ -94,129 +107,103 @@ def _extract_farmacia_turno(html: str, comune_nome: str) -> Optional[Farmacia]:
     - Orari che iniziano da "0:00" (turno notturno)
     - "Tutto il giorno"
     """
+    campi = estrai_farmacia_turno(html)
+    if not campi:
+        return None
 
-    # Pattern per identificare blocchi farmacia
-    # Cerchiamo sezioni che contengono FARMACIA e hanno indicatori di turno
-
-    # Indicatori che identificano una farmacia DI TURNO (non solo aperta)
-    turno_indicators = [
-        r'Turno[:\s]+',
-        r'fino a domani',
-        r'tutto il giorno',
-        r'Tutto il giorno',
-        r'TURNO',
-        r'notturno',
-        r'Notturno',
-        r'0:00\s*-',  # Turno che inizia a mezzanotte
-        r'24\s*ore',
-        r'h\s*24',
-    ]
-
-    turno_pattern = '|'.join(turno_indicators)
-
-    # Split per trovare blocchi farmacia
-    # Il sito usa strutture con <td> o <div> per ogni farmacia
-
-    # Prova a trovare blocchi che contengono sia "FARMACIA" che un indicatore di turno
-    blocks = re.split(r'(?=FARMACIA\s+[A-Z])', html, flags=re.IGNORECASE)
-
-    for block in blocks:
-        # Deve contenere "FARMACIA" e un indicatore di turno
-        if not re.search(r'FARMACIA', block, re.IGNORECASE):
-            continue
-
-        if not re.search(turno_pattern, block, re.IGNORECASE):
-            continue
-
-        # Estrai nome farmacia
-        nome_match = re.search(r'(FARMACIA\s+[A-Z][A-Za-z\s\']+?)(?:<|,|\(|\d{5})', block, re.IGNORECASE)
-        if not nome_match:
-            nome_match = re.search(r'(FARMACIA\s+[A-Z][A-Za-z\s\']{2,20})', block, re.IGNORECASE)
-
-        if not nome_match:
-            continue
-
-        nome = nome_match.group(1).strip()
-        nome = re.sub(r'\s+', ' ', nome)
-
-        # Estrai indirizzo
-        indirizzo = ""
-        # Pattern: Via/Viale/Piazza + nome + eventuale numero civico
-        ind_match = re.search(
-            r'((?:Via|Viale|Piazza|P\.?zza|Corso|Largo)\s+[^<,]+?(?:,\s*\d+)?)\s*[-–]?\s*(?:\d{5}|[A-Z]{2,})',
-            block, re.IGNORECASE
-        )
-        if ind_match:
-            indirizzo = ind_match.group(1).strip()
-            indirizzo = re.sub(r'\s+', ' ', indirizzo)
-
-        # Estrai telefono
-        telefono = ""
-        tel_match = re.search(r'(?:Tel[:\s]*|📞\s*)?(\d{10,11}|\d{3,4}[\s\-]?\d{6,7})', block)
-        if tel_match:
-            telefono = _parse_telefono(tel_match.group(1))
-
-        # Estrai info turno
-        turno_info = ""
-        turno_match = re.search(r'(Turno[:\s]+[^<]+?)(?:<|\n|$)', block, re.IGNORECASE)
-        if turno_match:
-            turno_info = turno_match.group(1).strip()
-        else:
-            # Cerca orario esteso
-            orario_match = re.search(r'(\d{1,2}[:.]\d{2}\s*[-–]\s*\d{1,2}[:.]\d{2}[^<]*fino a domani[^<]*)', block, re.IGNORECASE)
-            if orario_match:
-                turno_info = orario_match.group(1).strip()
-
-        # Estrai orario normale
-        orario = ""
-        orario_match = re.search(r'(\d{1,2}[:.]\d{2}\s*[-–]\s*\d{1,2}[:.]\d{2})', block)
-        if orario_match:
-            orario = orario_match.group(1).replace('.', ':')
-
-        if turno_info:
-            orario = turno_info
-
-        # Coordinate
-        lat, lon = _get_coordinates(comune_nome)
-
-        if nome:
-            return Farmacia(
-                nome=nome,
-                indirizzo=indirizzo or comune_nome,
-                telefono=telefono,
-                orario=orario or "Di turno",
-                comune=comune_nome,
-                turno_info=turno_info,
-                lat=lat,
-                lon=lon
-            )
+    # Coordinate
+    lat, lon = _get_coordinates(comune_nome)
+
+    return Farmacia(
+        nome=campi["nome"],
+        indirizzo=campi["indirizzo"] or comune_nome,
+        telefono=_parse_telefono(campi["telefono"]) if campi["telefono"] else "",
+        orario=campi["orario"] or "Di turno",
+        comune=comune_nome,
+        turno_info=campi["turno_info"],
+        lat=lat,
+        lon=lon
+    )
+
+
+def _ultimo_cambio_turno(now: float) -> float:
+    """Timestamp dell'ultimo cambio turno (ora italiana) prima di `now`"""
+    import pytz
+    rome_tz = pytz.timezone("Europe/Rome")
+    adesso = datetime.fromtimestamp(now, rome_tz)
+    cambio = adesso.replace(hour=CAMBIO_TURNO_ORA, minute=CAMBIO_TURNO_MINUTI, second=0, microsecond=0)
+    if cambio > adesso:
+        cambio -= timedelta(days=1)
+    return cambio.timestamp()
+
+
+def _is_cache_valid(now: float) -> bool:
+    """Cache valida se recente e dello stesso turno"""
+    return (
+        bool(_cache["data"])
+        and (now - _cache["timestamp"]) < CACHE_DURATION
+        and _cache["timestamp"] >= _ultimo_cambio_turno(now)
+    )
+
+
+def _load_cache():
+    """Carica da file le farmacie salvate (una sola volta, all'avvio)"""
+    _cache["loaded"] = True
+    try:
+        with open(FARMACIE_CACHE_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        _cache["data"] = [Farmacia(**item) for item in saved.get("farmacie", [])] or None
+        _cache["timestamp"] = saved.get("timestamp", 0)
+        logger.info(f"Cache farmacie caricata da file ({len(_cache['data'] or [])} farmacie)")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Errore lettura cache farmacie: {e}")
 
-    return None
 
+def _save_cache():
+    """Salva su file le farmacie in cache (scrittura atomica)"""
+    try:
+        os.makedirs(os.path.dirname(FARMACIE_CACHE_PATH), exist_ok=True)
+        tmp_path = FARMACIE_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "farmacie": [asdict(f) for f in _cache["data"]],
+                "timestamp": _cache["timestamp"]
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, FARMACIE_CACHE_PATH)
+    except Exception as e:
+        logger.error(f"Errore scrittura cache farmacie: {e}")
 
-async def get_farmacie_turno() -> Optional[List[Farmacia]]:
+
+async def get_farmacie_turno(force: bool = False) -> Optional[List[Farmacia]]:
     """
     Ottiene la lista delle farmacie DI TURNO (max 1 per comune).
-    Usa cache di 3 ore.
+    Usa cache di 3 ore (invalidata al cambio turno), salvata anche su file.
 
     Returns:
         Lista di Farmacia o None se errore
     """
     global _cache
 
+    if not _cache["loaded"]:
+        _load_cache()
+
     now = time.time()
 
     # Controlla cache
-    if _cache["data"] and (now - _cache["timestamp"]) < CACHE_DURATION:
+    if not force and _is_cache_valid(now):
         logger.debug("Farmacie da cache")
         return _cache["data"]
 
     logger.info("Fetching farmacie di turno...")
 
-    farmacie = []
+    # Scarica tutti i comuni in parallelo
+    nomi = list(COMUNI.keys())
+    pagine = await asyncio.gather(*(_fetch_html(COMUNI[nome]) for nome in nomi))
 
-    for comune_nome, cod in COMUNI.items():
-        html = await _fetch_html(cod)
+    farmacie = []
+    for comune_nome, html in zip(nomi, pagine):
         if html:
             farmacia = _extract_farmacia_turno(html, comune_nome)
             if farmacia:
@@ -228,6 +215,7 @@ async def get_farmacie_turno() -> Optional[List[Farmacia]]:
     if farmacie:
         _cache["data"] = farmacie
         _cache["timestamp"] = now
+        _save_cache()
         return farmacie
 
     # Se fetch fallisce ma abbiamo cache vecchia, usala
@@ -238,6 +226,11 @@ async def get_farmacie_turno() -> Optional[List[Farmacia]]:
     return None
 
 
+async def refresh_farmacie():
+    """Aggiorna le farmacie subito dopo il cambio turno (job in main.py)"""
+    await get_farmacie_turno(force=True)
+
+
 # Fallback statico (usato se scraping fallisce)
 FARMACIE_FALLBACK = [
     Farmacia(
@@ -0,0 +1,152 @@
+"""
+Motore di estrazione farmacia di turno dalle pagine di farmaciediturno.org
+
+- Pattern compilati una sola volta a livello di modulo
+- Un solo passaggio sulla pagina (tokenizer blocchi farmacia + indicatori di
+  turno), fermandosi al primo blocco di turno; i campi vengono estratti solo da quello
+- Memo dei risultati per hash dell'HTML: pagine invariate non vengono ri-analizzate
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Optional, Dict
+
+# Tokenizer a passaggio singolo sulla pagina in minuscolo, due tipi di token:
+# - inizio di un blocco farmacia ("FARMACIA <NOME>"), consuma solo "farmacia"
+#   così nessun indicatore che segue viene nascosto
+# - indicatori che identificano una farmacia DI TURNO (non solo aperta)
+# Niente gruppi con nome: un'alternanza piatta resta molto più veloce in `re`
+_TOKEN = r'farmacia(?=\s+[a-z])|turno|fino a domani|tutto il giorno|notturno|0:00\s*-|24\s*ore|h\s*24'
+_RE_TOKEN = re.compile(_TOKEN)
+# Stessa grammatica sul testo originale, se il minuscolo cambia la lunghezza (caratteri Unicode speciali)
+_RE_TOKEN_IC = re.compile(_TOKEN, re.IGNORECASE)
+_RE_FARMACIA = re.compile(r'FARMACIA', re.IGNORECASE)
+
+# Campi
+_RE_NOME = re.compile(r'(FARMACIA\s+[A-Z][A-Za-z\s\']+?)(?:<|,|\(|\d{5})', re.IGNORECASE)
+_RE_NOME_BREVE = re.compile(r'(FARMACIA\s+[A-Z][A-Za-z\s\']{2,20})', re.IGNORECASE)
+# Indirizzo: termina al CAP o a una sigla MAIUSCOLA intera (es. "VE"); la sigla resta
+# case-sensitive, altrimenti "Via Pordelio" si fermerebbe a "Via P" + "ordelio"
+_RE_INDIRIZZO = re.compile(
+    r'((?:Via|Viale|Piazza|P\.?zza|Corso|Largo)\s+[^<,]+?(?:,\s*\d+)?)\s*[-–]?\s*(?:\d{5}|\b(?-i:[A-Z]{2,})\b)',
+    re.IGNORECASE
+)
+_RE_TELEFONO = re.compile(r'(?:Tel[:\s]*|📞\s*)?(\d{10,11}|\d{3,4}[\s\-]?\d{6,7})')
+_RE_TURNO_INFO = re.compile(r'(Turno[:\s]+[^<]+?)(?:<|\n|$)', re.IGNORECASE)
+_RE_ORARIO_ESTESO = re.compile(r'(\d{1,2}[:.]\d{2}\s*[-–]\s*\d{1,2}[:.]\d{2}[^<]*fino a domani[^<]*)', re.IGNORECASE)
+_RE_ORARIO = re.compile(r'(\d{1,2}[:.]\d{2}\s*[-–]\s*\d{1,2}[:.]\d{2})')
+_RE_SPAZI = re.compile(r'\s+')
+
+# Memo risultati: hash HTML -> campi estratti (o None)
+MEMO_MAX = 32
+_memo: "OrderedDict[str, Optional[Dict[str, str]]]" = OrderedDict()
+_memo_stats = {"hits": 0, "misses": 0}
+
+
+def _estrai_campi(html: str, start: int, end: int) -> Optional[Dict[str, str]]:
+    """Estrae i campi dal blocco html[start:end] (None se manca il nome)"""
+    nome_match = _RE_NOME.search(html, start, end) or _RE_NOME_BREVE.search(html, start, end)
+    if not nome_match:
+        return None
+
+    nome = _RE_SPAZI.sub(' ', nome_match.group(1).strip())
+
+    indirizzo = ""
+    ind_match = _RE_INDIRIZZO.search(html, start, end)
+    if ind_match:
+        indirizzo = _RE_SPAZI.sub(' ', ind_match.group(1).strip())
+
+    telefono = ""
+    tel_match = _RE_TELEFONO.search(html, start, end)
+    if tel_match:
+        telefono = tel_match.group(1)
+
+    turno_info = ""
+    turno_match = _RE_TURNO_INFO.search(html, start, end)
+    if turno_match:
+        turno_info = turno_match.group(1).strip()
+    else:
+        orario_match = _RE_ORARIO_ESTESO.search(html, start, end)
+        if orario_match:
+            turno_info = orario_match.group(1).strip()
+
+    orario = ""
+    orario_match = _RE_ORARIO.search(html, start, end)
+    if orario_match:
+        orario = orario_match.group(1).replace('.', ':')
+
+    if turno_info:
+        orario = turno_info
+
+    if not nome:
+        return None
+
+    return {
+        "nome": nome,
+        "indirizzo": indirizzo,
+        "telefono": telefono,
+        "orario": orario,
+        "turno_info": turno_info
+    }
+
+
+def _analizza(html: str) -> Optional[Dict[str, str]]:
+    """
+    Primo blocco farmacia con un indicatore di turno e un nome valido.
+    Scorre i token una volta sola e si ferma al primo blocco valido.
+    """
+    testo = html.lower()
+    if len(testo) != len(html):
+        testo = html
+        tokens = _RE_TOKEN_IC.finditer(html)
+    else:
+        tokens = _RE_TOKEN.finditer(testo)
+
+    inizio = 0          # inizio blocco corrente
+    con_turno = False   # il blocco corrente contiene un indicatore di turno
+    primo = True        # testo prima del primo "FARMACIA <NOME>"
+
+    for m in tokens:
+        if not (testo[m.start()] in "fF" and m.end() - m.start() == 8):
+            con_turno = True
+            continue
+
+        # Nuovo blocco: valuta quello appena chiuso
+        if con_turno and m.start() > inizio:
+            if not primo or _RE_FARMACIA.search(html, inizio, m.start()):
+                campi = _estrai_campi(html, inizio, m.start())
+                if campi:
+                    return campi
+        inizio = m.start()
+        con_turno = False
+        primo = False
+
+    if con_turno:
+        if not primo or _RE_FARMACIA.search(html, inizio, len(html)):
+            return _estrai_campi(html, inizio, len(html))
+    return None
+
+
+def estrai_farmacia_turno(html: str) -> Optional[Dict[str, str]]:
+    """
+    Campi grezzi della farmacia di turno (nome, indirizzo, telefono, orario, turno_info)
+    o None. I risultati sono memorizzati per hash dell'HTML.
+    """
+    chiave = hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+    if chiave in _memo:
+        _memo.move_to_end(chiave)
+        _memo_stats["hits"] += 1
+        campi = _memo[chiave]
+        return dict(campi) if campi else None
+
+    _memo_stats["misses"] += 1
+    campi = _analizza(html)
+    _memo[chiave] = campi
+    while len(_memo) > MEMO_MAX:
+        _memo.popitem(last=False)
+    return dict(campi) if campi else None
+
+
+def get_memo_stats() -> dict:
+    """Statistiche memo (hit/miss)"""
+    return dict(_memo_stats, size=len(_memo))
@@ -68,8 +68,15 @@ FERRY_DESTINATIONS = {
     }
 }
 
-import database as db
+import database_async as db
+import percorsi
+import tabelloni
+import statistiche
+import schermate
+import router
+import callback_codec
 from config import ADMIN_CHAT_ID
+from dedup import is_duplicate, get_dedup_stats
 from validators import validate_name, validate_dob
 from meteo_api import get_meteo_forecast, get_weather_emoji, get_weather_description
 
@@ -184,6 +191,29 @@ async def delete_message_safe(context: ContextTypes.DEFAULT_TYPE, chat_id: int,
         logger.debug(f"Impossibile cancellare messaggio {msg_id}: {e}")
 
 
+async def _get_schermata(schermata_id: str, lingua: str, *parametri):
+    """
+    Schermata pre-renderizzata (schermate.py); se manca la costruisce nel pool DB.
+    Con parametri ritorna None se la voce non esiste (il chiamante ripiega sulla lista);
+    senza parametri ritorna sempre (testo, tastiera), al limite un avviso con Indietro.
+    """
+    voce = schermate.get(schermata_id, lingua, *parametri)
+    if voce is None:
+        try:
+            voce = await db.run(schermate.costruisci_voce, schermata_id, lingua, *parametri)
+        except Exception as e:
+            logger.error(f"Errore costruzione schermata {schermata_id}/{lingua}{parametri}: {e}")
+    if voce is None and not parametri:
+        testo = {"it": "⚠️ Informazioni non disponibili, riprova più tardi.",
+                 "en": "⚠️ Information not available, please try again later.",
+                 "de": "⚠️ Informationen nicht verfügbar, bitte später erneut versuchen."}
+        indietro = {"it": "◀️ Indietro", "en": "◀️ Back", "de": "◀️ Zurück"}
+        voce = (testo.get(lingua, testo["it"]), InlineKeyboardMarkup([
+            [InlineKeyboardButton(indietro.get(lingua, indietro["it"]), callback_data="menu_back")]
+        ]))
+    return voce
+
+
 async def answer_callback_safe(callback_query):
     """Risponde al callback in modo sicuro"""
     try:
@@ -228,18 +258,22 @@ async def handle_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not chat_id:
         return
 
-    # Cerca utente (nodo 03_DB_Cerca_Utente)
-    user = db.get_user(chat_id)
-
-    # Check duplicato update_id (FIX scalabilità)
-    if user and user.get("last_update_id", 0) >= update_id:
+    # Check duplicato update_id (retry webhook) in memoria, senza DB
+    if is_duplicate(update_id):
         logger.info(f"Update duplicato ignorato: {chat_id}/{update_id}")
         if is_callback:
             await answer_callback_safe(update.callback_query)
         return
 
+    # Cerca utente (nodo 03_DB_Cerca_Utente)
+    # I duplicati li decide solo dedup: last_update_id sul DB è un watermark che
+    # cresce soltanto, e dopo un reset degli update_id scarterebbe tutto
+    user = await db.get_user(chat_id)
+
+    statistiche.registra_attivita(chat_id)
+
     # Carica testi e config (nodi 03B, 03C - con cache)
-    config = db.get_config()
+    config = await db.get_config()
     lingua = user.get("lingua", "it") if user else "it"
     nome = user.get("nome", "") if user else ""
     last_bot_msg_id = user.get("last_bot_msg_id") if user else None
@@ -313,7 +347,7 @@ async def execute_action(
                     logger.info(f"[PENDING] Orario input: dest={dest_id}, zona={zona_id}, linea={linea_codice}, bot_msg={bot_msg_id}")
 
                     # Resetta pending action
-                    db.update_user(chat_id, {"pending_action": None, "last_update_id": update_id})
+                    await db.update_user(chat_id, {"pending_action": None, "last_update_id": update_id})
 
                     # Parse orario - ritorna (ora_esatta, error)
                     ora_esatta, error = parse_time_input(message_text, lingua)
@@ -390,8 +424,9 @@ async def execute_action(
 
 async def action_new_user(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int):
     """Nuovo utente - crea record e mostra scelta lingua (nodi 13, 13B, 14)"""
-    db.create_user(chat_id)
-    db.increment_utenti_count()
+    if await db.create_user(chat_id):
+        statistiche.registra_nuovo_utente()
+    await db.increment_utenti_count()
 
     # Messaggio scelta lingua
     keyboard = InlineKeyboardMarkup([
@@ -408,8 +443,8 @@ async def action_new_user(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upda
         reply_markup=keyboard
     )
 
-    db.save_last_bot_msg(chat_id, msg.message_id, "lingua")
-    db.update_user(chat_id, {"last_update_id": update_id})
+    await db.save_last_bot_msg(chat_id, msg.message_id, "lingua")
+    db.queue_last_update_id(chat_id, update_id)
 
 
 async def action_set_lang(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, callback_data: str, query=None):
@@ -422,12 +457,12 @@ async def action_set_lang(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upda
     if lingua not in ("it", "en", "de"):
         lingua = "it"
 
-    db.save_lingua(chat_id, lingua, update_id)
+    await db.save_lingua(chat_id, lingua, update_id)
 
     # Prepara messaggio privacy
-    text = db.get_text("step2_testo", lingua)
-    btn_si = db.get_text("btn_privacy_si", lingua)
-    btn_no = db.get_text("btn_privacy_no", lingua)
+    text = await db.get_text("step2_testo", lingua)
+    btn_si = await db.get_text("btn_privacy_si", lingua)
+    btn_no = await db.get_text("btn_privacy_no", lingua)
 
     keyboard = InlineKeyboardMarkup([
         [
@@ -443,7 +478,7 @@ async def action_set_lang(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upda
             reply_markup=keyboard,
             parse_mode="HTML"
         )
-        db.save_last_bot_msg(chat_id, query.message.message_id, "privacy")
+        await db.save_last_bot_msg(chat_id, query.message.message_id, "privacy")
     else:
         msg = await context.bot.send_message(
             chat_id=chat_id,
@@ -451,7 +486,7 @@ async def action_set_lang(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upda
             reply_markup=keyboard,
             parse_mode="HTML"
         )
-        db.save_last_bot_msg(chat_id, msg.message_id, "privacy")
+        await db.save_last_bot_msg(chat_id, msg.message_id, "privacy")
 
 
 async def action_privacy_yes(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, lingua: str, query=None):
@@ -460,9 +495,9 @@ async def action_privacy_yes(context: ContextTypes.DEFAULT_TYPE, chat_id: int, u
     if query:
         await query.answer()
 
-    db.save_privacy_ok(chat_id, update_id)
+    await db.save_privacy_ok(chat_id, update_id)
 
-    text = db.get_text("step3_chiedi_nome", lingua)
+    text = await db.get_text("step3_chiedi_nome", lingua)
 
     # Edita messaggio esistente invece di mandarne uno nuovo
     if query:
@@ -470,14 +505,14 @@ async def action_privacy_yes(context: ContextTypes.DEFAULT_TYPE, chat_id: int, u
             text=text,
             parse_mode="HTML"
         )
-        db.save_last_bot_msg(chat_id, query.message.message_id, "nome")
+        await db.save_last_bot_msg(chat_id, query.message.message_id, "nome")
     else:
         msg = await context.bot.send_message(
             chat_id=chat_id,
             text=text,
             parse_mode="HTML"
         )
-        db.save_last_bot_msg(chat_id, msg.message_id, "nome")
+        await db.save_last_bot_msg(chat_id, msg.message_id, "nome")
 
 
 async def action_privacy_no(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, lingua: str, query=None):
@@ -486,9 +521,9 @@ async def action_privacy_no(context: ContextTypes.DEFAULT_TYPE, chat_id: int, up
     if query:
         await query.answer()
 
-    db.save_privacy_no(chat_id, update_id)
+    await db.save_privacy_no(chat_id, update_id)
 
-    text = db.get_text("msg_uscita", lingua)
+    text = await db.get_text("msg_uscita", lingua)
 
     # Edita messaggio esistente invece di mandarne uno nuovo
     if query:
@@ -506,9 +541,9 @@ async def action_privacy_no(context: ContextTypes.DEFAULT_TYPE, chat_id: int, up
 
 async def action_resume_privacy(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, lingua: str):
     """Resume onboarding - mostra privacy"""
-    text = db.get_text("step2_testo", lingua)
-    btn_si = db.get_text("btn_privacy_si", lingua)
-    btn_no = db.get_text("btn_privacy_no", lingua)
+    text = await db.get_text("step2_testo", lingua)
+    btn_si = await db.get_text("btn_privacy_si", lingua)
+    btn_no = await db.get_text("btn_privacy_no", lingua)
 
     keyboard = InlineKeyboardMarkup([
         [
@@ -524,13 +559,13 @@ async def action_resume_privacy(context: ContextTypes.DEFAULT_TYPE, chat_id: int
         parse_mode="HTML"
     )
 
-    db.save_last_bot_msg(chat_id, msg.message_id, "privacy")
-    db.update_user(chat_id, {"last_update_id": update_id})
+    await db.save_last_bot_msg(chat_id, msg.message_id, "privacy")
+    db.queue_last_update_id(chat_id, update_id)
 
 
 async def action_resume_nome(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, lingua: str):
     """Resume onboarding - chiedi nome"""
-    text = db.get_text("step3_chiedi_nome", lingua)
+    text = await db.get_text("step3_chiedi_nome", lingua)
 
     msg = await context.bot.send_message(
         chat_id=chat_id,
@@ -538,13 +573,13 @@ async def action_resume_nome(context: ContextTypes.DEFAULT_TYPE, chat_id: int, u
         parse_mode="HTML"
     )
 
-    db.save_last_bot_msg(chat_id, msg.message_id, "nome")
-    db.update_user(chat_id, {"last_update_id": update_id})
+    await db.save_last_bot_msg(chat_id, msg.message_id, "nome")
+    db.queue_last_update_id(chat_id, update_id)
 
 
 async def action_resume_data(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, lingua: str, nome: str):
     """Resume onboarding - chiedi data nascita"""
-    text = db.get_text("step4_chiedi_data", lingua)
+    text = await db.get_text("step4_chiedi_data", lingua)
     if nome:
         text = text.replace("{nome}", nome)
 
@@ -554,8 +589,8 @@ async def action_resume_data(context: ContextTypes.DEFAULT_TYPE, chat_id: int, u
         parse_mode="HTML"
     )
 
-    db.save_last_bot_msg(chat_id, msg.message_id, "data")
-    db.update_user(chat_id, {"last_update_id": update_id})
+    await db.save_last_bot_msg(chat_id, msg.message_id, "data")
+    db.queue_last_update_id(chat_id, update_id)
 
 
 async def action_input_name(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, message_text: str, lingua: str):
@@ -564,9 +599,9 @@ async def action_input_name(context: ContextTypes.DEFAULT_TYPE, chat_id: int, up
 
     if is_valid:
         # Nome OK - salva e chiedi data
-        db.save_nome(chat_id, nome_pulito, update_id)
+        await db.save_nome(chat_id, nome_pulito, update_id)
 
-        text = db.get_text("step4_chiedi_data", lingua)
+        text = await db.get_text("step4_chiedi_data", lingua)
         text = text.replace("{nome}", nome_pulito)
 
         msg = await context.bot.send_message(
@@ -575,11 +610,11 @@ async def action_input_name(context: ContextTypes.DEFAULT_TYPE, chat_id: int, up
             parse_mode="HTML"
         )
 
-        db.save_last_bot_msg(chat_id, msg.message_id, "data")
+        await db.save_last_bot_msg(chat_id, msg.message_id, "data")
 
     else:
         # Nome non valido
-        text = db.get_text("msg_errore_nome", lingua)
+        text = await db.get_text("msg_errore_nome", lingua)
 
         msg = await context.bot.send_message(
             chat_id=chat_id,
@@ -587,8 +622,8 @@ async def action_input_name(context: ContextTypes.DEFAULT_TYPE, chat_id: int, up
             parse_mode="HTML"
         )
 
-        db.save_last_bot_msg(chat_id, msg.message_id, "nome")
-        db.update_user(chat_id, {"last_update_id": update_id})
+        await db.save_last_bot_msg(chat_id, msg.message_id, "nome")
+        db.queue_last_update_id(chat_id, update_id)
 
 
 async def action_input_dob(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, message_text: str, lingua: str, user: dict):
@@ -598,7 +633,8 @@ async def action_input_dob(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upd
 
     if is_valid:
         # Data OK - salva e mostra completamento
-        db.save_data_nascita(chat_id, data_str, is_minorenne, update_id)
+        if await db.save_data_nascita(chat_id, data_str, is_minorenne, update_id):
+            statistiche.registra_onboarding_completato()
 
         keyboard = get_menu_keyboard(lingua)
 
@@ -613,9 +649,9 @@ async def action_input_dob(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upd
 
     else:
         # Data non valida
-        error_count = db.increment_dob_error(chat_id, update_id)
+        error_count = await db.increment_dob_error(chat_id, update_id)
 
-        text = db.get_text("msg_errore_data", lingua)
+        text = await db.get_text("msg_errore_data", lingua)
 
         msg = await context.bot.send_message(
             chat_id=chat_id,
@@ -623,7 +659,7 @@ async def action_input_dob(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upd
             parse_mode="HTML"
         )
 
-        db.save_last_bot_msg(chat_id, msg.message_id, "data")
+        await db.save_last_bot_msg(chat_id, msg.message_id, "data")
 
 
 async def action_returning(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, nome: str, lingua: str):
@@ -708,7 +744,7 @@ async def action_returning(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upd
     text += f"\n💡 <b>{suggerimento_label}</b>\n{consiglio_meteo}\n"
 
     # BLOCCO 3: Evento di oggi
-    evento_oggi = db.get_evento_oggi(lingua)
+    evento_oggi = await db.get_evento_oggi(lingua)
     if evento_oggi:
         evento_label = {"it": "Evento di oggi", "en": "Today's event", "de": "Heutiges Event"}.get(lingua, "Evento di oggi")
         text += f"\n🎪 <b>{evento_label}</b>\n{evento_oggi}\n"
@@ -725,566 +761,151 @@ async def action_returning(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upd
         parse_mode="HTML"
     )
 
-    db.update_user(chat_id, {"last_update_id": update_id})
-
-
-async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, callback_data: str, nome: str, lingua: str, query=None):
-    """Gestisce click su menu"""
-    menu_key = callback_data.replace("menu_", "") if callback_data.startswith("menu_") else ""
-
-    # Handler speciali per meteo/mare/maree/attività
-    if menu_key == "meteo":
-        await handle_meteo(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "mare":
-        await handle_mare(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "maree":
-        await handle_maree(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key in ("idee", "cosa_fare", "idee_oggi"):
-        await handle_idee_oggi(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "pioggia":
-        await handle_pioggia(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "spiagge":
-        await handle_spiagge(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "fortini":
-        await handle_fortini(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "attivita":
-        await handle_attivita(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "eventi":
-        await handle_eventi(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # ============ ROUTING IDEE PER OGGI ============
-    if callback_data == "idee_spiagge":
-        await handle_idee_spiagge(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("idee_spiaggia_"):
-        spiaggia_id = callback_data.replace("idee_spiaggia_", "")
-        await handle_idee_spiaggia_dettaglio(context, chat_id, lingua, query, spiaggia_id)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "idee_fortini":
-        await handle_idee_fortini(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("idee_fortino_"):
-        fortino_id = callback_data.replace("idee_fortino_", "")
-        await handle_idee_fortino_dettaglio(context, chat_id, lingua, query, fortino_id)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "idee_attivita":
-        await handle_idee_attivita(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("idee_att_"):
-        categoria = callback_data.replace("idee_att_", "")
-        await handle_idee_attivita_categoria(context, chat_id, lingua, query, categoria)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "idee_pioggia":
-        await handle_idee_pioggia(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "idee_laguna":
-        await handle_idee_laguna(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("idee_laguna_"):
-        luogo_id = callback_data.replace("idee_laguna_", "")
-        await handle_idee_laguna_dettaglio(context, chat_id, lingua, query, luogo_id)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # ============ ROUTING EVENTI COMPLETO ============
-    # evt_home - Home eventi
-    if callback_data == "evt_home":
-        await handle_eventi(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+    db.queue_last_update_id(chat_id, update_id)
 
-    # evt_oggi, evt_domani, evt_sett_0, evt_sett_1 - Liste per periodo
-    if callback_data in ("evt_oggi", "evt_domani", "evt_sett_0", "evt_sett_1"):
-        periodo = callback_data.replace("evt_", "")
-        await handle_eventi_lista(context, chat_id, lingua, query, periodo=periodo, pagina=0)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # evt_list_{periodo}_p{N} - Paginazione liste
-    if callback_data.startswith("evt_list_"):
-        import re
-        match = re.match(r"evt_list_(\w+)_p(\d+)", callback_data)
-        if match:
-            periodo = match.group(1)
-            pagina = int(match.group(2))
-            await handle_eventi_lista(context, chat_id, lingua, query, periodo=periodo, pagina=pagina)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-
-    # evt_categoria - Lista categorie
-    if callback_data == "evt_categoria":
-        await handle_eventi_categorie(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # evt_cat_{tipo}_p{N} - Eventi per categoria con paginazione
-    if callback_data.startswith("evt_cat_"):
-        import re
-        match = re.match(r"evt_cat_(\w+)_p(\d+)", callback_data)
-        if match:
-            categoria = match.group(1)
-            pagina = int(match.group(2))
-            # Per le categorie usiamo un periodo ampio (prossimi 90 giorni)
-            from datetime import date, timedelta
-            oggi = date.today()
-            data_inizio = oggi.isoformat()
-            data_fine = (oggi + timedelta(days=90)).isoformat()
-            eventi = db.get_eventi_periodo(data_inizio, data_fine, limit=5, offset=pagina*5, categoria=categoria)
-            totale = db.get_eventi_count_periodo(data_inizio, data_fine, categoria=categoria)
-            # Richiama handle_eventi_lista con categoria
-            await handle_eventi_lista(context, chat_id, lingua, query, periodo="sett_0", pagina=pagina, categoria=categoria)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-
-    # evt_detail_{id} - Dettaglio evento
-    if callback_data.startswith("evt_detail_"):
-        try:
-            evento_id = int(callback_data.replace("evt_detail_", ""))
-            await handle_evento_dettaglio(context, chat_id, lingua, query, evento_id)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except ValueError:
-            pass
-
-    # evt_cal - Calendario mese corrente
-    if callback_data == "evt_cal":
-        await handle_eventi_calendario(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # evt_cal_{anno}_{mese} - Calendario mese specifico
-    if callback_data.startswith("evt_cal_") and not callback_data.startswith("evt_cal_giorno_"):
-        import re
-        match = re.match(r"evt_cal_(\d+)_(\d+)", callback_data)
-        if match:
-            anno = int(match.group(1))
-            mese = int(match.group(2))
-            await handle_eventi_calendario(context, chat_id, lingua, query, anno=anno, mese=mese)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-
-    # evt_cal_giorno_{anno}_{mese}_{giorno} - Eventi di un giorno specifico
-    if callback_data.startswith("evt_cal_giorno_"):
-        import re
-        match = re.match(r"evt_cal_giorno_(\d+)_(\d+)_(\d+)", callback_data)
-        if match:
-            anno = int(match.group(1))
-            mese = int(match.group(2))
-            giorno = int(match.group(3))
-            await handle_eventi_giorno(context, chat_id, lingua, query, anno, mese, giorno)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-
-    # noop - Bottone placeholder (es. numero pagina)
-    if callback_data == "noop":
-        if query:
-            await query.answer()
-        return
-    # ============ FINE ROUTING EVENTI ============
-
-    if menu_key == "trasporti":
-        await handle_trasporti(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # ============ ROUTING TRASPORTI ============
-    if callback_data == "tras_home":
-        await handle_trasporti(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "tras_arrivo":
-        await handle_trasporti_arrivo(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("tras_dest_"):
-        try:
-            dest_id = int(callback_data.replace("tras_dest_", ""))
-            await handle_trasporti_zona(context, chat_id, lingua, query, dest_id)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except ValueError:
-            pass
-
-    if callback_data.startswith("tras_percorso_"):
-        try:
-            # tras_percorso_{dest}_{zona}_{linea} oppure tras_percorso_{dest}_{zona} (retrocompatibilità)
-            parts = callback_data.replace("tras_percorso_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
-            linea_codice = parts[2] if len(parts) > 2 else "23A"
-            # Mostra selezione orario con linea
-            await handle_trasporti_quando(context, chat_id, lingua, query, dest_id, zona_id, linea_codice)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data.startswith("tras_viaggio_"):
-        try:
-            # tras_viaggio_{dest}_{zona}_{linea}_{ora} dove ora è HH-MM
-            parts = callback_data.replace("tras_viaggio_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
-            if len(parts) > 3:
-                linea_codice = parts[2]
-                # Nuovo formato: ora esatta HH-MM
-                ora_param = parts[3]
-                if "-" in ora_param and len(ora_param) == 5:
-                    # Formato HH-MM -> HH:MM
-                    ora_partenza = ora_param.replace("-", ":")
-                else:
-                    # Retrocompatibilità: offset in minuti
-                    ora_partenza = None
-            elif len(parts) > 2:
-                linea_codice = parts[2]
-                ora_partenza = None
-            else:
-                linea_codice = "23A"
-                ora_partenza = None
-            await handle_trasporti_percorso(context, chat_id, lingua, query, dest_id, zona_id, linea_codice, ora_partenza)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data == "tras_frazione":
-        await handle_trasporti_frazione(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    # Handler frazioni - ordine specifico per pattern matching corretto
-    if callback_data.startswith("tras_fraz_viaggio_"):
-        try:
-            # tras_fraz_viaggio_{da}_{a}_{linea}_{offset}
-            parts = callback_data.replace("tras_fraz_viaggio_", "").split("_")
-            da_zona = int(parts[0])
-            a_zona = int(parts[1])
-            linea_codice = parts[2]
-            offset = int(parts[3]) if len(parts) > 3 else 0
-            await handle_trasporti_frazione_viaggio(context, chat_id, lingua, query, da_zona, a_zona, linea_codice, offset)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data.startswith("tras_fraz_quando_"):
-        try:
-            # tras_fraz_quando_{da}_{a}_{linea}
-            parts = callback_data.replace("tras_fraz_quando_", "").split("_")
-            da_zona = int(parts[0])
-            a_zona = int(parts[1])
-            linea_codice = parts[2]
-            await handle_trasporti_frazione_quando(context, chat_id, lingua, query, da_zona, a_zona, linea_codice)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data.startswith("tras_fraz_linea_"):
-        try:
-            # tras_fraz_linea_{da}_{a}
-            parts = callback_data.replace("tras_fraz_linea_", "").split("_")
-            da_zona = int(parts[0])
-            a_zona = int(parts[1])
-            await handle_trasporti_frazione_linea(context, chat_id, lingua, query, da_zona, a_zona)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
 
-    if callback_data.startswith("tras_fraz_"):
-        try:
-            # tras_fraz_{da_zona}_{a_zona}
-            parts = callback_data.replace("tras_fraz_", "").split("_")
-            da_zona = int(parts[0])
-            a_zona = int(parts[1]) if len(parts) > 1 else None
-            await handle_trasporti_frazione_percorso(context, chat_id, lingua, query, da_zona, a_zona)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data == "tras_bus":
-        await handle_trasporti_bus(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("tras_bus_linea_"):
-        try:
-            linea_id = int(callback_data.replace("tras_bus_linea_", ""))
-            await handle_trasporti_linea(context, chat_id, lingua, query, linea_id, "bus")
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except ValueError:
-            pass
-
-    if callback_data == "tras_ferry":
-        await handle_trasporti_ferry(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("tras_ferry_linea_"):
-        try:
-            linea_id = int(callback_data.replace("tras_ferry_linea_", ""))
-            await handle_trasporti_linea(context, chat_id, lingua, query, linea_id, "ferry")
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except ValueError:
-            pass
-
-    # Routing traghetti per destinazione
-    if callback_data.startswith("tras_ferry_dest_"):
-        dest_key = callback_data.replace("tras_ferry_dest_", "")
-        await handle_trasporti_ferry_destinazione(context, chat_id, lingua, query, dest_key)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("tras_ferry_orari_"):
-        # tras_ferry_orari_{dest_key}_{direzione}
-        parts = callback_data.replace("tras_ferry_orari_", "").rsplit("_", 1)
-        if len(parts) == 2:
-            dest_key, direzione = parts
-            await handle_trasporti_ferry_orari(context, chat_id, lingua, query, dest_key, direzione)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-
-    if callback_data.startswith("tras_ferry_info_"):
-        dest_key = callback_data.replace("tras_ferry_info_", "")
-        await handle_trasporti_ferry_info(context, chat_id, lingua, query, dest_key)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "tras_prezzi":
-        await handle_trasporti_prezzi(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("tras_prezzi_op_"):
-        try:
-            op_id = int(callback_data.replace("tras_prezzi_op_", ""))
-            await handle_trasporti_prezzi_operatore(context, chat_id, lingua, query, op_id)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except ValueError:
-            pass
-
-    if callback_data.startswith("tras_orari_"):
-        try:
-            # tras_orari_{dest}_{zona}_{linea}_{ora} dove ora è HH-MM o "now"
-            parts = callback_data.replace("tras_orari_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
-            if len(parts) > 3:
-                linea_codice = parts[2]
-                ora_param = parts[3]
-                # Nuovo formato: ora esatta HH-MM o "now"
-                if ora_param == "now":
-                    ora_partenza = None
-                elif "-" in ora_param:
-                    ora_partenza = ora_param.replace("-", ":")
-                else:
-                    ora_partenza = None
-            elif len(parts) > 2:
-                linea_codice = parts[2]
-                ora_partenza = None
-            else:
-                linea_codice = "23A"
-                ora_partenza = None
-            await handle_trasporti_orari(context, chat_id, lingua, query, dest_id, zona_id, linea_codice, ora_partenza)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    # Selezione partenza specifica (1, 2, 3)
-    if callback_data.startswith("tras_dep_"):
-        try:
-            # tras_dep_{dest}_{zona}_{linea}_{index}_{ora} dove ora è HH-MM o "now"
-            parts = callback_data.replace("tras_dep_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
-            # Controlla nuovo formato con linea e ora
-            if len(parts) > 4:
-                linea_codice = parts[2]
-                dep_index = int(parts[3])
-                ora_param = parts[4]
-                # Converti HH-MM in HH:MM, "now" diventa None
-                if ora_param == "now":
-                    ora_partenza = None
-                elif "-" in ora_param:
-                    ora_partenza = ora_param.replace("-", ":")
-                else:
-                    ora_partenza = None
-            else:
-                # Retrocompatibilità
-                linea_codice = "23A"
-                dep_index = int(parts[2]) if len(parts) > 2 else 0
-                ora_partenza = None
-            await handle_trasporti_dep_select(context, chat_id, lingua, query, dest_id, zona_id, linea_codice, dep_index, ora_partenza)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data.startswith("tras_ritorno_"):
-        try:
-            parts = callback_data.replace("tras_ritorno_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
-            await handle_trasporti_ritorno(context, chat_id, lingua, query, dest_id, zona_id)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data.startswith("tras_orario_custom_"):
-        try:
-            parts = callback_data.replace("tras_orario_custom_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 and parts[1] != "0" else None
-            linea_codice = parts[2] if len(parts) > 2 else "23A"
-            await handle_trasporti_orario_custom(context, chat_id, lingua, query, dest_id, zona_id, linea_codice)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data.startswith("tras_fermata_"):
-        try:
-            # tras_fermata_{dest}_{zona}
-            parts = callback_data.replace("tras_fermata_", "").split("_")
-            dest_id = int(parts[0])
-            zona_id = int(parts[1]) if len(parts) > 1 else None
-            await handle_trasporti_fermata(context, chat_id, lingua, query, dest_id, zona_id)
-            db.update_user(chat_id, {"last_update_id": update_id})
-            return
-        except (ValueError, IndexError):
-            pass
-
-    if callback_data == "tras_isole":
-        await handle_trasporti_isole(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data == "tras_paese":
-        await handle_trasporti_paese(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+async def _callback_noop(context, chat_id: int, lingua: str, query=None):
+    """Bottone placeholder (es. numero pagina): risponde solo al callback"""
+    if query:
+        await query.answer()
 
-    # ============ FINE ROUTING TRASPORTI ============
 
-    # ============ ROUTING FORTINI ============
-    if callback_data == "menu_fortini":
-        await handle_fortini(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+async def _callback_compatta(context, chat_id: int, lingua: str, query, stato: tuple):
+    """Callback codificata con callback_codec: (schermata, campi) -> handler trasporti"""
+    schermata, campi = stato
+    await _SCHERMATE_COMPATTE[schermata](context, chat_id, lingua, query, **campi)
 
-    if callback_data == "fort_zone":
-        await handle_fortini_zone(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
 
-    if callback_data.startswith("fort_zona_"):
-        zona_key = callback_data.replace("fort_zona_", "")
-        await handle_fortini_lista(context, chat_id, lingua, query, zona_key)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+_menu_router = None
+_SCHERMATE_COMPATTE = {}   # schermata callback_codec -> handler (riempita con il router)
 
-    if callback_data.startswith("fort_detail_"):
-        fortino_id = callback_data.replace("fort_detail_", "")
-        await handle_fortini_dettaglio(context, chat_id, lingua, query, fortino_id)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
 
-    if callback_data == "fort_percorsi":
-        await handle_percorsi_lista(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if callback_data.startswith("fort_percorso_"):
-        percorso_id = callback_data.replace("fort_percorso_", "")
-        await handle_percorsi_dettaglio(context, chat_id, lingua, query, percorso_id)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-    # ============ FINE ROUTING FORTINI ============
-
-    if menu_key == "ristoranti":
-        await handle_ristoranti(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
-
-    if menu_key == "sos":
-        await handle_sos(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+def _get_menu_router() -> router.Router:
+    """
+    Tabella delle rotte di action_menu (costruita al primo click, quando tutti
+    gli handler del modulo sono definiti). I parametri hanno i nomi degli
+    argomenti degli handler; menu_back e i menu generici restano in action_menu.
+    """
+    global _menu_router
+    if _menu_router is not None:
+        return _menu_router
 
-    if menu_key == "sos_emergenza":
-        await handle_sos_emergenza(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+    _SCHERMATE_COMPATTE.update({
+        "percorso": handle_trasporti_quando,
+        "viaggio": handle_trasporti_percorso,
+        "orari": handle_trasporti_orari,
+        "dep": handle_trasporti_dep_select,
+        "orario_custom": handle_trasporti_orario_custom,
+        "fraz_quando": handle_trasporti_frazione_quando,
+        "fraz_viaggio": handle_trasporti_frazione_viaggio,
+    })
 
-    if menu_key == "sos_guardia_medica":
-        await handle_sos_guardia_medica(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+    router.registra_tipo("compatta", r".*", callback_codec.decodifica)
+    r = router.Router()
+
+    # Menu principale
+    r.aggiungi("menu_meteo", handle_meteo)
+    r.aggiungi("menu_mare", handle_mare)
+    r.aggiungi("menu_maree", handle_maree)
+    r.aggiungi("menu_idee", handle_idee_oggi)
+    r.aggiungi("menu_cosa_fare", handle_idee_oggi)
+    r.aggiungi("menu_idee_oggi", handle_idee_oggi)
+    r.aggiungi("menu_pioggia", handle_pioggia)
+    r.aggiungi("menu_spiagge", handle_spiagge)
+    r.aggiungi("menu_fortini", handle_fortini)
+    r.aggiungi("menu_attivita", handle_attivita)
+    r.aggiungi("menu_eventi", handle_eventi)
+    r.aggiungi("menu_trasporti", handle_trasporti)
+    r.aggiungi("menu_ristoranti", handle_ristoranti)
+    r.aggiungi("menu_sos", handle_sos)
+    r.aggiungi("menu_sos_emergenza", handle_sos_emergenza)
+    r.aggiungi("menu_sos_guardia_medica", handle_sos_guardia_medica)
+    r.aggiungi("menu_sos_ospedali", handle_sos_ospedali)
+    r.aggiungi("menu_sos_farmacie", handle_sos_farmacie)
+    r.aggiungi("menu_sos_numeri", handle_sos_numeri)
+
+    # Idee per oggi
+    r.aggiungi("idee_spiagge", handle_idee_spiagge)
+    r.aggiungi("idee_spiaggia_{spiaggia_id:resto}", handle_idee_spiaggia_dettaglio)
+    r.aggiungi("idee_fortini", handle_idee_fortini)
+    r.aggiungi("idee_fortino_{fortino_id:resto}", handle_idee_fortino_dettaglio)
+    r.aggiungi("idee_attivita", handle_idee_attivita)
+    r.aggiungi("idee_att_{categoria:resto}", handle_idee_attivita_categoria)
+    r.aggiungi("idee_pioggia", handle_idee_pioggia)
+    r.aggiungi("idee_laguna", handle_idee_laguna)
+    r.aggiungi("idee_laguna_{luogo_id:resto}", handle_idee_laguna_dettaglio)
+
+    # Eventi
+    r.aggiungi("evt_home", handle_eventi)
+    for periodo in ("oggi", "domani", "sett_0", "sett_1"):
+        r.aggiungi(f"evt_{periodo}", handle_eventi_lista, periodo=periodo, pagina=0)
+    r.aggiungi("evt_list_{periodo:w}_p{pagina:num}", handle_eventi_lista)
+    r.aggiungi("evt_categoria", handle_eventi_categorie)
+    r.aggiungi("evt_cat_{categoria:w}_p{pagina:num}", handle_eventi_lista, periodo="sett_0")
+    r.aggiungi("evt_detail_{evento_id:id}", handle_evento_dettaglio)
+    r.aggiungi("evt_cal", handle_eventi_calendario)
+    r.aggiungi("evt_cal_{anno:num}_{mese:num}", handle_eventi_calendario)
+    r.aggiungi("evt_cal_giorno_{anno:num}_{mese:num}_{giorno:num}", handle_eventi_giorno)
+    r.aggiungi("noop", _callback_noop, registra_update=False)
+
+    # Trasporti
+    r.aggiungi("tras_home", handle_trasporti)
+    r.aggiungi("tras_arrivo", handle_trasporti_arrivo)
+    r.aggiungi("tras_dest_{destinazione_id:id}", handle_trasporti_zona)
+    # tras_percorso_{dest}_{zona}_{linea} oppure tras_percorso_{dest}_{zona} (retrocompatibilità)
+    r.aggiungi("tras_percorso_{destinazione_id:int}_{zona_id:zona?}_{linea_codice:str=23A}", handle_trasporti_quando)
+    # tras_viaggio_{dest}_{zona}_{linea}_{ora} dove ora è HH-MM (offset in minuti: retrocompatibilità)
+    r.aggiungi("tras_viaggio_{destinazione_id:int}_{zona_id:zona?}_{linea_codice:str=23A}_{ora_partenza:hhmm?}", handle_trasporti_percorso)
+    r.aggiungi("tras_frazione", handle_trasporti_frazione)
+    r.aggiungi("tras_fraz_viaggio_{da_zona_id:int}_{a_zona_id:int}_{linea_codice:str}_{offset_minuti:int=0}", handle_trasporti_frazione_viaggio)
+    r.aggiungi("tras_fraz_quando_{da_zona_id:int}_{a_zona_id:int}_{linea_codice:str}", handle_trasporti_frazione_quando)
+    r.aggiungi("tras_fraz_linea_{da_zona_id:int}_{a_zona_id:int}", handle_trasporti_frazione_linea)
+    r.aggiungi("tras_fraz_{da_zona_id:int}_{a_zona_id:int?}", handle_trasporti_frazione_percorso)
+    r.aggiungi("tras_bus", handle_trasporti_bus)
+    r.aggiungi("tras_bus_linea_{linea_id:id}", handle_trasporti_linea, tipo="bus")
+    r.aggiungi("tras_ferry", handle_trasporti_ferry)
+    r.aggiungi("tras_ferry_linea_{linea_id:id}", handle_trasporti_linea, tipo="ferry")
+    r.aggiungi("tras_ferry_dest_{dest_key:resto}", handle_trasporti_ferry_destinazione)
+    r.aggiungi("tras_ferry_orari_{dest_key:resto}_{direzione:str}", handle_trasporti_ferry_orari)
+    r.aggiungi("tras_ferry_info_{dest_key:resto}", handle_trasporti_ferry_info)
+    r.aggiungi("tras_prezzi", handle_trasporti_prezzi)
+    r.aggiungi("tras_prezzi_op_{operatore_id:id}", handle_trasporti_prezzi_operatore)
+    # tras_orari_{dest}_{zona}_{linea}_{ora} dove ora è HH-MM o "now"
+    r.aggiungi("tras_orari_{destinazione_id:int}_{zona_id:zona?}_{linea_codice:str=23A}_{ora_partenza:ora?}", handle_trasporti_orari)
+    # tras_dep_{dest}_{zona}_{linea}_{index}_{ora}, poi il vecchio tras_dep_{dest}_{zona}_{index}
+    r.aggiungi("tras_dep_{destinazione_id:int}_{zona_id:zona}_{linea_codice:str}_{dep_index:int}_{ora_partenza:ora}", handle_trasporti_dep_select)
+    r.aggiungi("tras_dep_{destinazione_id:int}_{zona_id:zona?}_{dep_index:int=0}", handle_trasporti_dep_select,
+               segmenti_max=4, linea_codice="23A")
+    r.aggiungi("tras_ritorno_{destinazione_id:int}_{zona_id:zona?}", handle_trasporti_ritorno)
+    r.aggiungi("tras_orario_custom_{destinazione_id:int}_{zona_id:zona?}_{linea_codice:str=23A}", handle_trasporti_orario_custom)
+    r.aggiungi("tras_fermata_{destinazione_id:int}_{zona_id:int?}", handle_trasporti_fermata)
+    r.aggiungi("tras_isole", handle_trasporti_isole)
+    r.aggiungi("tras_paese", handle_trasporti_paese)
+
+    # Callback compatte (callback_codec.py): stato della navigazione trasporti nel bottone
+    r.aggiungi("z_{stato:compatta}", _callback_compatta)
+
+    # Fortini
+    r.aggiungi("fort_zone", handle_fortini_zone)
+    r.aggiungi("fort_zona_{zona_key:resto}", handle_fortini_lista)
+    r.aggiungi("fort_detail_{fortino_id:resto}", handle_fortini_dettaglio)
+    r.aggiungi("fort_percorsi", handle_percorsi_lista)
+    r.aggiungi("fort_percorso_{percorso_id:resto}", handle_percorsi_dettaglio)
+
+    _menu_router = r
+    return r
 
-    if menu_key == "sos_ospedali":
-        await handle_sos_ospedali(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
 
-    if menu_key == "sos_farmacie":
-        await handle_sos_farmacie(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
-        return
+async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, callback_data: str, nome: str, lingua: str, query=None):
+    """Gestisce click su menu"""
+    menu_key = callback_data.replace("menu_", "") if callback_data.startswith("menu_") else ""
 
-    if menu_key == "sos_numeri":
-        await handle_sos_numeri(context, chat_id, lingua, query)
-        db.update_user(chat_id, {"last_update_id": update_id})
+    trovata = _get_menu_router().trova(callback_data)
+    if trovata is not None:
+        rotta, parametri = trovata
+        await rotta.gestore(context, chat_id, lingua, query, **parametri)
+        if rotta.registra_update:
+            db.queue_last_update_id(chat_id, update_id)
         return
 
     if menu_key == "back":
@@ -1332,7 +953,7 @@ async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_i
         text = f"{data_str}\n"
         if meteo_str:
             text += f"{meteo_str}\n"
-        evento_str = get_evento_oggi(lingua)
+        evento_str = await get_evento_oggi(lingua)
         if evento_str:
             text += f"{evento_str}\n"
         text += f"\n👋 Bentornato, {nome}!\n{welcome}"
@@ -1351,7 +972,7 @@ async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_i
                 reply_markup=keyboard,
                 parse_mode="HTML"
             )
-        db.update_user(chat_id, {"last_update_id": update_id})
+        db.queue_last_update_id(chat_id, update_id)
         return
 
     # Mappa callback -> chiave testo (menu legacy)
@@ -1363,7 +984,7 @@ async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_i
         await query.answer()
 
     if menu_key in menu_responses:
-        text = db.get_text(menu_responses[menu_key], lingua)
+        text = await db.get_text(menu_responses[menu_key], lingua)
         if "{nome}" in text:
             text = text.replace("{nome}", nome)
 
@@ -1424,7 +1045,7 @@ async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_i
         text = f"{data_str}\n"
         if meteo_str:
             text += f"{meteo_str}\n"
-        evento_str = get_evento_oggi(lingua)
+        evento_str = await get_evento_oggi(lingua)
         if evento_str:
             text += f"{evento_str}\n"
         text += f"\n👋 Bentornato, {nome}!\n{welcome}"
@@ -1444,13 +1065,13 @@ async def action_menu(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_i
                 parse_mode="HTML"
             )
 
-    db.update_user(chat_id, {"last_update_id": update_id})
+    db.queue_last_update_id(chat_id, update_id)
 
 
 async def action_limite_raggiunto(context: ContextTypes.DEFAULT_TYPE, chat_id: int, config: dict, lingua: str):
     """Limite utenti raggiunto (nodo 38)"""
     canale_link = config.get("canale_telegram", "https://t.me/tuocanale")
-    text = db.get_text("msg_limite", lingua)
+    text = await db.get_text("msg_limite", lingua)
     text = text.replace("{canale}", canale_link)
 
     await context.bot.send_message(
@@ -1462,7 +1083,7 @@ async def action_limite_raggiunto(context: ContextTypes.DEFAULT_TYPE, chat_id: i
 
 async def action_fallback(context: ContextTypes.DEFAULT_TYPE, chat_id: int, update_id: int, lingua: str):
     """Messaggio non capito (nodo 37)"""
-    text = db.get_text("msg_fallback", lingua)
+    text = await db.get_text("msg_fallback", lingua)
 
     await context.bot.send_message(
         chat_id=chat_id,
@@ -1470,15 +1091,15 @@ async def action_fallback(context: ContextTypes.DEFAULT_TYPE, chat_id: int, upda
         parse_mode="HTML"
     )
 
-    db.update_user(chat_id, {"last_update_id": update_id})
+    db.queue_last_update_id(chat_id, update_id)
 
 
-def get_evento_oggi(lingua: str) -> str:
+async def get_evento_oggi(lingua: str) -> str:
     """
     Restituisce l'evento del giorno se presente, altrimenti stringa vuota.
     Legge dalla tabella 'eventi' in Supabase.
     """
-    evento_oggi = db.get_evento_oggi(lingua)
+    evento_oggi = await db.get_evento_oggi(lingua)
 
     if evento_oggi:
         labels = {
@@ -1540,7 +1161,7 @@ async def handle_meteo(context, chat_id: int, lingua: str, query=None):
         meteo = None
 
     if not meteo:
-        text = db.get_text("meteo_errore", lingua)
+        text = await db.get_text("meteo_errore", lingua)
         if text == "meteo_errore":
             text = "⚠️ Impossibile ottenere dati meteo. Riprova più tardi."
     else:
@@ -1579,7 +1200,7 @@ async def handle_meteo(context, chat_id: int, lingua: str, query=None):
 
         # BLOCCO 2: Suggerimento (separato da riga vuota)
         condizione = "sole" if weather_code in (0, 1, 2) else "pioggia" if weather_code >= 51 else "nuvole"
-        consiglio = db.get_consiglio_meteo(condizione, lingua)
+        consiglio = await db.get_consiglio_meteo(condizione, lingua)
 
         # Fallback suggerimenti hardcoded
         if not consiglio:
@@ -1606,7 +1227,7 @@ async def handle_meteo(context, chat_id: int, lingua: str, query=None):
         text += f"\n💡 <b>{suggerimento_label}</b>\n{consiglio}\n"
 
         # BLOCCO 3: Evento di oggi (se presente, separato)
-        evento_oggi = db.get_evento_oggi(lingua)
+        evento_oggi = await db.get_evento_oggi(lingua)
         if evento_oggi:
             evento_label = {"it": "Evento di oggi", "en": "Today's event", "de": "Heutiges Event"}.get(lingua, "Evento di oggi")
             text += f"\n🎪 <b>{evento_label}</b>\n{evento_oggi}\n"
@@ -1721,7 +1342,7 @@ async def handle_maree(context, chat_id: int, lingua: str, query=None):
         tides = None
 
     if not tides or not tides.get("extremes"):
-        text = db.get_text("maree_errore", lingua)
+        text = await db.get_text("maree_errore", lingua)
         if text == "maree_errore":
             text = "⚠️ Impossibile ottenere dati maree. Riprova più tardi."
     else:
@@ -1878,11 +1499,8 @@ SPIAGGE_DATA = {
 }
 
 
-async def handle_idee_spiagge(context, chat_id: int, lingua: str, query=None):
-    """Lista spiagge con 4 pulsanti."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_spiagge")
+def _schermata_idee_spiagge(lingua: str):
     header = {"it": "SPIAGGE", "en": "BEACHES", "de": "STRÄNDE"}.get(lingua, "SPIAGGE")
     subtitle = {"it": "Scegli una spiaggia:", "en": "Choose a beach:", "de": "Wähle einen Strand:"}.get(lingua, "Scegli una spiaggia:")
 
@@ -1895,6 +1513,15 @@ async def handle_idee_spiagge(context, chat_id: int, lingua: str, query=None):
         [InlineKeyboardButton("🏖️ Treporti", callback_data="idee_spiaggia_treporti")],
         [InlineKeyboardButton("◀️ Indietro", callback_data="menu_idee")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_spiagge(context, chat_id: int, lingua: str, query=None):
+    """Lista spiagge con 4 pulsanti."""
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("idee_spiagge", lingua)
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -1902,15 +1529,11 @@ async def handle_idee_spiagge(context, chat_id: int, lingua: str, query=None):
         await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, parse_mode="HTML")
 
 
-async def handle_idee_spiaggia_dettaglio(context, chat_id: int, lingua: str, query, spiaggia_id: str):
-    """Dettaglio singola spiaggia."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_spiaggia", parametri=lambda: [(k,) for k in SPIAGGE_DATA])
+def _schermata_idee_spiaggia(lingua: str, spiaggia_id: str):
     spiaggia = SPIAGGE_DATA.get(spiaggia_id)
     if not spiaggia:
-        await handle_idee_spiagge(context, chat_id, lingua, query)
-        return
+        return None
 
     nome = spiaggia["nome"].get(lingua, spiaggia["nome"]["it"])
     tipo = spiaggia["tipo"].get(lingua, spiaggia["tipo"]["it"])
@@ -1929,6 +1552,19 @@ async def handle_idee_spiaggia_dettaglio(context, chat_id: int, lingua: str, que
         [InlineKeyboardButton(btn_naviga, url=maps_url)],
         [InlineKeyboardButton(btn_indietro, callback_data="idee_spiagge")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_spiaggia_dettaglio(context, chat_id: int, lingua: str, query, spiaggia_id: str):
+    """Dettaglio singola spiaggia."""
+    if query:
+        await query.answer()
+
+    schermata = await _get_schermata("idee_spiaggia", lingua, spiaggia_id)
+    if schermata is None:
+        await handle_idee_spiagge(context, chat_id, lingua, query)
+        return
+    text, keyboard = schermata
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -1972,11 +1608,8 @@ FORTINI_DATA = {
 }
 
 
-async def handle_idee_fortini(context, chat_id: int, lingua: str, query=None):
-    """Lista fortini."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_fortini")
+def _schermata_idee_fortini(lingua: str):
     header = {"it": "FORTINI", "en": "FORTS", "de": "FESTUNGEN"}.get(lingua, "FORTINI")
     subtitle = {"it": "Testimonianze storiche della zona:", "en": "Historical heritage of the area:", "de": "Historisches Erbe der Gegend:"}.get(lingua, "Testimonianze storiche della zona:")
 
@@ -1989,6 +1622,15 @@ async def handle_idee_fortini(context, chat_id: int, lingua: str, query=None):
         [InlineKeyboardButton("🏰 Forte Ca' Pasquali", callback_data="idee_fortino_pisani")],
         [InlineKeyboardButton("◀️ Indietro", callback_data="menu_idee")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_fortini(context, chat_id: int, lingua: str, query=None):
+    """Lista fortini."""
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("idee_fortini", lingua)
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -1996,15 +1638,11 @@ async def handle_idee_fortini(context, chat_id: int, lingua: str, query=None):
         await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, parse_mode="HTML")
 
 
-async def handle_idee_fortino_dettaglio(context, chat_id: int, lingua: str, query, fortino_id: str):
-    """Dettaglio singolo fortino."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_fortino", parametri=lambda: [(k,) for k in FORTINI_DATA])
+def _schermata_idee_fortino(lingua: str, fortino_id: str):
     fortino = FORTINI_DATA.get(fortino_id)
     if not fortino:
-        await handle_idee_fortini(context, chat_id, lingua, query)
-        return
+        return None
 
     nome = fortino["nome"].get(lingua, fortino["nome"]["it"])
     dove = fortino["dove"].get(lingua, fortino["dove"]["it"])
@@ -2028,6 +1666,19 @@ async def handle_idee_fortino_dettaglio(context, chat_id: int, lingua: str, quer
         [InlineKeyboardButton(btn_naviga, url=maps_url)],
         [InlineKeyboardButton(btn_indietro, callback_data="idee_fortini")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_fortino_dettaglio(context, chat_id: int, lingua: str, query, fortino_id: str):
+    """Dettaglio singolo fortino."""
+    if query:
+        await query.answer()
+
+    schermata = await _get_schermata("idee_fortino", lingua, fortino_id)
+    if schermata is None:
+        await handle_idee_fortini(context, chat_id, lingua, query)
+        return
+    text, keyboard = schermata
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -2039,11 +1690,8 @@ async def handle_idee_fortino_dettaglio(context, chat_id: int, lingua: str, quer
 # SEZIONE ATTIVITÀ
 # ============================================================
 
-async def handle_idee_attivita(context, chat_id: int, lingua: str, query=None):
-    """Menu attività con 3 sottocategorie."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_attivita")
+def _schermata_idee_attivita(lingua: str):
     header = {"it": "ATTIVITÀ", "en": "ACTIVITIES", "de": "AKTIVITÄTEN"}.get(lingua, "ATTIVITÀ")
     subtitle = {"it": "Scegli una categoria:", "en": "Choose a category:", "de": "Wähle eine Kategorie:"}.get(lingua, "Scegli una categoria:")
 
@@ -2062,6 +1710,15 @@ async def handle_idee_attivita(context, chat_id: int, lingua: str, query=None):
         [InlineKeyboardButton(L["acqua"], callback_data="idee_att_acqua")],
         [InlineKeyboardButton("◀️ Indietro", callback_data="menu_idee")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_attivita(context, chat_id: int, lingua: str, query=None):
+    """Menu attività con 3 sottocategorie."""
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("idee_attivita", lingua)
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -2181,15 +1838,11 @@ ATTIVITA_DATA = {
 }
 
 
-async def handle_idee_attivita_categoria(context, chat_id: int, lingua: str, query, categoria: str):
-    """Mostra attività per categoria."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_att", parametri=lambda: [(k,) for k in ATTIVITA_DATA])
+def _schermata_idee_att(lingua: str, categoria: str):
     data = ATTIVITA_DATA.get(categoria)
     if not data:
-        await handle_idee_attivita(context, chat_id, lingua, query)
-        return
+        return None
 
     header = data["header"].get(lingua, data["header"]["it"])
     contenuto = data["contenuto"].get(lingua, data["contenuto"]["it"])
@@ -2201,6 +1854,19 @@ async def handle_idee_attivita_categoria(context, chat_id: int, lingua: str, que
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton(btn_indietro, callback_data="idee_attivita")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_attivita_categoria(context, chat_id: int, lingua: str, query, categoria: str):
+    """Mostra attività per categoria."""
+    if query:
+        await query.answer()
+
+    schermata = await _get_schermata("idee_att", lingua, categoria)
+    if schermata is None:
+        await handle_idee_attivita(context, chat_id, lingua, query)
+        return
+    text, keyboard = schermata
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -2346,11 +2012,8 @@ LAGUNA_DATA = {
 }
 
 
-async def handle_idee_laguna(context, chat_id: int, lingua: str, query=None):
-    """Menu laguna con 3 luoghi."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_laguna")
+def _schermata_idee_laguna(lingua: str):
     header = {"it": "LAGUNA", "en": "LAGOON", "de": "LAGUNE"}.get(lingua, "LAGUNA")
     subtitle = {"it": "Scopri i borghi della laguna:", "en": "Discover the lagoon villages:", "de": "Entdecke die Lagunendörfer:"}.get(lingua, "Scopri i borghi della laguna:")
 
@@ -2362,6 +2025,15 @@ async def handle_idee_laguna(context, chat_id: int, lingua: str, query=None):
         [InlineKeyboardButton("🌿 Mesole", callback_data="idee_laguna_mesole")],
         [InlineKeyboardButton("◀️ Indietro", callback_data="menu_idee")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_laguna(context, chat_id: int, lingua: str, query=None):
+    """Menu laguna con 3 luoghi."""
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("idee_laguna", lingua)
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -2369,15 +2041,11 @@ async def handle_idee_laguna(context, chat_id: int, lingua: str, query=None):
         await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, parse_mode="HTML")
 
 
-async def handle_idee_laguna_dettaglio(context, chat_id: int, lingua: str, query, luogo_id: str):
-    """Dettaglio singolo luogo laguna."""
-    if query:
-        await query.answer()
-
+@schermate.schermata("idee_laguna_luogo", parametri=lambda: [(k,) for k in LAGUNA_DATA])
+def _schermata_idee_laguna_luogo(lingua: str, luogo_id: str):
     luogo = LAGUNA_DATA.get(luogo_id)
     if not luogo:
-        await handle_idee_laguna(context, chat_id, lingua, query)
-        return
+        return None
 
     nome = luogo["nome"].get(lingua, luogo["nome"]["it"])
     desc = luogo["desc"].get(lingua, luogo["desc"]["it"])
@@ -2397,6 +2065,19 @@ async def handle_idee_laguna_dettaglio(context, chat_id: int, lingua: str, query
         [InlineKeyboardButton(btn_naviga, url=maps_url)],
         [InlineKeyboardButton(btn_indietro, callback_data="idee_laguna")]
     ])
+    return text, keyboard
+
+
+async def handle_idee_laguna_dettaglio(context, chat_id: int, lingua: str, query, luogo_id: str):
+    """Dettaglio singolo luogo laguna."""
+    if query:
+        await query.answer()
+
+    schermata = await _get_schermata("idee_laguna_luogo", lingua, luogo_id)
+    if schermata is None:
+        await handle_idee_laguna(context, chat_id, lingua, query)
+        return
+    text, keyboard = schermata
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -2412,7 +2093,7 @@ async def handle_pioggia(context, chat_id: int, lingua: str, query=None):
     if query:
         await query.answer()
 
-    text = db.get_text("idee_pioggia", lingua)
+    text = await db.get_text("idee_pioggia", lingua)
 
     if text == "idee_pioggia":
         # Fallback se testo non trovato in DB
@@ -2510,15 +2191,11 @@ Wenn es in Cavallino-Treporti regnet:
         )
 
 
-async def handle_spiagge(context, chat_id: int, lingua: str, query=None):
-    """
-    Mostra informazioni sulle spiagge di Cavallino-Treporti.
-    """
-    # Rispondi al callback SUBITO
-    if query:
-        await query.answer()
+@schermate.schermata("spiagge")
+def _schermata_spiagge(lingua: str):
+    import database
 
-    text = db.get_text("info_spiagge", lingua)
+    text = database.get_text("info_spiagge", lingua)
 
     if text == "info_spiagge":
         fallback = {
@@ -2613,6 +2290,18 @@ async def handle_spiagge(context, chat_id: int, lingua: str, query=None):
         [InlineKeyboardButton("💡 Altre idee", callback_data="menu_idee")],
         [InlineKeyboardButton("◀️ Menu", callback_data="menu_back")]
     ])
+    return text, keyboard
+
+
+async def handle_spiagge(context, chat_id: int, lingua: str, query=None):
+    """
+    Mostra informazioni sulle spiagge di Cavallino-Treporti.
+    """
+    # Rispondi al callback SUBITO
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("spiagge", lingua)
 
     # Edita messaggio esistente invece di mandarne uno nuovo
     if query:
@@ -2630,13 +2319,8 @@ async def handle_spiagge(context, chat_id: int, lingua: str, query=None):
         )
 
 
-async def handle_fortini(context, chat_id: int, lingua: str, query=None):
-    """
-    Menu principale Fortini: 🏰 Fortini, 🚴 Percorsi, ◀️ Indietro
-    """
-    if query:
-        await query.answer()
-
+@schermate.schermata("fortini")
+def _schermata_fortini(lingua: str):
     header = {
         "it": "🏰 <b>Fortini di Cavallino-Treporti</b>",
         "en": "🏰 <b>Forts of Cavallino-Treporti</b>",
@@ -2660,6 +2344,17 @@ async def handle_fortini(context, chat_id: int, lingua: str, query=None):
         [InlineKeyboardButton(btn_percorsi.get(lingua, btn_percorsi["it"]), callback_data="fort_percorsi")],
         [InlineKeyboardButton(btn_back.get(lingua, btn_back["it"]), callback_data="menu_back")]
     ])
+    return text, keyboard
+
+
+async def handle_fortini(context, chat_id: int, lingua: str, query=None):
+    """
+    Menu principale Fortini: 🏰 Fortini, 🚴 Percorsi, ◀️ Indietro
+    """
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("fortini", lingua)
 
     if query:
         await query.edit_message_text(text=text, reply_markup=keyboard, parse_mode="HTML")
@@ -2729,7 +2424,7 @@ async def handle_fortini_lista(context, chat_id: int, lingua: str, query, zona_k
         await query.answer()
 
     zona_nome = _zona_key_to_nome(zona_key)
-    fortini = db.get_fortini_by_zona(zona_nome)
+    fortini = await db.get_fortini_by_zona(zona_nome)
 
     header = {
         "it": f"🏰 <b>Fortini a {zona_nome}</b>",
@@ -2773,7 +2468,7 @@ async def handle_fortini_dettaglio(context, chat_id: int, lingua: str, query, fo
     if query:
         await query.answer()
 
-    fortino = db.get_fortino_by_id(fortino_id)
+    fortino = await db.get_fortino_by_id(fortino_id)
 
     if not fortino:
         error = {"it": "Fortino non trovato.", "en": "Fort not found.", "de": "Festung nicht gefunden."}
@@ -2843,7 +2538,7 @@ async def handle_percorsi_lista(context, chat_id: int, lingua: str, query=None):
     if query:
         await query.answer()
 
-    percorsi = db.get_percorsi_fortini_attivi()
+    percorsi = await db.get_percorsi_fortini_attivi()
 
     header = {
         "it": "🚴 <b>Percorsi Fortini</b>",
@@ -2880,7 +2575,7 @@ async def handle_percorsi_dettaglio(context, chat_id: int, lingua: str, query, p
     if query:
         await query.answer()
 
-    percorso = db.get_percorso_by_id(percorso_id)
+    percorso = await db.get_percorso_by_id(percorso_id)
 
     if not percorso:
         error = {"it": "Percorso non trovato.", "en": "Route not found.", "de": "Route nicht gefunden."}
@@ -2927,7 +2622,7 @@ async def handle_percorsi_dettaglio(context, chat_id: int, lingua: str, query, p
         text += f"\n{descrizione}\n"
 
     # Fortini nel percorso
-    fortini_percorso = db.get_fortini_in_percorso(percorso_id)
+    fortini_percorso = await db.get_fortini_in_percorso(percorso_id)
     if fortini_percorso:
         tappe_label = {"it": "📍 Tappe:", "en": "📍 Stops:", "de": "📍 Stationen:"}
         text += f"\n{tappe_label.get(lingua, tappe_label['it'])}\n"
@@ -2960,7 +2655,7 @@ async def handle_attivita(context, chat_id: int, lingua: str, query=None):
     if query:
         await query.answer()
 
-    text = db.get_text("info_attivita", lingua)
+    text = await db.get_text("info_attivita", lingua)
 
     if text == "info_attivita":
         fallback = {
@@ -3120,6 +2815,52 @@ CATEGORIA_LABELS = {
 
 EVENTI_PER_PAGINA = 5
 
+# Pagine eventi per chat: quella mostrata, la precedente e la successiva pre-caricata.
+# chat_id -> {"navigazione": (periodo, categoria, data_inizio, data_fine), "pagine": {n: (timestamp, risultato)}}
+_eventi_pagine = {}
+EVENTI_PREFETCH_TTL = 120  # Secondi di validità di una pagina in cache
+EVENTI_PAGINE_MAX_CHAT = 2000
+
+
+def _eventi_pagina_get(chat_id: int, navigazione: tuple, pagina: int, max_eta: float = EVENTI_PREFETCH_TTL):
+    """Pagina in cache per la chat (None se assente, di un'altra lista o scaduta)"""
+    import time
+
+    voce = _eventi_pagine.get(chat_id)
+    if voce is None or voce["navigazione"] != navigazione:
+        return None
+    salvata = voce["pagine"].get(pagina)
+    if salvata is None or time.time() - salvata[0] > max_eta:
+        return None
+    return salvata[1]
+
+
+def _eventi_pagina_put(chat_id: int, navigazione: tuple, pagina: int, risultato: dict):
+    """Salva una pagina per la chat, tenendo solo le pagine vicine"""
+    import time
+
+    voce = _eventi_pagine.get(chat_id)
+    if voce is None or voce["navigazione"] != navigazione:
+        if chat_id not in _eventi_pagine and len(_eventi_pagine) >= EVENTI_PAGINE_MAX_CHAT:
+            # Scarta la chat inserita da più tempo
+            _eventi_pagine.pop(next(iter(_eventi_pagine)))
+        voce = {"navigazione": navigazione, "pagine": {}}
+        _eventi_pagine[chat_id] = voce
+    voce["pagine"][pagina] = (time.time(), risultato)
+    for n in [n for n in voce["pagine"] if abs(n - pagina) > 1]:
+        del voce["pagine"][n]
+
+
+async def _prefetch_eventi_pagina(chat_id: int, navigazione: tuple, pagina: int, cursore: tuple):
+    """Carica in background la pagina successiva (keyset dal cursore della pagina mostrata)"""
+    periodo, categoria, data_inizio, data_fine = navigazione
+    try:
+        risultato = await db.get_eventi_pagina(data_inizio, data_fine, EVENTI_PER_PAGINA,
+                                               pagina=pagina, dopo=cursore, categoria=categoria)
+        _eventi_pagina_put(chat_id, navigazione, pagina, risultato)
+    except Exception as e:
+        logger.error(f"Errore prefetch eventi {chat_id} p{pagina}: {e}")
+
 
 def _get_periodo_date(periodo: str):
     """Calcola date inizio/fine per un periodo."""
@@ -3184,7 +2925,7 @@ async def handle_eventi(context, chat_id: int, lingua: str, query=None):
     text = titoli.get(lingua, titoli["it"]) + "\n\n"
 
     # Evento imperdibile del giorno
-    imperdibile = db.get_evento_imperdibile()
+    imperdibile = await db.get_evento_imperdibile()
     if imperdibile:
         titolo_imp = imperdibile.get(f"titolo_{lingua}") or imperdibile.get("titolo_it", "")
         luogo_imp = imperdibile.get("luogo", "")
@@ -3200,8 +2941,8 @@ async def handle_eventi(context, chat_id: int, lingua: str, query=None):
         text += "\n\n"
 
     # Conta eventi per periodo
-    oggi_count = db.get_eventi_count_periodo(oggi.isoformat(), oggi.isoformat())
-    domani_count = db.get_eventi_count_periodo((oggi + timedelta(days=1)).isoformat(), (oggi + timedelta(days=1)).isoformat())
+    oggi_count = await db.get_eventi_count_periodo(oggi.isoformat(), oggi.isoformat())
+    domani_count = await db.get_eventi_count_periodo((oggi + timedelta(days=1)).isoformat(), (oggi + timedelta(days=1)).isoformat())
 
     # Info rapida
     info_labels = {"it": "Cosa vuoi vedere?", "en": "What would you like to see?", "de": "Was möchten Sie sehen?"}
@@ -3264,10 +3005,20 @@ async def handle_eventi_lista(context, chat_id: int, lingua: str, query, periodo
         cat_label = CATEGORIA_LABELS.get(categoria, {}).get(lingua, categoria.title())
         titolo = f"{CATEGORIA_EMOJI.get(categoria, '🎪')} {cat_label}"
 
-    # Query eventi
-    offset = pagina * EVENTI_PER_PAGINA
-    eventi = db.get_eventi_periodo(data_inizio, data_fine, limit=EVENTI_PER_PAGINA, offset=offset, categoria=categoria)
-    totale = db.get_eventi_count_periodo(data_inizio, data_fine, categoria=categoria)
+    # Pagina eventi + totale: dalla cache della chat (pre-caricata con ▶️), altrimenti una
+    # sola chiamata, in keyset dal cursore della pagina precedente se è in cache
+    navigazione = (periodo, categoria, data_inizio, data_fine)
+    risultato = _eventi_pagina_get(chat_id, navigazione, pagina)
+    if risultato is None:
+        precedente = _eventi_pagina_get(chat_id, navigazione, pagina - 1, max_eta=float("inf")) if pagina > 0 else None
+        risultato = await db.get_eventi_pagina(
+            data_inizio, data_fine, EVENTI_PER_PAGINA, pagina=pagina,
+            dopo=precedente["cursore"] if precedente else None, categoria=categoria
+        )
+        _eventi_pagina_put(chat_id, navigazione, pagina, risultato)
+    eventi = risultato["eventi"]
+    totale = risultato["totale"]
+    statistiche.registra_eventi_serviti(len(eventi))
     totale_pagine = (totale + EVENTI_PER_PAGINA - 1) // EVENTI_PER_PAGINA
 
     text = f"🎪 <b>{titolo}</b>\n"
@@ -3318,6 +3069,12 @@ async def handle_eventi_lista(context, chat_id: int, lingua: str, query, periodo
     keyboard = InlineKeyboardMarkup(buttons)
     await edit_message_safe(query, text=text, reply_markup=keyboard)
 
+    # Pre-carica la pagina successiva: ▶️ si apre senza attendere il database
+    if pagina < totale_pagine - 1 and risultato["cursore"] and not _eventi_pagina_get(chat_id, navigazione, pagina + 1):
+        context.application.create_task(
+            _prefetch_eventi_pagina(chat_id, navigazione, pagina + 1, risultato["cursore"])
+        )
+
 
 async def handle_eventi_categorie(context, chat_id: int, lingua: str, query):
     """
@@ -3333,12 +3090,16 @@ async def handle_eventi_categorie(context, chat_id: int, lingua: str, query):
     text = titoli.get(lingua, titoli["it"]) + "\n"
     text += f"<i>{sottotitoli.get(lingua, sottotitoli['it'])}</i>\n"
 
-    categorie = db.get_categorie_eventi()
+    import re
+
+    categorie = await db.get_categorie_eventi()
 
     buttons = []
     for cat_info in categorie:
         cat = cat_info["categoria"]
         count = cat_info["count"]
+        if not re.fullmatch(r"\w+", cat):
+            continue  # Non instradabile da evt_cat_(\w+)_p(\d+)
         emoji = CATEGORIA_EMOJI.get(cat, "🎪")
         label = CATEGORIA_LABELS.get(cat, {}).get(lingua, cat.title())
         buttons.append([InlineKeyboardButton(f"{emoji} {label} ({count})", callback_data=f"evt_cat_{cat}_p0")])
@@ -3364,11 +3125,12 @@ async def handle_evento_dettaglio(context, chat_id: int, lingua: str, query, eve
     if query:
         await query.answer()
 
-    evento = db.get_evento_by_id(evento_id)
+    evento = await db.get_evento_by_id(evento_id)
     if not evento:
         error = {"it": "⚠️ Evento non trovato.", "en": "⚠️ Event not found.", "de": "⚠️ Veranstaltung nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
         return
+    statistiche.registra_eventi_serviti()
 
     titolo = evento.get(f"titolo_{lingua}") or evento.get("titolo_it", "Evento")
     descrizione = evento.get(f"descrizione_{lingua}") or evento.get("descrizione_it", "")
@@ -3488,7 +3250,8 @@ async def handle_eventi_calendario(context, chat_id: int, lingua: str, query, an
     text += f"<b>{nome_mese} {anno}</b>\n\n"
 
     # Giorni con eventi
-    giorni_eventi = db.get_giorni_con_eventi(anno, mese)
+    giorni_eventi = await db.get_giorni_con_eventi(anno, mese)
+    giorni_set = set(giorni_eventi)
 
     # Header giorni settimana
     giorni_header = {"it": "L  M  M  G  V  S  D", "en": "M  T  W  T  F  S  S", "de": "M  D  M  D  F  S  S"}
@@ -3501,7 +3264,7 @@ async def handle_eventi_calendario(context, chat_id: int, lingua: str, query, an
         for giorno in settimana:
             if giorno == 0:
                 riga += "   "
-            elif giorno in giorni_eventi:
+            elif giorno in giorni_set:
                 riga += f"<b>{giorno:2d}</b> "
             elif date(anno, mese, giorno) == oggi:
                 riga += f"<u>{giorno:2d}</u> "
@@ -3559,7 +3322,8 @@ async def handle_eventi_giorno(context, chat_id: int, lingua: str, query, anno:
         await query.answer()
 
     data = date(anno, mese, giorno).isoformat()
-    eventi = db.get_eventi_giorno(data)
+    eventi = await db.get_eventi_giorno(data)
+    statistiche.registra_eventi_serviti(len(eventi))
 
     # Formatta data
     giorni_nomi = {"it": ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"],
@@ -3671,7 +3435,7 @@ async def handle_trasporti_arrivo(context, chat_id: int, lingua: str, query):
     buttons.append([InlineKeyboardButton("🎬 Lido di Venezia", callback_data="tras_ferry_dest_lido")])
 
     # Carica destinazioni per usarle sia per Venezia che per bus
-    destinazioni = db.get_destinazioni_attive()
+    destinazioni = await db.get_destinazioni_attive()
     dest_map = {d.get("codice"): d for d in destinazioni} if destinazioni else {}
 
     # Venezia journey planner (bus + traghetto)
@@ -3720,7 +3484,7 @@ async def handle_trasporti_frazione(context, chat_id: int, lingua: str, query):
     }
     text = titoli.get(lingua, titoli["it"])
 
-    zone = db.get_zone_attive()
+    zone = await db.get_zone_attive()
 
     # Griglia 2x2 - tutte le 8 frazioni
     grid_order = [
@@ -3758,7 +3522,7 @@ async def handle_trasporti_frazione_percorso(context, chat_id: int, lingua: str,
     if query:
         await query.answer()
 
-    zone = db.get_zone_attive()
+    zone = await db.get_zone_attive()
     da_zona = next((z for z in zone if z.get("id") == da_zona_id), None)
 
     if not da_zona:
@@ -3826,9 +3590,8 @@ async def handle_trasporti_frazione_linea(context, chat_id: int, lingua: str, qu
     if query:
         await query.answer()
 
-    zone = db.get_zone_attive()
-    da_zona = next((z for z in zone if z.get("id") == da_zona_id), None)
-    a_zona = next((z for z in zone if z.get("id") == a_zona_id), None)
+    da_zona = await db.get_zona_by_id(da_zona_id)
+    a_zona = await db.get_zona_by_id(a_zona_id)
 
     if not da_zona or not a_zona:
         error = {"it": "⚠️ Zona non trovata.", "en": "⚠️ Area not found.", "de": "⚠️ Ortsteil nicht gefunden."}
@@ -3896,7 +3659,7 @@ async def handle_trasporti_frazione_linea(context, chat_id: int, lingua: str, qu
     buttons = []
     for linea in linee:
         btn_text = f"🚌 {linea['codice']} - {linea['nome']} ({linea['desc']})"
-        buttons.append([InlineKeyboardButton(btn_text, callback_data=f"tras_fraz_quando_{da_zona_id}_{a_zona_id}_{linea['codice']}")])
+        buttons.append([InlineKeyboardButton(btn_text, callback_data=callback_codec.codifica("fraz_quando", da_zona_id=da_zona_id, a_zona_id=a_zona_id, linea_codice=linea["codice"]))])
 
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data=f"tras_fraz_{da_zona_id}_0")])
     keyboard = InlineKeyboardMarkup(buttons)
@@ -3912,9 +3675,8 @@ async def handle_trasporti_frazione_quando(context, chat_id: int, lingua: str, q
     if query:
         await query.answer()
 
-    zone = db.get_zone_attive()
-    da_zona = next((z for z in zone if z.get("id") == da_zona_id), None)
-    a_zona = next((z for z in zone if z.get("id") == a_zona_id), None)
+    da_zona = await db.get_zona_by_id(da_zona_id)
+    a_zona = await db.get_zona_by_id(a_zona_id)
 
     if not da_zona or not a_zona:
         error = {"it": "⚠️ Zona non trovata.", "en": "⚠️ Area not found.", "de": "⚠️ Ortsteil nicht gefunden."}
@@ -3954,7 +3716,7 @@ async def handle_trasporti_frazione_quando(context, chat_id: int, lingua: str, q
     now = datetime.now(rome_tz)
     ora_corrente = now.strftime("%H:%M")
 
-    orari_db = db.get_prossimi_orari_bus(
+    orari_db = await db.get_prossimi_orari_bus(
         linea_codice=linea_codice,
         fermata_nome=fermata_nome,
         direzione="andata",
@@ -3983,7 +3745,7 @@ async def handle_trasporti_frazione_quando(context, chat_id: int, lingua: str, q
                     btn_text = L["adesso"]
                 else:
                     btn_text = f"🕐 {ora}"
-                row.append(InlineKeyboardButton(btn_text, callback_data=f"tras_fraz_viaggio_{da_zona_id}_{a_zona_id}_{linea_codice}_{diff_minuti}"))
+                row.append(InlineKeyboardButton(btn_text, callback_data=callback_codec.codifica("fraz_viaggio", da_zona_id=da_zona_id, a_zona_id=a_zona_id, linea_codice=linea_codice, offset_minuti=diff_minuti)))
             except ValueError:
                 continue
         if row:
@@ -3993,9 +3755,9 @@ async def handle_trasporti_frazione_quando(context, chat_id: int, lingua: str, q
         ora_1h = (now + timedelta(hours=1)).strftime("%H:%M")
         ora_2h = (now + timedelta(hours=2)).strftime("%H:%M")
         buttons.append([
-            InlineKeyboardButton(L["adesso"], callback_data=f"tras_fraz_viaggio_{da_zona_id}_{a_zona_id}_{linea_codice}_0"),
-            InlineKeyboardButton(f"🕐 {ora_1h}", callback_data=f"tras_fraz_viaggio_{da_zona_id}_{a_zona_id}_{linea_codice}_60"),
-            InlineKeyboardButton(f"🕐 {ora_2h}", callback_data=f"tras_fraz_viaggio_{da_zona_id}_{a_zona_id}_{linea_codice}_120")
+            InlineKeyboardButton(L["adesso"], callback_data=callback_codec.codifica("fraz_viaggio", da_zona_id=da_zona_id, a_zona_id=a_zona_id, linea_codice=linea_codice, offset_minuti=0)),
+            InlineKeyboardButton(f"🕐 {ora_1h}", callback_data=callback_codec.codifica("fraz_viaggio", da_zona_id=da_zona_id, a_zona_id=a_zona_id, linea_codice=linea_codice, offset_minuti=60)),
+            InlineKeyboardButton(f"🕐 {ora_2h}", callback_data=callback_codec.codifica("fraz_viaggio", da_zona_id=da_zona_id, a_zona_id=a_zona_id, linea_codice=linea_codice, offset_minuti=120))
         ])
 
     # Bottone indietro
@@ -4013,9 +3775,8 @@ async def handle_trasporti_frazione_viaggio(context, chat_id: int, lingua: str,
     if query:
         await query.answer()
 
-    zone = db.get_zone_attive()
-    da_zona = next((z for z in zone if z.get("id") == da_zona_id), None)
-    a_zona = next((z for z in zone if z.get("id") == a_zona_id), None)
+    da_zona = await db.get_zona_by_id(da_zona_id)
+    a_zona = await db.get_zona_by_id(a_zona_id)
 
     if not da_zona or not a_zona:
         error = {"it": "⚠️ Zona non trovata.", "en": "⚠️ Area not found.", "de": "⚠️ Ortsteil nicht gefunden."}
@@ -4041,7 +3802,7 @@ async def handle_trasporti_frazione_viaggio(context, chat_id: int, lingua: str,
     text += "━━━━━━━━━━━━━━━━━━━━\n\n"
 
     # Prossime 3 partenze
-    departures = _get_frazione_departures(da_zona_codice, a_zona_codice, linea_codice, lingua, 3, offset_minuti)
+    departures = await _get_frazione_departures(da_zona_codice, a_zona_codice, linea_codice, lingua, 3, offset_minuti)
 
     for i, dep in enumerate(departures):
         num_emoji = ["1️⃣", "2️⃣", "3️⃣"][i]
@@ -4056,7 +3817,7 @@ async def handle_trasporti_frazione_viaggio(context, chat_id: int, lingua: str,
 
     # Bottone cambia orario
     cambia_orario_label = {"it": "🕐 Cambia orario", "en": "🕐 Change time", "de": "🕐 Zeit ändern"}
-    buttons.append([InlineKeyboardButton(cambia_orario_label.get(lingua, cambia_orario_label["it"]), callback_data=f"tras_fraz_quando_{da_zona_id}_{a_zona_id}_{linea_codice}")])
+    buttons.append([InlineKeyboardButton(cambia_orario_label.get(lingua, cambia_orario_label["it"]), callback_data=callback_codec.codifica("fraz_quando", da_zona_id=da_zona_id, a_zona_id=a_zona_id, linea_codice=linea_codice))])
 
     # Bottone indietro
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data="tras_frazione")])
@@ -4065,7 +3826,7 @@ async def handle_trasporti_frazione_viaggio(context, chat_id: int, lingua: str,
     await edit_message_safe(query, text=text, reply_markup=keyboard)
 
 
-def _get_frazione_departures(da_codice: str, a_codice: str, linea_codice: str, lingua: str, count: int = 3, offset_minuti: int = 0) -> list:
+async def _get_frazione_departures(da_codice: str, a_codice: str, linea_codice: str, lingua: str, count: int = 3, offset_minuti: int = 0) -> list:
     """
     Ritorna le prossime partenze tra due frazioni usando orari reali dal database.
     """
@@ -4098,15 +3859,6 @@ def _get_frazione_departures(da_codice: str, a_codice: str, linea_codice: str, l
     fermata_partenza = fermate_db.get(da_codice, "Punta Sabbioni")
     fermata_arrivo = fermate_db.get(a_codice, "Punta Sabbioni")
 
-    # Query orari REALI dal database
-    orari_db = db.get_prossimi_orari_bus(
-        linea_codice=linea_codice,
-        fermata_nome=fermata_partenza,
-        direzione="andata",
-        ora_partenza=ora_partenza,
-        limit=count
-    )
-
     # Tempi stimati tra fermate (in minuti)
     tempi_tratta = {
         ("cavallino", "ca_savio"): 15,
@@ -4118,6 +3870,27 @@ def _get_frazione_departures(da_codice: str, a_codice: str, linea_codice: str, l
     # Calcola tempo stimato (bidirezionale)
     durata = tempi_tratta.get((da_codice, a_codice), tempi_tratta.get((a_codice, da_codice), 15))
 
+    # Tabellone pre-calcolato del minuto corrente: solo lookup e somme di minuti
+    tabellone = tabelloni.get_partenze(fermata_partenza, linea_codice, "andata", lingua, count, offset_minuti)
+    if tabellone:
+        for voce in tabellone:
+            arrivo = (voce["minuti"] + durata) % (24 * 60)
+            departures.append({
+                "partenza": voce["etichetta"],
+                "arrivo": f"{arrivo // 60:02d}:{arrivo % 60:02d}",
+                "durata": durata
+            })
+        return departures
+
+    # Query orari REALI dal database
+    orari_db = await db.get_prossimi_orari_bus(
+        linea_codice=linea_codice,
+        fermata_nome=fermata_partenza,
+        direzione="andata",
+        ora_partenza=ora_partenza,
+        limit=count
+    )
+
     if orari_db:
         for orario in orari_db:
             ora_bus = orario.get("ora", "")
@@ -4215,7 +3988,7 @@ async def handle_trasporti_zona(context, chat_id: int, lingua: str, query, desti
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         error = {"it": "⚠️ Destinazione non trovata.", "en": "⚠️ Destination not found.", "de": "⚠️ Ziel nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -4232,7 +4005,7 @@ async def handle_trasporti_zona(context, chat_id: int, lingua: str, query, desti
 
     text = titoli.get(lingua, titoli["it"])
 
-    zone = db.get_zone_attive()
+    zone = await db.get_zone_attive()
 
     if not zone:
         # Nessuna zona, vai diretto al percorso
@@ -4276,11 +4049,10 @@ async def handle_trasporti_fermata(context, chat_id: int, lingua: str, query, de
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     zona = None
-    zone = db.get_zone_attive()
-    if zone and zona_id:
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+    if zona_id:
+        zona = await db.get_zona_by_id(zona_id)
 
     if not destinazione or not zona:
         error = {"it": "⚠️ Errore.", "en": "⚠️ Error.", "de": "⚠️ Fehler."}
@@ -4306,11 +4078,10 @@ async def handle_trasporti_selezione_linea(context, chat_id: int, lingua: str, q
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     zona = None
-    zone = db.get_zone_attive()
-    if zone and zona_id:
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+    if zona_id:
+        zona = await db.get_zona_by_id(zona_id)
 
     if not destinazione or not zona:
         error = {"it": "⚠️ Errore.", "en": "⚠️ Error.", "de": "⚠️ Fehler."}
@@ -4379,7 +4150,7 @@ async def handle_trasporti_selezione_linea(context, chat_id: int, lingua: str, q
     buttons = []
     for linea in linee:
         btn_text = f"🚌 {linea['codice']} - {linea['nome']} ({linea['desc']})"
-        buttons.append([InlineKeyboardButton(btn_text, callback_data=f"tras_percorso_{destinazione_id}_{zona_id}_{linea['codice']}")])
+        buttons.append([InlineKeyboardButton(btn_text, callback_data=callback_codec.codifica("percorso", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea["codice"]))])
 
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data=f"tras_dest_{destinazione_id}")])
     keyboard = InlineKeyboardMarkup(buttons)
@@ -4403,7 +4174,7 @@ async def handle_trasporti_isole(context, chat_id: int, lingua: str, query):
 
     text = titoli.get(lingua, titoli["it"])
 
-    destinazioni = db.get_destinazioni_attive()
+    destinazioni = await db.get_destinazioni_attive()
     dest_map = {d.get("codice"): d for d in destinazioni} if destinazioni else {}
 
     buttons = []
@@ -4443,7 +4214,7 @@ async def handle_trasporti_paese(context, chat_id: int, lingua: str, query):
     text = titoli.get(lingua, titoli["it"])
 
     # Mostra le destinazioni come punti di partenza per il ritorno
-    destinazioni = db.get_destinazioni_attive()
+    destinazioni = await db.get_destinazioni_attive()
     dest_map = {d.get("codice"): d for d in destinazioni} if destinazioni else {}
 
     buttons = []
@@ -4496,15 +4267,18 @@ async def handle_trasporti_paese(context, chat_id: int, lingua: str, query):
 async def handle_trasporti_quando(context, chat_id: int, lingua: str, query, destinazione_id: int, zona_id: int = None, linea_codice: str = "23A"):
     """
     QUANDO VUOI PARTIRE? - Selezione orario partenza con orari REALI dal database.
-    Callback: tras_percorso_{dest}_{zona}_{linea}
+    Callback: callback_codec "percorso" (vecchio formato tras_percorso_{dest}_{zona}_{linea})
     """
     if query:
         await query.answer()
 
-    # Cancella eventuale pending_action (utente ha annullato input orario)
-    db.update_user(chat_id, {"pending_action": None})
+    # Cancella una pending_action rimasta (es. input orario annullato): lo stato
+    # utente viene dalla cache, sul database si scrive solo se c'è da cancellare
+    user = await db.get_user(chat_id)
+    if user and user.get("pending_action"):
+        await db.update_user(chat_id, {"pending_action": None})
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         error = {"it": "⚠️ Destinazione non trovata.", "en": "⚠️ Destination not found.", "de": "⚠️ Ziel nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -4517,8 +4291,7 @@ async def handle_trasporti_quando(context, chat_id: int, lingua: str, query, des
     zona_nome = ""
     zona_codice = "punta_sabbioni"
     if zona_id:
-        zone = db.get_zone_attive()
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+        zona = await db.get_zona_by_id(zona_id)
         if zona:
             zona_nome = zona.get(f"nome_{lingua}") or zona.get("nome_it", "")
             zona_codice = zona.get("codice", "punta_sabbioni")
@@ -4552,7 +4325,7 @@ async def handle_trasporti_quando(context, chat_id: int, lingua: str, query, des
     now = datetime.now(rome_tz)
     ora_corrente = now.strftime("%H:%M")
 
-    orari_db = db.get_prossimi_orari_bus(
+    orari_db = await db.get_prossimi_orari_bus(
         linea_codice=linea_codice,
         fermata_nome=fermata_nome,
         direzione="andata",
@@ -4568,17 +4341,14 @@ async def handle_trasporti_quando(context, chat_id: int, lingua: str, query, des
     text += "━━━━━━━━━━━━━━━━━━━━\n\n"
     text += f"<b>{L['title']}</b>"
 
-    zona_str = zona_id if zona_id else 0
-
     # Costruisci bottoni con orari reali
     buttons = []
 
     if orari_db and len(orari_db) > 0:
-        # Usa orari reali dal database - passa ORA ESATTA nel callback (formato HH-MM)
+        # Usa orari reali dal database - passa ORA ESATTA nel callback
         row = []
         for i, orario in enumerate(orari_db[:3]):
             ora = orario.get("ora", "")
-            ora_callback = ora.replace(":", "-")  # 17:00 -> 17-00 per callback
             if i == 0:
                 # Prima partenza = "Adesso" se entro 10 minuti
                 try:
@@ -4590,9 +4360,9 @@ async def handle_trasporti_quando(context, chat_id: int, lingua: str, query, des
                         btn_text = f"🕐 {ora}"
                 except ValueError:
                     btn_text = f"🕐 {ora}"
-                row.append(InlineKeyboardButton(btn_text, callback_data=f"tras_viaggio_{destinazione_id}_{zona_str}_{linea_codice}_{ora_callback}"))
+                row.append(InlineKeyboardButton(btn_text, callback_data=callback_codec.codifica("viaggio", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice, ora_partenza=ora)))
             else:
-                row.append(InlineKeyboardButton(f"🕐 {ora}", callback_data=f"tras_viaggio_{destinazione_id}_{zona_str}_{linea_codice}_{ora_callback}"))
+                row.append(InlineKeyboardButton(f"🕐 {ora}", callback_data=callback_codec.codifica("viaggio", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice, ora_partenza=ora)))
         if row:
             buttons.append(row)
     else:
@@ -4602,7 +4372,7 @@ async def handle_trasporti_quando(context, chat_id: int, lingua: str, query, des
 
     # Label per inserimento manuale
     inserisci_label = {"it": "✏️ Inserisci orario", "en": "✏️ Enter time", "de": "✏️ Zeit eingeben"}
-    buttons.append([InlineKeyboardButton(inserisci_label.get(lingua, inserisci_label["it"]), callback_data=f"tras_orario_custom_{destinazione_id}_{zona_str}_{linea_codice}")])
+    buttons.append([InlineKeyboardButton(inserisci_label.get(lingua, inserisci_label["it"]), callback_data=callback_codec.codifica("orario_custom", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice))])
 
     # Bottone indietro
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data=f"tras_dest_{destinazione_id}")])
@@ -4619,7 +4389,7 @@ async def handle_trasporti_orario_custom(context, chat_id: int, lingua: str, que
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         return
 
@@ -4629,8 +4399,7 @@ async def handle_trasporti_orario_custom(context, chat_id: int, lingua: str, que
     # Recupera zona
     zona_nome = ""
     if zona_id:
-        zone = db.get_zone_attive()
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+        zona = await db.get_zona_by_id(zona_id)
         if zona:
             zona_nome = zona.get(f"nome_{lingua}") or zona.get("nome_it", "")
 
@@ -4672,10 +4441,10 @@ async def handle_trasporti_orario_custom(context, chat_id: int, lingua: str, que
     })
 
     logger.info(f"[ORARIO_CUSTOM] Saving pending_action: {pending_data}")
-    db.update_user(chat_id, {"pending_action": pending_data})
+    await db.update_user(chat_id, {"pending_action": pending_data})
 
     # Bottone annulla
-    buttons = [[InlineKeyboardButton(M["annulla"], callback_data=f"tras_percorso_{destinazione_id}_{zona_id or 0}_{linea_codice}")]]
+    buttons = [[InlineKeyboardButton(M["annulla"], callback_data=callback_codec.codifica("percorso", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice))]]
     keyboard = InlineKeyboardMarkup(buttons)
 
     await edit_message_safe(query, text=text, reply_markup=keyboard)
@@ -4741,11 +4510,13 @@ def parse_time_input(text: str, lingua: str = "it") -> tuple:
     return ora_esatta, None
 
 
-def _get_journey_data(dest_codice: str, zona_codice: str, lingua: str, linea_codice: str = "23A", ora_partenza: str = None) -> dict:
+def _get_journey_data(dest_codice: str, zona_codice: str, lingua: str, linea_codice: str = "23A", ora_partenza: str = None, percorso: dict = None) -> dict:
     """
     Dati journey planner per ogni combinazione destinazione+zona+linea.
     Usa la linea selezionata dall'utente e l'orario esatto.
     ora_partenza: orario esatto (es. "17:00") - se None usa ora corrente
+    percorso: percorso reale già calcolato (percorsi.prossimi_percorsi); se None
+    viene calcolato qui, con fallback sui tempi stimati se la rete non lo trova
     """
     from datetime import datetime, timedelta
     import pytz
@@ -4885,7 +4656,7 @@ def _get_journey_data(dest_codice: str, zona_codice: str, lingua: str, linea_cod
         domani_labels = {"it": "domani", "en": "tomorrow", "de": "morgen"}
         data_label = domani_labels.get(lingua, domani_labels["it"])
 
-    return {
+    j = {
         "fermata": fermata.get(lingua, fermata["it"]),
         "bus_linea": linea_codice,  # Usa la linea selezionata dall'utente
         "bus_partenza": next_dep_str,
@@ -4901,6 +4672,52 @@ def _get_journey_data(dest_codice: str, zona_codice: str, lingua: str, linea_cod
         "data_label": data_label
     }
 
+    # Orari reali dal journey planner (bus + traghetto con coincidenze vere)
+    if percorso is None:
+        origine = percorsi.ZONA_FERMATA.get(zona_codice)
+        arrivo = percorsi.DESTINAZIONE_FERMATA.get(dest_codice)
+        if origine and arrivo:
+            trovati = percorsi.prossimi_percorsi(origine, arrivo, next_dep_str, 1,
+                                                 giorno=next_dep.date(), linea_bus=linea_codice.split(" + ")[0])
+            percorso = trovati[0] if trovati else None
+
+    if percorso:
+        _applica_percorso(j, percorso, lingua)
+
+    return j
+
+
+def _applica_percorso(j: dict, percorso: dict, lingua: str) -> dict:
+    """Sostituisce i tempi stimati del journey con un percorso reale di percorsi.py"""
+    bus = [t for t in percorso["tratte"] if t["tipo"] == "bus"]
+    traghetti = [t for t in percorso["tratte"] if t["tipo"] == "traghetto"]
+
+    if bus:
+        j["bus_linea"] = bus[0]["linea"]
+        j["bus_partenza"] = bus[0]["partenza"]
+        j["bus_arrivo"] = bus[-1]["arrivo"]
+        j["bus_tempo"] = bus[-1]["arrivo_min"] - bus[0]["partenza_min"]
+    else:
+        # Partenza direttamente dall'imbarcadero
+        j["bus_partenza"] = percorso["partenza"]
+        j["bus_arrivo"] = percorso["partenza"]
+        j["bus_tempo"] = 0
+
+    if traghetti:
+        j["ferry_linea"] = " + ".join(dict.fromkeys(t["linea"] for t in traghetti))
+        j["ferry_partenza"] = traghetti[0]["partenza"]
+        j["ferry_tempo"] = traghetti[-1]["arrivo_min"] - traghetti[0]["partenza_min"]
+    else:
+        j["ferry_linea"] = None
+        j["ferry_partenza"] = None
+        j["ferry_tempo"] = 0
+
+    j["arrivo_finale"] = percorso["arrivo"]
+    if percorso.get("domani"):
+        domani_labels = {"it": "domani", "en": "tomorrow", "de": "morgen"}
+        j["data_label"] = domani_labels.get(lingua, domani_labels["it"])
+    return j
+
 
 async def handle_trasporti_percorso(context, chat_id: int, lingua: str, query, destinazione_id: int, zona_id: int = None, linea_codice: str = "23A", ora_partenza: str = None, bot_msg_id: int = None):
     """
@@ -4912,7 +4729,7 @@ async def handle_trasporti_percorso(context, chat_id: int, lingua: str, query, d
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         error = {"it": "⚠️ Destinazione non trovata.", "en": "⚠️ Destination not found.", "de": "⚠️ Ziel nicht gefunden."}
         error_text = error.get(lingua, error["it"])
@@ -4932,8 +4749,7 @@ async def handle_trasporti_percorso(context, chat_id: int, lingua: str, query, d
     zona_codice = "punta_sabbioni"
     zona_nome = "Punta Sabbioni"
     if zona_id:
-        zone = db.get_zone_attive()
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+        zona = await db.get_zona_by_id(zona_id)
         if zona:
             zona_nome = zona.get(f"nome_{lingua}") or zona.get("nome_it", "")
             zona_codice = zona.get("codice", "punta_sabbioni")
@@ -5017,12 +4833,11 @@ async def handle_trasporti_percorso(context, chat_id: int, lingua: str, query, d
 
     # Riga 1: Prossime partenze
     prossimo_label = {"it": "🔄 Prossime partenze", "en": "🔄 Next departures", "de": "🔄 Nächste Abfahrten"}
-    ora_callback = ora_partenza.replace(":", "-") if ora_partenza else "now"
-    buttons.append([InlineKeyboardButton(prossimo_label.get(lingua, prossimo_label["it"]), callback_data=f"tras_orari_{destinazione_id}_{zona_id or 0}_{linea_codice}_{ora_callback}")])
+    buttons.append([InlineKeyboardButton(prossimo_label.get(lingua, prossimo_label["it"]), callback_data=callback_codec.codifica("orari", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice, ora_partenza=ora_partenza))])
 
     # Riga 2: Cambia orario
     cambia_orario_label = {"it": "🕐 Cambia orario", "en": "🕐 Change time", "de": "🕐 Zeit ändern"}
-    buttons.append([InlineKeyboardButton(cambia_orario_label.get(lingua, cambia_orario_label["it"]), callback_data=f"tras_percorso_{destinazione_id}_{zona_id or 0}_{linea_codice}")])
+    buttons.append([InlineKeyboardButton(cambia_orario_label.get(lingua, cambia_orario_label["it"]), callback_data=callback_codec.codifica("percorso", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice))])
 
     # Riga 3: Indietro
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data="tras_arrivo")])
@@ -5050,7 +4865,7 @@ async def handle_trasporti_percorso(context, chat_id: int, lingua: str, query, d
         await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, parse_mode="HTML")
 
 
-def _get_next_departures(dest_codice: str, zona_codice: str, lingua: str, count: int = 3, ora_partenza: str = None, linea_codice: str = "23A") -> list:
+async def _get_next_departures(dest_codice: str, zona_codice: str, lingua: str, count: int = 3, ora_partenza: str = None, linea_codice: str = "23A") -> list:
     """
     Ritorna le prossime N partenze con orari REALI dal database.
     ora_partenza: orario HH:MM da cui partire (None = ora corrente)
@@ -5089,8 +4904,21 @@ def _get_next_departures(dest_codice: str, zona_codice: str, lingua: str, count:
     # Per linee composite (es. "23A + 35"), usa solo la prima
     linea_query = bus_linea.split(" + ")[0] if " + " in bus_linea else bus_linea
 
+    # Journey planner: partenze successive con coincidenze reali bus + traghetto
+    origine = percorsi.ZONA_FERMATA.get(zona_codice)
+    arrivo = percorsi.DESTINAZIONE_FERMATA.get(dest_codice)
+    if origine and arrivo:
+        # Da adesso: percorsi pre-calcolati nel tabellone del minuto corrente
+        trovati = tabelloni.get_percorsi(origine, arrivo, linea_query, count) if not ora_partenza else None
+        if trovati is None:
+            trovati = percorsi.prossimi_percorsi(origine, arrivo, ora_query, count, linea_bus=linea_query)
+        if trovati:
+            for p in trovati:
+                departures.append(_get_journey_data(dest_codice, zona_codice, lingua, linea_codice, p["partenza"], percorso=p))
+            return departures
+
     # Query orari REALI dal database
-    orari_db = db.get_prossimi_orari_bus(
+    orari_db = await db.get_prossimi_orari_bus(
         linea_codice=linea_query,
         fermata_nome=fermata_nome,
         direzione="andata",
@@ -5116,7 +4944,7 @@ def _get_next_departures(dest_codice: str, zona_codice: str, lingua: str, count:
             j["bus_partenza"] = ora_bus
 
             # Calcola arrivo usando tempo_da_capolinea dal database
-            arrivo_calcolato = db.calcola_arrivo_fermata(
+            arrivo_calcolato = await db.calcola_arrivo_fermata(
                 ora_partenza=ora_bus,
                 linea_codice=linea_query,
                 fermata_partenza=fermata_nome,
@@ -5190,7 +5018,7 @@ async def handle_trasporti_orari(context, chat_id: int, lingua: str, query, dest
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         error = {"it": "⚠️ Destinazione non trovata.", "en": "⚠️ Destination not found.", "de": "⚠️ Ziel nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -5204,8 +5032,7 @@ async def handle_trasporti_orari(context, chat_id: int, lingua: str, query, dest
     zona_codice = "punta_sabbioni"
     zona_nome = "Punta Sabbioni"
     if zona_id:
-        zone = db.get_zone_attive()
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+        zona = await db.get_zona_by_id(zona_id)
         if zona:
             zona_nome = zona.get(f"nome_{lingua}") or zona.get("nome_it", "")
             zona_codice = zona.get("codice", "punta_sabbioni")
@@ -5225,7 +5052,7 @@ async def handle_trasporti_orari(context, chat_id: int, lingua: str, query, dest
     text += "━━━━━━━━━━━━━━━━━━━━\n\n"
 
     # Prossime 3 partenze (usa ora_partenza e linea per partire dall'orario selezionato)
-    departures = _get_next_departures(dest_codice, zona_codice, lingua, 3, ora_partenza, linea_codice)
+    departures = await _get_next_departures(dest_codice, zona_codice, lingua, 3, ora_partenza, linea_codice)
 
     for i, dep in enumerate(departures):
         num_emoji = ["1️⃣", "2️⃣", "3️⃣"][i]
@@ -5246,14 +5073,13 @@ async def handle_trasporti_orari(context, chat_id: int, lingua: str, query, dest
 
     # Bottoni per selezionare partenza specifica (1, 2, 3) - passa anche ora e linea
     dep_buttons = []
-    ora_callback = ora_partenza.replace(":", "-") if ora_partenza else "now"
     for i in range(min(3, len(departures))):
         num_label = ["1️⃣", "2️⃣", "3️⃣"][i]
-        dep_buttons.append(InlineKeyboardButton(num_label, callback_data=f"tras_dep_{destinazione_id}_{zona_id or 0}_{linea_codice}_{i}_{ora_callback}"))
+        dep_buttons.append(InlineKeyboardButton(num_label, callback_data=callback_codec.codifica("dep", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice, dep_index=i, ora_partenza=ora_partenza)))
     buttons.append(dep_buttons)
 
     # Bottone indietro
-    buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data=f"tras_percorso_{destinazione_id}_{zona_id or 0}_{linea_codice}")])
+    buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data=callback_codec.codifica("percorso", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice))])
 
     keyboard = InlineKeyboardMarkup(buttons)
     await edit_message_safe(query, text=text, reply_markup=keyboard)
@@ -5267,7 +5093,7 @@ async def handle_trasporti_dep_select(context, chat_id: int, lingua: str, query,
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         error = {"it": "⚠️ Destinazione non trovata.", "en": "⚠️ Destination not found.", "de": "⚠️ Ziel nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -5281,8 +5107,7 @@ async def handle_trasporti_dep_select(context, chat_id: int, lingua: str, query,
     zona_codice = "punta_sabbioni"
     zona_nome = "Punta Sabbioni"
     if zona_id:
-        zone = db.get_zone_attive()
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+        zona = await db.get_zona_by_id(zona_id)
         if zona:
             zona_nome = zona.get(f"nome_{lingua}") or zona.get("nome_it", "")
             zona_codice = zona.get("codice", "punta_sabbioni")
@@ -5296,7 +5121,7 @@ async def handle_trasporti_dep_select(context, chat_id: int, lingua: str, query,
     L = labels.get(lingua, labels["it"])
 
     # Ottieni le 3 partenze e seleziona quella richiesta (usa ora_partenza e linea per coerenza)
-    departures = _get_next_departures(dest_codice, zona_codice, lingua, 3, ora_partenza, linea_codice)
+    departures = await _get_next_departures(dest_codice, zona_codice, lingua, 3, ora_partenza, linea_codice)
     if dep_index >= len(departures):
         dep_index = 0
 
@@ -5331,8 +5156,7 @@ async def handle_trasporti_dep_select(context, chat_id: int, lingua: str, query,
 
     # Riga 1: Torna alle partenze (passa ora e linea per coerenza)
     back_orari_label = {"it": "🔄 Altre partenze", "en": "🔄 Other departures", "de": "🔄 Andere Abfahrten"}
-    ora_callback = ora_partenza.replace(":", "-") if ora_partenza else "now"
-    buttons.append([InlineKeyboardButton(back_orari_label.get(lingua, back_orari_label["it"]), callback_data=f"tras_orari_{destinazione_id}_{zona_id or 0}_{linea_codice}_{ora_callback}")])
+    buttons.append([InlineKeyboardButton(back_orari_label.get(lingua, back_orari_label["it"]), callback_data=callback_codec.codifica("orari", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice=linea_codice, ora_partenza=ora_partenza))])
 
     # Riga 2: Indietro al menu trasporti
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data="tras_arrivo")])
@@ -5420,7 +5244,7 @@ async def handle_trasporti_ritorno(context, chat_id: int, lingua: str, query, de
     if query:
         await query.answer()
 
-    destinazione = db.get_destinazione_by_id(destinazione_id)
+    destinazione = await db.get_destinazione_by_id(destinazione_id)
     if not destinazione:
         error = {"it": "⚠️ Destinazione non trovata.", "en": "⚠️ Destination not found.", "de": "⚠️ Ziel nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -5434,8 +5258,7 @@ async def handle_trasporti_ritorno(context, chat_id: int, lingua: str, query, de
     zona_codice = "punta_sabbioni"
     zona_nome = "Punta Sabbioni"
     if zona_id:
-        zone = db.get_zone_attive()
-        zona = next((z for z in zone if z.get("id") == zona_id), None)
+        zona = await db.get_zona_by_id(zona_id)
         if zona:
             zona_nome = zona.get(f"nome_{lingua}") or zona.get("nome_it", "")
             zona_codice = zona.get("codice", "punta_sabbioni")
@@ -5510,7 +5333,7 @@ async def handle_trasporti_ritorno(context, chat_id: int, lingua: str, query, de
 
     # Bottone indietro al percorso andata
     back_andata = {"it": "◀️ Andata", "en": "◀️ Outbound", "de": "◀️ Hinfahrt"}
-    buttons.append([InlineKeyboardButton(back_andata.get(lingua, back_andata["it"]), callback_data=f"tras_percorso_{destinazione_id}_{zona_id or 0}")])
+    buttons.append([InlineKeyboardButton(back_andata.get(lingua, back_andata["it"]), callback_data=callback_codec.codifica("percorso", destinazione_id=destinazione_id, zona_id=zona_id, linea_codice="23A"))])
 
     # Bottone indietro al menu
     buttons.append([InlineKeyboardButton(TRASPORTI_LABELS["back_trasporti"].get(lingua, TRASPORTI_LABELS["back_trasporti"]["it"]), callback_data=f"tras_dest_{destinazione_id}")])
@@ -5535,7 +5358,7 @@ async def handle_trasporti_bus(context, chat_id: int, lingua: str, query):
 
     text = titoli.get(lingua, titoli["it"]) + "\n\n"
 
-    linee = db.get_linee_by_tipo("bus")
+    linee = await db.get_linee_by_tipo("bus")
 
     if not linee:
         text += TRASPORTI_LABELS["no_lines"].get(lingua, TRASPORTI_LABELS["no_lines"]["it"])
@@ -5556,7 +5379,7 @@ async def handle_trasporti_bus(context, chat_id: int, lingua: str, query):
             buttons.append([InlineKeyboardButton(btn_text, callback_data=f"tras_bus_linea_{linea_id}")])
 
         # Link al sito ATVO
-        operatori = db.get_operatori_attivi("bus")
+        operatori = await db.get_operatori_attivi("bus")
         if operatori and operatori[0].get("sito_web"):
             buttons.append([InlineKeyboardButton("🔗 Sito ATVO", url=operatori[0]["sito_web"])])
 
@@ -5582,7 +5405,7 @@ async def handle_trasporti_ferry(context, chat_id: int, lingua: str, query):
 
     text = titoli.get(lingua, titoli["it"]) + "\n\n"
 
-    linee = db.get_linee_by_tipo("traghetto")
+    linee = await db.get_linee_by_tipo("traghetto")
 
     if not linee:
         text += TRASPORTI_LABELS["no_lines"].get(lingua, TRASPORTI_LABELS["no_lines"]["it"])
@@ -5603,7 +5426,7 @@ async def handle_trasporti_ferry(context, chat_id: int, lingua: str, query):
             buttons.append([InlineKeyboardButton(btn_text, callback_data=f"tras_ferry_linea_{linea_id}")])
 
         # Link al sito ACTV
-        operatori = db.get_operatori_attivi("traghetto")
+        operatori = await db.get_operatori_attivi("traghetto")
         if operatori and operatori[0].get("sito_web"):
             buttons.append([InlineKeyboardButton("🔗 Sito ACTV", url=operatori[0]["sito_web"])])
 
@@ -5663,7 +5486,7 @@ async def handle_trasporti_ferry_destinazione(context, chat_id: int, lingua: str
     now = datetime.now(rome_tz)
     ora_corrente = now.strftime("%H:%M")
 
-    orari = db.get_orari_traghetto(
+    orari = await db.get_orari_traghetto(
         linea_codice=linea,
         fermata_nome=partenza,
         direzione="andata",
@@ -5768,7 +5591,7 @@ async def handle_trasporti_ferry_orari(context, chat_id: int, lingua: str, query
     text += f"🎯 {L['a']}: <b>{a_label}</b>\n\n"
 
     # Query orari (tutti, non solo da ora corrente)
-    orari = db.get_orari_traghetto(
+    orari = await db.get_orari_traghetto(
         linea_codice=linea,
         fermata_nome=fermata_query,
         direzione=direzione,
@@ -5959,7 +5782,7 @@ async def handle_trasporti_linea(context, chat_id: int, lingua: str, query, line
     if query:
         await query.answer()
 
-    linea = db.get_linea_by_id(linea_id)
+    linea = await db.get_linea_by_id(linea_id)
     if not linea:
         error = {"it": "⚠️ Linea non trovata.", "en": "⚠️ Line not found.", "de": "⚠️ Linie nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -6028,7 +5851,7 @@ async def handle_trasporti_prezzi(context, chat_id: int, lingua: str, query):
     text = titoli.get(lingua, titoli["it"]) + "\n"
     text += f"<i>{sottotitoli.get(lingua, sottotitoli['it'])}</i>\n"
 
-    operatori = db.get_operatori_attivi()
+    operatori = await db.get_operatori_attivi()
 
     if not operatori:
         no_op = {"it": "Informazioni non disponibili.", "en": "Information not available.", "de": "Informationen nicht verfügbar."}
@@ -6060,7 +5883,7 @@ async def handle_trasporti_prezzi_operatore(context, chat_id: int, lingua: str,
     if query:
         await query.answer()
 
-    operatore = db.get_operatore_by_id(operatore_id)
+    operatore = await db.get_operatore_by_id(operatore_id)
     if not operatore:
         error = {"it": "⚠️ Operatore non trovato.", "en": "⚠️ Operator not found.", "de": "⚠️ Betreiber nicht gefunden."}
         await edit_message_safe(query, text=error.get(lingua, error["it"]))
@@ -6074,7 +5897,7 @@ async def handle_trasporti_prezzi_operatore(context, chat_id: int, lingua: str,
 
     text = f"{emoji} <b>{nome}</b>\n\n"
 
-    tariffe = db.get_tariffe_by_operatore(operatore_id)
+    tariffe = await db.get_tariffe_by_operatore(operatore_id)
 
     if tariffe:
         for tariffa in tariffe:
@@ -6106,15 +5929,11 @@ async def handle_trasporti_prezzi_operatore(context, chat_id: int, lingua: str,
     await edit_message_safe(query, text=text, reply_markup=keyboard)
 
 
-async def handle_ristoranti(context, chat_id: int, lingua: str, query=None):
-    """
-    Mostra ristoranti e locali consigliati nella zona.
-    """
-    # Rispondi al callback SUBITO
-    if query:
-        await query.answer()
+@schermate.schermata("ristoranti")
+def _schermata_ristoranti(lingua: str):
+    import database
 
-    text = db.get_text("info_ristoranti", lingua)
+    text = database.get_text("info_ristoranti", lingua)
 
     if text == "info_ristoranti":
         fallback = {
@@ -6232,6 +6051,18 @@ Wo man in Cavallino-Treporti und Umgebung essen kann.
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("◀️ Menu", callback_data="menu_back")]
     ])
+    return text, keyboard
+
+
+async def handle_ristoranti(context, chat_id: int, lingua: str, query=None):
+    """
+    Mostra ristoranti e locali consigliati nella zona.
+    """
+    # Rispondi al callback SUBITO
+    if query:
+        await query.answer()
+
+    text, keyboard = await _get_schermata("ristoranti", lingua)
 
     # Edita messaggio esistente invece di mandarne uno nuovo
     if query:
@@ -6701,7 +6532,7 @@ async def handle_morning(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Handler per comando /morning - Invia Morning Briefing con card PNG + bottoni.
     """
     chat_id = update.effective_chat.id
-    user = db.get_user(chat_id)
+    user = await db.get_user(chat_id)
 
     if not user or user.get("stato_onboarding") != "completo":
         await context.bot.send_message(
@@ -6789,10 +6620,11 @@ async def send_morning_briefing_to_all(bot):
     """
     import asyncio
     from meteo_api import get_meteo_forecast, get_weather_emoji, get_weather_description
+    from broadcast import broadcast
 
     logger.info("Avvio invio morning briefing a tutti gli utenti...")
 
-    utenti = db.get_utenti_attivi()
+    utenti = await db.get_utenti_attivi()
     if not utenti:
         logger.info("Nessun utente attivo per morning briefing")
         return
@@ -6851,75 +6683,63 @@ async def send_morning_briefing_to_all(bot):
         "de": "Guten Morgen"
     }
 
-    inviati = 0
-    errori = 0
+    # Messaggio e tastiera costruiti una volta per lingua (non per utente)
+    giorno_idx = now.weekday()
+    prebuilt = {}
+    for lingua in {utente.get("lingua", "it") for utente in utenti}:
+        giorno_nome = giorni.get(lingua, giorni["it"])[giorno_idx]
+        mese_nome = mesi.get(lingua, mesi["it"])[now.month - 1]
 
-    for utente in utenti:
-        chat_id = utente.get("chat_id")
-        lingua = utente.get("lingua", "it")
-        nome = utente.get("nome", "")
+        corpo = f"📅 {giorno_nome} {now.day} {mese_nome}\n"
 
-        try:
-            # Data per lingua
-            giorno_nome = giorni.get(lingua, giorni["it"])[now.weekday()]
-            mese_nome = mesi.get(lingua, mesi["it"])[now.month - 1]
-
-            # Costruisci messaggio
-            saluto = saluti.get(lingua, saluti["it"])
-            text = f"☀️ <b>{saluto}"
-            if nome:
-                text += f", {nome}"
-            text += f"!</b>\n\n"
-            text += f"📅 {giorno_nome} {now.day} {mese_nome}\n"
-
-            # Meteo
-            if meteo_data and meteo_data.get("current"):
-                current = meteo_data["current"]
-                temp = current.get("temperature", "")
-                weather_code = current.get("weather_code", 0)
-                emoji = get_weather_emoji(weather_code)
-                desc = get_weather_description(weather_code, lingua)
-                if temp:
-                    text += f"{emoji} {temp}°C - {desc}\n"
-
-            # Evento del giorno
-            evento_str = get_evento_oggi(lingua)
-            if evento_str:
-                text += f"{evento_str}\n"
-
-            # Keyboard
-            labels = btn_labels.get(lingua, btn_labels["it"])
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton(labels["meteo"], callback_data="menu_meteo"),
-                    InlineKeyboardButton(labels["eventi"], callback_data="menu_eventi")
-                ],
-                [
-                    InlineKeyboardButton(labels["trasporti"], callback_data="menu_trasporti"),
-                    InlineKeyboardButton(labels["ristoranti"], callback_data="menu_ristoranti")
-                ],
-                [
-                    InlineKeyboardButton(labels["fortini"], callback_data="menu_fortini"),
-                    InlineKeyboardButton(labels["sos"], callback_data="menu_sos")
-                ]
-            ])
-
-            await bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-            inviati += 1
+        # Meteo
+        if meteo_data and meteo_data.get("current"):
+            current = meteo_data["current"]
+            temp = current.get("temperature", "")
+            weather_code = current.get("weather_code", 0)
+            emoji = get_weather_emoji(weather_code)
+            desc = get_weather_description(weather_code, lingua)
+            if temp:
+                corpo += f"{emoji} {temp}°C - {desc}\n"
 
-            # Rate limiting: pausa tra invii per evitare flood
-            await asyncio.sleep(0.05)
+        # Evento del giorno
+        evento_str = await get_evento_oggi(lingua)
+        if evento_str:
+            corpo += f"{evento_str}\n"
 
-        except Exception as e:
-            logger.error(f"Errore invio morning briefing a {chat_id}: {e}")
-            errori += 1
+        labels = btn_labels.get(lingua, btn_labels["it"])
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton(labels["meteo"], callback_data="menu_meteo"),
+                InlineKeyboardButton(labels["eventi"], callback_data="menu_eventi")
+            ],
+            [
+                InlineKeyboardButton(labels["trasporti"], callback_data="menu_trasporti"),
+                InlineKeyboardButton(labels["ristoranti"], callback_data="menu_ristoranti")
+            ],
+            [
+                InlineKeyboardButton(labels["fortini"], callback_data="menu_fortini"),
+                InlineKeyboardButton(labels["sos"], callback_data="menu_sos")
+            ]
+        ])
+        prebuilt[lingua] = (saluti.get(lingua, saluti["it"]), corpo, keyboard)
 
-    logger.info(f"Morning briefing completato: {inviati} inviati, {errori} errori")
+    messaggi = []
+    for utente in utenti:
+        saluto, corpo, keyboard = prebuilt[utente.get("lingua", "it")]
+        nome = utente.get("nome", "")
+        text = f"☀️ <b>{saluto}, {nome}!</b>\n\n{corpo}" if nome else f"☀️ <b>{saluto}!</b>\n\n{corpo}"
+        messaggi.append((utente.get("chat_id"), text, keyboard))
+
+    # Invio concorrente con rate limit Telegram
+    report = await broadcast(bot, messaggi)
+
+    logger.info(
+        f"Morning briefing completato: {report['inviati']}/{report['totale']} inviati, "
+        f"{report['errori']} errori, {report['bloccati']} bloccati, {report['retry']} retry, "
+        f"{report['durata_s']}s ({report['msg_al_secondo']} msg/s, p95 {report['latenza_p95_ms']}ms)"
+    )
+    return report
 
 
 # ============================================================
@@ -6942,8 +6762,27 @@ async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    # Raccogli statistiche
-    stats = db.get_stats()
+    # Raccogli statistiche (contatori in memoria, riconciliati periodicamente con il database)
+    stats = statistiche.snapshot()
+    if not statistiche.is_ready():
+        stats.update(await db.get_stats())
+    user_cache = db.get_user_cache_stats()
+    writer = db.get_writer_stats()
+    dedup = get_dedup_stats()
+    from meteo_api import get_tide_stats
+    from http_clients import get_latency_stats
+    import orari_index
+    maree = get_tide_stats()
+    orari = orari_index.get_stats()
+    tab = tabelloni.get_stats()
+    import riferimenti
+    rif = riferimenti.get_stats()
+    import mirror
+    import eventi_index
+    mir = mirror.get_stats()
+    evt = eventi_index.get_stats()
+    sch = schermate.get_stats()
+    latenze = get_latency_stats()
 
     # Calcola uptime
     uptime_str = "N/A"
@@ -6967,20 +6806,38 @@ async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 👥 <b>Utenti</b>
 ├ Totali: <code>{stats['utenti_totali']}</code>
 ├ Registrati: <code>{stats['utenti_completi']}</code>
-└ Attivi (7gg): <code>{stats['utenti_attivi_7g']}</code>
+├ Attivi (7gg): <code>{stats['utenti_attivi_7g']}</code>
+├ Chat attive 1h/24h/7gg: <code>{stats['attivi_1h']} / {stats['attivi_24h']} / {stats['attivi_7d']}</code> <i>(dall'avvio)</i>
+└ Dall'avvio: <code>{stats['nuovi_utenti']} nuovi, {stats['onboarding_completati']} registrati, {stats['update']} update</code>
 
 🎪 <b>Eventi</b>
 ├ Totali: <code>{stats['eventi_totali']}</code>
-└ Attivi oggi: <code>{stats['eventi_attivi']}</code>
+├ Attivi oggi: <code>{stats['eventi_attivi']}</code>
+└ Mostrati dall'avvio: <code>{stats['eventi_serviti']}</code>
 
 ⚙️ <b>Sistema</b>
 ├ Uptime: <code>{uptime_str}</code>
+├ Cache utenti: <code>{user_cache['hit_rate']:.1f}% hit ({user_cache['hits']}/{user_cache['hits'] + user_cache['misses']}, {user_cache['size']} chat)</code>
+├ Scritture last_update_id: <code>{writer['queued']} richieste → {writer['batches']} batch ({writer['written']} righe, {writer['scartati']} scartate)</code>
+├ Update duplicati scartati: <code>{dedup.get('duplicati', 0)}</code>
+├ Indice orari: <code>{orari['righe']} corse, {orari['chiavi']} fermate/direzioni, {orari['fermate']} fermate</code>
+├ Dati riferimento: <code>{sum(rif['righe'].values())} righe, {rif['ricariche']} ricariche su {rif['controlli']} controlli</code>
+├ Indice eventi: <code>{evt['attivi']} attivi su {evt['totali']}, {evt['categorie']} categorie</code>
+├ Mirror SQLite: <code>{mir['righe']} righe in {mir['tabelle']} tabelle, {mir['righe_scaricate']} scaricate in {mir['sync']} sync ({mir['ricariche_complete']} complete, {mir['errori']} errori)</code>
+├ Schermate statiche: <code>{sch['voci']} voci, hit rate {sch['hit_rate']:.1f}%, costruzione {sch['ultimo_ms']:.0f}ms</code>
+├ Tabelloni partenze: <code>{tab['voci']} voci, generazione {tab['ultimo_ms']:.1f}ms (media {tab['medio_ms']:.1f}ms, max {tab['max_ms']:.1f}ms)</code>
+├ Maree: <code>{maree['saved_calls']} chiamate Stormglass evitate, {maree['upstream_calls']} effettuate</code>
 └ Avviato: <code>{_bot_start_time.strftime('%d/%m/%Y %H:%M') if _bot_start_time else 'N/A'}</code>
 
 🚨 <b>Ultimo errore</b>
 {error_str}
 """
 
+    if latenze:
+        text += "\n🌐 <b>API esterne</b>\n"
+        for host, lat in sorted(latenze.items()):
+            text += f"├ {host}: <code>{lat['count']} req, media {lat['avg_ms']:.0f}ms, p50 {lat['p50']}, p95 {lat['p95']}, errori {lat['errors']}</code>\n"
+
     await context.bot.send_message(
         chat_id=chat_id,
         text=text,
@@ -7012,7 +6869,7 @@ async def handle_test_briefing(update: Update, context: ContextTypes.DEFAULT_TYP
     )
 
     # Recupera dati utente dal database
-    user = db.get_user(chat_id)
+    user = await db.get_user(chat_id)
     nome = user.get("nome", "Admin") if user else "Admin"
     lingua = user.get("lingua", "it") if user else "it"
 
@@ -7041,7 +6898,7 @@ async def handle_test_briefing(update: Update, context: ContextTypes.DEFAULT_TYP
         meteo_str = f"⚠️ Errore meteo: {e}"
 
     # Evento del giorno
-    evento_str = get_evento_oggi(lingua)
+    evento_str = await get_evento_oggi(lingua)
 
     # Costruisci messaggio
     saluti = {"it": "Buongiorno", "en": "Good morning", "de": "Guten Morgen"}
@@ -7075,3 +6932,57 @@ async def handle_test_briefing(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup=keyboard,
         parse_mode="HTML"
     )
+
+
+async def handle_reload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Comando /reload - Solo per admin.
+    Ricarica subito i dati di riferimento trasporti (zone, destinazioni, operatori,
+    linee, tariffe, percorsi) e gli indici orari/fermate ed eventi, senza attendere il job.
+    Prima allinea il mirror SQLite, da cui snapshot e indici vengono caricati.
+    """
+    import riferimenti
+    import orari_index
+    import mirror
+    import eventi_index
+    chat_id = update.effective_chat.id
+
+    # Verifica admin
+    if chat_id != ADMIN_CHAT_ID:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="⛔ Comando riservato all'amministratore.",
+            parse_mode="HTML"
+        )
+        return
+
+    cambiate = await db.run(mirror.sync_all, force=True)
+    if "eventi" in cambiate:
+        await db.invalidate_cache()
+    if "testi" in await db.refresh_testi_config(force=True):
+        await db.run(schermate.costruisci)
+    ok_riferimenti = await db.run(riferimenti.refresh, force=True)
+    ok_orari = await db.run(orari_index.carica) and await db.run(orari_index.carica_fermate)
+    if ok_orari:
+        await db.run(percorsi.costruisci)
+    ok_eventi = await db.run(eventi_index.carica)
+
+    stats = riferimenti.get_stats()
+    righe = "\n".join(f"├ {tabella}: <code>{n}</code>" for tabella, n in stats["righe"].items())
+    orari = orari_index.get_stats()
+
+    text = f"""🔄 <b>Ricarica dati</b>
+
+📚 <b>Riferimenti</b> {'✅' if ok_riferimenti else '⚠️ errore, snapshot precedente mantenuto'}
+{righe}
+└ Tempo: <code>{stats['ultimo_ms']:.0f}ms</code>
+
+🚌 <b>Orari</b> {'✅' if ok_orari else '⚠️ errore, indice precedente mantenuto'}
+└ <code>{orari['righe']} corse, {orari['fermate']} fermate</code>
+
+🎪 <b>Eventi</b> {'✅' if ok_eventi else '⚠️ errore, indice precedente mantenuto'}
+└ <code>{eventi_index.get_stats()['attivi']} eventi attivi</code>
+
+💾 <b>Mirror</b>: <code>{len(cambiate)} tabelle aggiornate</code>
+"""
+    await context.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
@@ -0,0 +1,134 @@
+"""
+Client HTTP condivisi per le API esterne (Open-Meteo, Stormglass, farmaciediturno.org)
+
+Un solo httpx.AsyncClient con pool di connessioni, keep-alive e HTTP/2:
+niente handshake TLS e lookup DNS ad ogni richiesta.
+Creato in on_startup e chiuso in on_shutdown (main.py).
+Registra per ogni host un istogramma delle latenze (tempo fino agli header) e
+gli errori, contando anche timeout ed errori di connessione (wrapper del transport).
+"""
+import bisect
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Timeout e limiti pool
+HTTP_TIMEOUT = 10.0
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+
+# Limiti superiori dei bucket istogramma latenze (ms); l'ultimo bucket è "oltre"
+LATENCY_BUCKETS_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+_client: Optional[httpx.AsyncClient] = None
+
+# host -> {"buckets": [...], "count": n, "sum_ms": x, "errors": n}
+_latency: Dict[str, dict] = {}
+
+
+def _record(host: str, elapsed_ms: float, error: bool = False):
+    """Aggiunge una misura all'istogramma dell'host"""
+    stats = _latency.get(host)
+    if stats is None:
+        stats = {"buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1), "count": 0, "sum_ms": 0.0, "errors": 0}
+        _latency[host] = stats
+    stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+    stats["count"] += 1
+    stats["sum_ms"] += elapsed_ms
+    if error:
+        stats["errors"] += 1
+
+
+class _TransportMisurato(httpx.AsyncBaseTransport):
+    """
+    Transport che misura ogni richiesta: status >= 400 ed eccezioni (timeout,
+    connessione rifiutata, ...) contano come errori con il tempo trascorso.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            _record(request.url.host, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        _record(request.url.host, (time.perf_counter() - start) * 1000, error=response.status_code >= 400)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _create_client() -> httpx.AsyncClient:
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+        logger.warning("Pacchetto h2 non installato: client HTTP solo HTTP/1.1")
+
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        transport=_TransportMisurato(httpx.AsyncHTTPTransport(limits=HTTP_LIMITS, http2=http2))
+    )
+
+
+async def start():
+    """Crea il client condiviso (on_startup)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+        logger.info("Client HTTP condiviso avviato")
+
+
+async def close():
+    """Chiude il client condiviso e le connessioni aperte (on_shutdown)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Client HTTP condiviso chiuso")
+    _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Client condiviso. Se non ancora avviato (es. script di test) viene creato al volo.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def _percentile(buckets: list, count: int, p: float) -> str:
+    """Stima percentile dall'istogramma (limite superiore del bucket)"""
+    soglia = count * p
+    cumulato = 0
+    for i, n in enumerate(buckets):
+        cumulato += n
+        if cumulato >= soglia:
+            return f"≤{LATENCY_BUCKETS_MS[i]}ms" if i < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]}ms"
+    return "N/D"
+
+
+def get_latency_stats() -> Dict[str, dict]:
+    """Statistiche latenze per host (per /stats)"""
+    result = {}
+    for host, stats in _latency.items():
+        count = stats["count"]
+        result[host] = {
+            "count": count,
+            "errors": stats["errors"],
+            "avg_ms": stats["sum_ms"] / count if count else 0.0,
+            "p50": _percentile(stats["buckets"], count, 0.50),
+            "p95": _percentile(stats["buckets"], count, 0.95),
+            "buckets": list(stats["buckets"])
+        }
+    return result
@@ -14,8 +14,20 @@ from datetime import time as dt_time
 import sentry_sdk
 from sentry_sdk.integrations.logging import LoggingIntegration
 
-from config import TELEGRAM_BOT_TOKEN, WEBHOOK_URL, PORT, LOG_LEVEL, SENTRY_DSN, ADMIN_CHAT_ID
-from handlers import handle_update, handle_morning, send_morning_briefing_to_all, handle_stats, handle_test_briefing, set_bot_start_time, set_last_error
+from config import TELEGRAM_BOT_TOKEN, WEBHOOK_URL, PORT, LOG_LEVEL, SENTRY_DSN, ADMIN_CHAT_ID, METEO_CACHE_TTL, METEO_REFRESH_AHEAD, ORARI_REFRESH_INTERVAL, RIFERIMENTI_REFRESH_INTERVAL, MIRROR_SYNC_INTERVAL, EVENTI_REFRESH_INTERVAL, STATS_RICONCILIA_INTERVAL, CACHE_TTL
+from meteo_api import prefetch_meteo, prefetch_tides
+from farmacie_api import refresh_farmacie, get_farmacie_turno, CAMBIO_TURNO_ORA, CAMBIO_TURNO_MINUTI, CACHE_DURATION as FARMACIE_CACHE_DURATION
+import database_async
+import http_clients
+import orari_index
+import percorsi
+import tabelloni
+import riferimenti
+import mirror
+import eventi_index
+import statistiche
+import schermate
+from handlers import handle_update, handle_morning, send_morning_briefing_to_all, handle_stats, handle_test_briefing, handle_reload, set_bot_start_time, set_last_error
 
 # Configurazione logging JSON
 logging.basicConfig(
@@ -114,6 +126,7 @@ async def error_handler(update: object, context) -> None:
 async def on_startup(application: Application) -> None:
     """Callback eseguito all'avvio del bot."""
     set_bot_start_time()
+    await http_clients.start()
     logger.info("Bot avviato correttamente")
     await notify_admin_error(application.bot, "Bot avviato correttamente", "STARTUP")
 
@@ -125,6 +138,11 @@ async def on_shutdown(application: Application) -> None:
         await notify_admin_error(application.bot, "Bot in arresto (shutdown)", "SHUTDOWN")
     except Exception:
         pass
+    # Scrivi i last_update_id ancora in buffer prima di chiudere il pool DB
+    await database_async.flush_last_update_ids()
+    database_async.shutdown()
+    mirror.close()
+    await http_clients.close()
 
 
 def main():
@@ -143,6 +161,7 @@ def main():
     application.add_handler(CommandHandler("morning", handle_morning))
     application.add_handler(CommandHandler("stats", handle_stats))
     application.add_handler(CommandHandler("testbriefing", handle_test_briefing))
+    application.add_handler(CommandHandler("reload", handle_reload))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
     application.add_handler(CallbackQueryHandler(callback_handler))
 
@@ -171,6 +190,186 @@ def main():
     )
     logger.info("Job morning briefing attivato (ogni giorno alle 8:00)")
 
+    # Aggiornamento cache meteo/mare prima della scadenza
+    async def scheduled_meteo_refresh(context):
+        """Wrapper per aggiornare la cache meteo"""
+        await prefetch_meteo()
+
+    job_queue.run_repeating(
+        scheduled_meteo_refresh,
+        interval=METEO_CACHE_TTL - METEO_REFRESH_AHEAD,
+        first=1,
+        name="meteo_refresh"
+    )
+    logger.info(f"Job cache meteo attivato (ogni {METEO_CACHE_TTL - METEO_REFRESH_AHEAD}s)")
+
+    # Maree: una chiamata Stormglass al giorno per più giorni (quota limitata)
+    async def scheduled_tides_prefetch(context):
+        """Wrapper per scaricare le maree dei prossimi giorni"""
+        await prefetch_tides(force=True)
+
+    async def startup_tides_prefetch(context):
+        """All'avvio scarica le maree solo se la cache su file non basta"""
+        await prefetch_tides(force=False)
+
+    job_queue.run_daily(
+        scheduled_tides_prefetch,
+        time=dt_time(hour=3, minute=0, second=0, tzinfo=rome_tz),
+        name="tides_prefetch"
+    )
+    job_queue.run_once(startup_tides_prefetch, when=5, name="tides_prefetch_startup")
+    logger.info("Job maree attivato (ogni giorno alle 3:00)")
+
+    # Farmacie: aggiornamento 2 minuti dopo il cambio turno, prima della scadenza cache
+    # e riscaldamento all'avvio, così /sos risponde sempre dalla cache
+    async def scheduled_farmacie_refresh(context):
+        """Wrapper per aggiornare le farmacie di turno"""
+        await refresh_farmacie()
+
+    async def startup_farmacie_refresh(context):
+        """All'avvio scarica le farmacie solo se la cache su file non è valida"""
+        await get_farmacie_turno()
+
+    job_queue.run_daily(
+        scheduled_farmacie_refresh,
+        time=dt_time(hour=CAMBIO_TURNO_ORA, minute=CAMBIO_TURNO_MINUTI + 2, second=0, tzinfo=rome_tz),
+        name="farmacie_refresh"
+    )
+    job_queue.run_repeating(
+        scheduled_farmacie_refresh,
+        interval=FARMACIE_CACHE_DURATION - 300,
+        first=FARMACIE_CACHE_DURATION - 300,
+        name="farmacie_refresh_periodico"
+    )
+    job_queue.run_once(startup_farmacie_refresh, when=10, name="farmacie_refresh_startup")
+    logger.info(f"Job farmacie attivato (ogni giorno alle {CAMBIO_TURNO_ORA}:{CAMBIO_TURNO_MINUTI + 2:02d})")
+
+    # Orari e fermate bus/traghetti: indici in memoria caricati all'avvio,
+    # ricaricati solo quando cambia la versione delle tabelle orari_bus e fermate_bus
+    async def scheduled_orari_refresh(context):
+        """Wrapper per ricaricare gli indici orari e fermate se i dati sono cambiati"""
+        if await database_async.run(orari_index.refresh):
+            # Rete del journey planner ricostruita sui nuovi orari
+            await database_async.run(percorsi.costruisci)
+
+    job_queue.run_repeating(
+        scheduled_orari_refresh,
+        interval=ORARI_REFRESH_INTERVAL,
+        first=2,
+        name="orari_refresh"
+    )
+    logger.info(f"Job indice orari attivato (controllo versione ogni {ORARI_REFRESH_INTERVAL}s)")
+
+    # Dati di riferimento trasporti: snapshot all'avvio, ricaricato solo se cambia una tabella
+    async def scheduled_riferimenti_refresh(context):
+        """Wrapper per ricaricare i dati di riferimento se sono cambiati"""
+        await database_async.run(riferimenti.refresh)
+
+    job_queue.run_repeating(
+        scheduled_riferimenti_refresh,
+        interval=RIFERIMENTI_REFRESH_INTERVAL,
+        first=1,
+        name="riferimenti_refresh"
+    )
+    logger.info(f"Job dati di riferimento attivato (controllo versione ogni {RIFERIMENTI_REFRESH_INTERVAL}s)")
+
+    # Eventi: indice a intervalli in memoria, ricaricato solo se cambia la tabella eventi
+    async def scheduled_eventi_refresh(context):
+        """Wrapper per ricaricare l'indice eventi se i dati sono cambiati"""
+        await database_async.run(eventi_index.refresh)
+
+    job_queue.run_repeating(
+        scheduled_eventi_refresh,
+        interval=EVENTI_REFRESH_INTERVAL,
+        first=2,
+        name="eventi_refresh"
+    )
+    logger.info(f"Job indice eventi attivato (controllo versione ogni {EVENTI_REFRESH_INTERVAL}s)")
+
+    # Testi e config: ricaricati in background (mai sul percorso delle richieste),
+    # con le schermate statiche ricostruite quando cambiano i testi
+    async def scheduled_testi_refresh(context):
+        """Wrapper per ricaricare testi e config se sono cambiati"""
+        cambiate = await database_async.refresh_testi_config()
+        if "testi" in cambiate:
+            await database_async.run(schermate.costruisci)
+
+    job_queue.run_repeating(
+        scheduled_testi_refresh,
+        interval=CACHE_TTL,
+        first=1,
+        name="testi_refresh"
+    )
+    logger.info(f"Job testi e config attivato (controllo ogni {CACHE_TTL}s)")
+
+    # Schermate statiche (spiagge, ristoranti, fortini, idee): pre-costruite all'avvio
+    # in tutte le lingue, ricostruite dal job testi quando cambiano
+    async def scheduled_schermate(context):
+        """Wrapper per pre-costruire le schermate"""
+        await database_async.get_testi()
+        await database_async.run(schermate.costruisci)
+
+    job_queue.run_once(scheduled_schermate, when=3, name="schermate_startup")
+    logger.info("Job schermate pre-renderizzate attivato (all'avvio e al cambio testi)")
+
+    # Mirror SQLite: all'avvio indici e snapshot si caricano dal file locale (job sopra),
+    # poi il sync porta in locale solo le modifiche; se Supabase è giù si resta sui dati locali
+    async def scheduled_mirror_sync(context):
+        """Wrapper per il sync incrementale del mirror e il riallineamento delle cache in memoria"""
+        cambiate = await database_async.run(mirror.sync_all)
+        if not cambiate:
+            return
+        if "orari_bus" in cambiate or "fermate_bus" in cambiate:
+            if await database_async.run(orari_index.refresh):
+                await database_async.run(percorsi.costruisci)
+        if set(cambiate) & set(riferimenti.TABELLE):
+            await database_async.run(riferimenti.refresh)
+        if "eventi" in cambiate:
+            await database_async.run(eventi_index.refresh)
+            await database_async.invalidate_cache()
+        if {"testi", "config"} & set(cambiate):
+            await scheduled_testi_refresh(context)
+
+    job_queue.run_repeating(
+        scheduled_mirror_sync,
+        interval=MIRROR_SYNC_INTERVAL,
+        first=5,
+        name="mirror_sync"
+    )
+    logger.info(f"Job mirror SQLite attivato (sync ogni {MIRROR_SYNC_INTERVAL}s)")
+
+    # Statistiche /stats: contatori in memoria riallineati con il database
+    async def scheduled_stats_riconcilia(context):
+        """Wrapper per riconciliare i contatori di /stats con una query aggregata"""
+        delta = statistiche.delta_corrente()
+        stats = await database_async.get_stats()
+        if stats.get("parziale"):
+            # Query fallita: meglio i conteggi precedenti + delta che degli zeri
+            logger.warning("Riconciliazione statistiche saltata: query database fallita")
+            return
+        statistiche.riconcilia(stats, delta)
+
+    job_queue.run_repeating(
+        scheduled_stats_riconcilia,
+        interval=STATS_RICONCILIA_INTERVAL,
+        first=10,
+        name="stats_riconcilia"
+    )
+    logger.info(f"Job statistiche attivato (riconciliazione ogni {STATS_RICONCILIA_INTERVAL}s)")
+
+    # Tabelloni partenze: rigenerati all'inizio di ogni minuto
+    async def scheduled_tabelloni(context):
+        """Wrapper per rigenerare i tabelloni partenze del minuto corrente"""
+        await database_async.run(tabelloni.genera)
+
+    job_queue.run_repeating(
+        scheduled_tabelloni,
+        interval=60,
+        first=61 - datetime.now().second,
+        name="tabelloni"
+    )
+    logger.info("Job tabelloni partenze attivato (ogni minuto)")
+
     # Modalità webhook (produzione) o polling (sviluppo)
     if WEBHOOK_URL:
         logger.info(f"Avvio in modalità WEBHOOK su porta {PORT}")
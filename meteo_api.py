@@ -4,12 +4,20 @@ API Meteo per Slappy Bot
 - Open-Meteo Marine API (gratuita) per condizioni mare
 - Stormglass API per maree
 """
+import asyncio
+import json
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable
 import httpx
 
-from config import STORMGLASS_API_KEY
+from http_clients import get_client
+from config import (
+    STORMGLASS_API_KEY, METEO_CACHE_TTL, METEO_REFRESH_AHEAD, METEO_MAX_STALE,
+    TIDE_CACHE_PATH, TIDE_PREFETCH_DAYS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +25,102 @@ logger = logging.getLogger(__name__)
 LAT = 45.4833
 LON = 12.5500
 
-# Timeout per le richieste HTTP
-HTTP_TIMEOUT = 10.0
+# Cache previsioni: le coordinate sono fisse, i dati sono uguali per tutti gli utenti
+_cache = {
+    "meteo": {"data": None, "loaded_at": 0},
+    "marine": {"data": None, "loaded_at": 0}
+}
+
+# Aggiornamenti in corso (single-flight): chiave -> asyncio.Task
+_inflight: Dict[str, asyncio.Task] = {}
+
+# Cache maree (persistita su TIDE_CACHE_PATH): estremi grezzi Stormglass per più giorni
+_tide_cache = {
+    "extremes": [],
+    "fetched_at": 0,
+    "loaded": False,
+    "upstream_calls": 0,
+    "saved_calls": 0
+}
+
+
+async def _run_refresh(key: str, fetch: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+    """
+    Scarica i dati e aggiorna la cache. Se l'API fallisce ritorna i dati precedenti,
+    ma solo se più recenti di METEO_MAX_STALE (altrimenti None, "dati non disponibili").
+    """
+    data = await fetch()
+    if data is not None:
+        _cache[key]["data"] = data
+        _cache[key]["loaded_at"] = time.time()
+        logger.info(f"Cache {key} aggiornata")
+        return data
+
+    entry = _cache[key]
+    if entry["data"] is None:
+        return None
+    age = time.time() - entry["loaded_at"]
+    if age >= METEO_MAX_STALE:
+        logger.warning(f"Cache {key}: API non raggiungibile e dati vecchi di {age / 3600:.1f}h, non serviti")
+        return None
+    logger.warning(f"Cache {key}: API non raggiungibile, servo dati di {age / 60:.0f} minuti fa")
+    return entry["data"]
+
+
+def _refresh(key: str, fetch) -> asyncio.Task:
+    """Avvia l'aggiornamento, riusando quello già in corso (una sola richiesta per tutti)"""
+    task = _inflight.get(key)
+    if task is None or task.done():
+        task = asyncio.create_task(_run_refresh(key, fetch))
+        _inflight[key] = task
+    return task
+
+
+async def _get_cached(key: str, fetch) -> Optional[Dict[str, Any]]:
+    """
+    Stale-while-revalidate:
+    - dati freschi: ritornati subito dalla memoria
+    - in scadenza o scaduti: ritornati subito, aggiornamento in background
+    - assenti o più vecchi di METEO_MAX_STALE: attende l'aggiornamento condiviso
+      (None se l'API fallisce: dati così vecchi non vengono serviti)
+    """
+    entry = _cache[key]
+    data = entry["data"]
+    age = time.time() - entry["loaded_at"]
+
+    if data is not None:
+        if age >= METEO_CACHE_TTL - METEO_REFRESH_AHEAD:
+            _refresh(key, fetch)
+        if age < METEO_MAX_STALE:
+            return data
+
+    # shield: un timeout del chiamante non annulla la richiesta condivisa
+    return await asyncio.shield(_refresh(key, fetch))
+
+
+async def prefetch_meteo():
+    """Aggiorna meteo e mare in background (job periodico in main.py)"""
+    await asyncio.gather(
+        _refresh("meteo", _fetch_meteo_forecast),
+        _refresh("marine", _fetch_marine_conditions)
+    )
 
 
 async def get_meteo_forecast() -> Optional[Dict[str, Any]]:
+    """
+    Previsioni meteo atmosferico (oggi e domani) servite dalla cache condivisa.
+    """
+    return await _get_cached("meteo", _fetch_meteo_forecast)
+
+
+async def get_marine_conditions() -> Optional[Dict[str, Any]]:
+    """
+    Condizioni marine servite dalla cache condivisa.
+    """
+    return await _get_cached("marine", _fetch_marine_conditions)
+
+
+async def _fetch_meteo_forecast() -> Optional[Dict[str, Any]]:
     """
     Ottiene previsioni meteo atmosferico da Open-Meteo API (gratuita).
     Ritorna dati per oggi e domani.
@@ -37,35 +136,35 @@ async def get_meteo_forecast() -> Optional[Dict[str, Any]]:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # Formatta i dati per uso facile
-            current = data.get("current", {})
-            daily = data.get("daily", {})
-
-            return {
-                "current": {
-                    "temperature": current.get("temperature_2m"),
-                    "feels_like": current.get("apparent_temperature"),
-                    "humidity": current.get("relative_humidity_2m"),
-                    "precipitation": current.get("precipitation"),
-                    "weather_code": current.get("weather_code"),
-                    "wind_speed": current.get("wind_speed_10m"),
-                    "wind_direction": current.get("wind_direction_10m")
-                },
-                "daily": {
-                    "dates": daily.get("time", []),
-                    "weather_codes": daily.get("weather_code", []),
-                    "temp_max": daily.get("temperature_2m_max", []),
-                    "temp_min": daily.get("temperature_2m_min", []),
-                    "precipitation": daily.get("precipitation_sum", []),
-                    "precipitation_prob": daily.get("precipitation_probability_max", []),
-                    "wind_max": daily.get("wind_speed_10m_max", [])
-                }
+        client = get_client()
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        # Formatta i dati per uso facile
+        current = data.get("current", {})
+        daily = data.get("daily", {})
+
+        return {
+            "current": {
+                "temperature": current.get("temperature_2m"),
+                "feels_like": current.get("apparent_temperature"),
+                "humidity": current.get("relative_humidity_2m"),
+                "precipitation": current.get("precipitation"),
+                "weather_code": current.get("weather_code"),
+                "wind_speed": current.get("wind_speed_10m"),
+                "wind_direction": current.get("wind_direction_10m")
+            },
+            "daily": {
+                "dates": daily.get("time", []),
+                "weather_codes": daily.get("weather_code", []),
+                "temp_max": daily.get("temperature_2m_max", []),
+                "temp_min": daily.get("temperature_2m_min", []),
+                "precipitation": daily.get("precipitation_sum", []),
+                "precipitation_prob": daily.get("precipitation_probability_max", []),
+                "wind_max": daily.get("wind_speed_10m_max", [])
             }
+        }
 
     except httpx.TimeoutException:
         logger.error("Timeout chiamata Open-Meteo API")
@@ -78,7 +177,7 @@ async def get_meteo_forecast() -> Optional[Dict[str, Any]]:
         return None
 
 
-async def get_marine_conditions() -> Optional[Dict[str, Any]]:
+async def _fetch_marine_conditions() -> Optional[Dict[str, Any]]:
     """
     Ottiene condizioni marine da Open-Meteo Marine API (gratuita).
     Altezza onde, direzione, periodo.
@@ -94,29 +193,29 @@ async def get_marine_conditions() -> Optional[Dict[str, Any]]:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            current = data.get("current", {})
-            daily = data.get("daily", {})
-
-            return {
-                "current": {
-                    "wave_height": current.get("wave_height"),
-                    "wave_direction": current.get("wave_direction"),
-                    "wave_period": current.get("wave_period"),
-                    "wind_wave_height": current.get("wind_wave_height"),
-                    "swell_wave_height": current.get("swell_wave_height")
-                },
-                "daily": {
-                    "dates": daily.get("time", []),
-                    "wave_height_max": daily.get("wave_height_max", []),
-                    "wave_direction": daily.get("wave_direction_dominant", []),
-                    "wave_period_max": daily.get("wave_period_max", [])
-                }
+        client = get_client()
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        current = data.get("current", {})
+        daily = data.get("daily", {})
+
+        return {
+            "current": {
+                "wave_height": current.get("wave_height"),
+                "wave_direction": current.get("wave_direction"),
+                "wave_period": current.get("wave_period"),
+                "wind_wave_height": current.get("wind_wave_height"),
+                "swell_wave_height": current.get("swell_wave_height")
+            },
+            "daily": {
+                "dates": daily.get("time", []),
+                "wave_height_max": daily.get("wave_height_max", []),
+                "wave_direction": daily.get("wave_direction_dominant", []),
+                "wave_period_max": daily.get("wave_period_max", [])
             }
+        }
 
     except httpx.TimeoutException:
         logger.error("Timeout chiamata Open-Meteo Marine API")
@@ -129,51 +228,39 @@ async def get_marine_conditions() -> Optional[Dict[str, Any]]:
         return None
 
 
-async def get_tides() -> Optional[Dict[str, Any]]:
+async def _fetch_tides() -> Optional[list]:
     """
-    Ottiene orari maree da Stormglass API.
+    Scarica da Stormglass gli estremi di marea per TIDE_PREFETCH_DAYS giorni da oggi.
     Richiede API key in .env: STORMGLASS_API_KEY
+    Ritorna la lista grezza (time, type, height) o None in caso di errore.
     """
     if not STORMGLASS_API_KEY:
         logger.warning("STORMGLASS_API_KEY non configurata")
         return None
 
     url = "https://api.stormglass.io/v2/tide/extremes/point"
+    start = datetime.combine(datetime.now().date(), datetime.min.time())
     params = {
         "lat": LAT,
-        "lng": LON
+        "lng": LON,
+        "start": int(start.timestamp()),
+        "end": int((start + timedelta(days=TIDE_PREFETCH_DAYS)).timestamp())
     }
     headers = {
         "Authorization": STORMGLASS_API_KEY
     }
 
     try:
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-            response = await client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-            extremes = data.get("data", [])
-
-            # Filtra solo le maree di oggi e domani
-            today = datetime.now().date()
-            filtered = []
-            for extreme in extremes:
-                try:
-                    dt = datetime.fromisoformat(extreme["time"].replace("Z", "+00:00"))
-                    if dt.date() >= today:
-                        filtered.append({
-                            "time": dt.strftime("%H:%M"),
-                            "date": dt.strftime("%Y-%m-%d"),
-                            "type": extreme.get("type"),  # "high" o "low"
-                            "height": extreme.get("height")
-                        })
-                except (KeyError, ValueError):
-                    continue
-
-            return {
-                "extremes": filtered[:8]  # Prossime 8 maree (circa 2 giorni)
-            }
+        client = get_client()
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        _tide_cache["upstream_calls"] += 1
+
+        return [
+            {"time": e["time"], "type": e.get("type"), "height": e.get("height")}
+            for e in data.get("data", []) if e.get("time")
+        ]
 
     except httpx.TimeoutException:
         logger.error("Timeout chiamata Stormglass API")
@@ -186,6 +273,123 @@ async def get_tides() -> Optional[Dict[str, Any]]:
         return None
 
 
+def _load_tide_cache():
+    """Carica la cache maree dal file (una sola volta, all'avvio)"""
+    _tide_cache["loaded"] = True
+    try:
+        with open(TIDE_CACHE_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        _tide_cache["extremes"] = saved.get("extremes", [])
+        _tide_cache["fetched_at"] = saved.get("fetched_at", 0)
+        _tide_cache["saved_calls"] = saved.get("saved_calls", 0)
+        logger.info(f"Cache maree caricata da file: {len(_tide_cache['extremes'])} estremi")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Errore lettura cache maree: {e}")
+
+
+def _save_tide_cache():
+    """Salva la cache maree su file (scrittura atomica)"""
+    try:
+        os.makedirs(os.path.dirname(TIDE_CACHE_PATH), exist_ok=True)
+        tmp_path = TIDE_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "extremes": _tide_cache["extremes"],
+                "fetched_at": _tide_cache["fetched_at"],
+                "saved_calls": _tide_cache["saved_calls"]
+            }, f)
+        os.replace(tmp_path, TIDE_CACHE_PATH)
+    except Exception as e:
+        logger.error(f"Errore scrittura cache maree: {e}")
+
+
+def _tide_cache_covers(days: int) -> bool:
+    """True se la cache contiene estremi fino ad almeno `days` giorni da oggi"""
+    if not _tide_cache["extremes"]:
+        return False
+    last_day = _tide_cache["extremes"][-1]["time"][:10]
+    return last_day >= (datetime.now().date() + timedelta(days=days)).isoformat()
+
+
+async def prefetch_tides(force: bool = True) -> bool:
+    """
+    Scarica più giorni di maree e li salva su file (job giornaliero in main.py).
+    Con force=False scarica solo se la cache non copre oggi e domani.
+    """
+    if not _tide_cache["loaded"]:
+        _load_tide_cache()
+    if not force and _tide_cache_covers(1):
+        return True
+
+    extremes = await _fetch_tides()
+    if extremes is None:
+        return False
+
+    _tide_cache["extremes"] = sorted(extremes, key=lambda e: e["time"])
+    _tide_cache["fetched_at"] = time.time()
+    _save_tide_cache()
+    logger.info(f"Cache maree aggiornata: {len(extremes)} estremi ({TIDE_PREFETCH_DAYS} giorni)")
+    return True
+
+
+def _refresh_tides() -> asyncio.Task:
+    """Scaricamento maree condiviso tra richieste concorrenti (single-flight)"""
+    task = _inflight.get("tides")
+    if task is None or task.done():
+        task = asyncio.create_task(prefetch_tides(force=True))
+        _inflight["tides"] = task
+    return task
+
+
+async def get_tides() -> Optional[Dict[str, Any]]:
+    """
+    Orari maree da oggi in poi, letti dalla cache (file + memoria).
+    La rete viene usata solo se la cache non copre oggi e domani.
+    """
+    if not _tide_cache["loaded"]:
+        _load_tide_cache()
+
+    if _tide_cache_covers(1):
+        _tide_cache["saved_calls"] += 1
+    elif not await asyncio.shield(_refresh_tides()) and not _tide_cache["extremes"]:
+        return None
+
+    # Filtra solo le maree da oggi in poi
+    today = datetime.now().date()
+    filtered = []
+    for extreme in _tide_cache["extremes"]:
+        try:
+            dt = datetime.fromisoformat(extreme["time"].replace("Z", "+00:00"))
+            if dt.date() >= today:
+                filtered.append({
+                    "time": dt.strftime("%H:%M"),
+                    "date": dt.strftime("%Y-%m-%d"),
+                    "type": extreme.get("type"),  # "high" o "low"
+                    "height": extreme.get("height")
+                })
+        except (KeyError, ValueError):
+            continue
+
+    if not filtered:
+        return None
+
+    return {
+        "extremes": filtered[:8]  # Prossime 8 maree (circa 2 giorni)
+    }
+
+
+def get_tide_stats() -> dict:
+    """Statistiche cache maree per /stats"""
+    return {
+        "upstream_calls": _tide_cache["upstream_calls"],
+        "saved_calls": _tide_cache["saved_calls"],
+        "extremes": len(_tide_cache["extremes"]),
+        "fetched_at": _tide_cache["fetched_at"]
+    }
+
+
 def get_weather_emoji(code: int) -> str:
     """Converte weather code WMO in emoji"""
     weather_emojis = {
@@ -0,0 +1,393 @@
+"""
+Mirror locale SQLite delle tabelle Supabase di sola lettura
+
+Copia su file (MIRROR_PATH) di testi, config, eventi, orari e fermate bus,
+fortini, percorsi e dati di riferimento trasporti, usata da database.py come
+percorso di lettura: le query girano in locale (millisecondi) e continuano a
+funzionare se Supabase è lento o irraggiungibile. Dopo un deploy il bot parte
+già con i dati dell'ultimo sync.
+
+Sync in background (job in main.py), per tabella:
+- con colonna updated_at: scarica solo le righe con updated_at >= ultimo cursore
+  (upsert per chiave); se il numero di righe non torna (cancellazioni) ricarica
+  la tabella intera
+- senza updated_at: confronta (righe, id massimo) e ricarica se cambiati; dato
+  che gli UPDATE sul posto non cambiano né l'uno né l'altro, ogni
+  MIRROR_VERIFICA_INTERVAL la tabella è comunque riscaricata e confrontata per hash
+- senza né updated_at né id (testi, config): tabelle piccole, scaricate per
+  intero e riscritte solo se cambia l'hash del contenuto
+
+Le righe sono salvate come JSON (con le stesse embed delle query di database.py)
+e filtrate con json_extract. sync_all(force=True) (/reload) ignora le versioni
+salvate e riscarica tutto, riscrivendo solo le tabelle con contenuto diverso.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, List, Tuple, Any
+
+from config import MIRROR_PATH, MIRROR_VERIFICA_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Tabella -> select (embed come nelle query di database.py / riferimenti.py)
+TABELLE = {
+    "testi": "*",
+    "config": "*",
+    "eventi": "*",
+    "orari_bus": "*",
+    "fermate_bus": "*",
+    "fortini": "*",
+    "percorsi": "*, linee(nome, tipo, operatori(nome, link))",
+    "percorsi_fortini": "*, fortini(*)",
+    "zone": "*",
+    "destinazioni": "*",
+    "linee": "*, operatori(nome, sito_web)",
+    "operatori": "*",
+    "tariffe": "*",
+}
+
+# Chiave univoca delle tabelle senza id (ordinamento stabile tra le pagine)
+CHIAVI = {
+    "testi": "chiave",
+    "config": "chiave",
+}
+
+PAGE_SIZE = 1000
+
+_OPERATORI = {"=", "<", "<=", ">", ">="}
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.RLock()
+_stats = {"sync": 0, "righe_scaricate": 0, "ricariche_complete": 0, "errori": 0, "ultimo_sync_ms": 0.0}
+
+
+def _connessione() -> sqlite3.Connection:
+    """Connessione condivisa (apertura e schema al primo uso)"""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(MIRROR_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(MIRROR_PATH, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS righe (
+                tabella TEXT NOT NULL,
+                chiave TEXT NOT NULL,
+                dati TEXT NOT NULL,
+                PRIMARY KEY (tabella, chiave)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync (
+                tabella TEXT PRIMARY KEY,
+                modo TEXT NOT NULL,
+                cursore TEXT,
+                versione TEXT,
+                righe INTEGER NOT NULL,
+                synced_at REAL NOT NULL
+            )
+        """)
+        _conn = conn
+        logger.info(f"Mirror SQLite aperto: {MIRROR_PATH}")
+    return _conn
+
+
+def close():
+    """Chiude la connessione (on_shutdown)"""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def _chiave(riga: dict) -> str:
+    if riga.get("id") is not None:
+        return str(riga["id"])
+    if riga.get("chiave") is not None:
+        return str(riga["chiave"])
+    return json.dumps(riga, sort_keys=True, default=str)
+
+
+def _campo(nome: str) -> str:
+    if not nome.replace("_", "").isalnum():
+        raise ValueError(f"Campo non valido: {nome}")
+    return f"json_extract(dati, '$.{nome}')"
+
+
+# ============ SYNC ============
+
+def _scarica(tabella: str, colonna_ordine: Optional[str], dopo: Any = None) -> List[dict]:
+    """
+    Scarica a pagine le righe della tabella (solo updated_at >= dopo, se indicato).
+    L'ordine ha sempre una chiave univoca in coda ("id", o CHIAVI per le tabelle
+    senza id): con righe a pari updated_at le pagine non saltano né ripetono righe.
+    """
+    from database import supabase
+    ordine = [colonna_ordine] if colonna_ordine else []
+    univoca = "id" if colonna_ordine else CHIAVI.get(tabella)
+    if univoca and univoca not in ordine:
+        ordine.append(univoca)
+    righe = []
+    start = 0
+    while True:
+        query = supabase.table(tabella).select(TABELLE[tabella])
+        if dopo is not None:
+            # gte: righe salvate dopo con lo stesso updated_at del cursore (riscritte, upsert)
+            query = query.gte("updated_at", dopo)
+        for colonna in ordine:
+            query = query.order(colonna)
+        response = query.range(start, start + PAGE_SIZE - 1).execute()
+        data = response.data or []
+        righe.extend(data)
+        if len(data) < PAGE_SIZE:
+            return righe
+        start += PAGE_SIZE
+
+
+def _probe(tabella: str) -> Tuple[str, Any, int]:
+    """
+    (modo, valore massimo, righe) remoti: modo "updated_at" o "id" secondo la colonna
+    disponibile, "completo" se la tabella non ha né l'una né l'altra
+    """
+    from database import supabase
+    for colonna in ("updated_at", "id"):
+        try:
+            response = supabase.table(tabella) \
+                .select(colonna, count="exact") \
+                .order(colonna, desc=True) \
+                .limit(1) \
+                .execute()
+            massimo = response.data[0][colonna] if response.data else None
+            return colonna, massimo, response.count or 0
+        except Exception:
+            continue
+    return "completo", None, None
+
+
+def _stato(tabella: str) -> Optional[tuple]:
+    with _lock:
+        return _connessione().execute(
+            "SELECT modo, cursore, versione, righe, synced_at FROM sync WHERE tabella = ?", (tabella,)
+        ).fetchone()
+
+
+def _scrivi(tabella: str, righe: List[dict], completa: bool, modo: str, cursore, versione: str):
+    """Scrive le righe in una transazione (completa = sostituisce tutta la tabella)"""
+    with _lock:
+        conn = _connessione()
+        conn.execute("BEGIN")
+        try:
+            if completa:
+                conn.execute("DELETE FROM righe WHERE tabella = ?", (tabella,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO righe (tabella, chiave, dati) VALUES (?, ?, ?)",
+                [(tabella, _chiave(r), json.dumps(r, default=str)) for r in righe]
+            )
+            n = conn.execute("SELECT COUNT(*) FROM righe WHERE tabella = ?", (tabella,)).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO sync (tabella, modo, cursore, versione, righe, synced_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (tabella, modo, None if cursore is None else str(cursore), versione, n, time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return n
+
+
+def _hash(righe: List[dict]) -> str:
+    return hashlib.sha1(json.dumps(righe, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _probe_salvato(stato: tuple) -> Optional[list]:
+    """[modo, massimo, righe] della versione salvata (None per le tabelle "completo")"""
+    try:
+        versione = json.loads(stato[2])
+    except (TypeError, ValueError):
+        return None
+    return json.loads(json.dumps(versione[:3], default=str)) if isinstance(versione, list) else None
+
+
+def _tocca(tabella: str):
+    """Contenuto verificato e invariato: aggiorna solo synced_at"""
+    with _lock:
+        _connessione().execute("UPDATE sync SET synced_at = ? WHERE tabella = ?", (time.time(), tabella))
+
+
+def _ricarica(tabella: str, modo: str, massimo, remote, stato: Optional[tuple]) -> bool:
+    """Scarica la tabella intera e la riscrive solo se l'hash del contenuto è cambiato"""
+    righe = _scarica(tabella, None if modo == "completo" else modo)
+    _stats["righe_scaricate"] += len(righe)
+    contenuto = _hash(righe)
+    if modo == "completo":
+        versione = contenuto
+    else:
+        versione = json.dumps([modo, massimo, remote, contenuto], default=str)
+    if stato and stato[2] == versione:
+        _tocca(tabella)
+        return False
+    cursore = massimo if modo == "updated_at" else None
+    if remote is not None and len({_chiave(r) for r in righe}) != remote:
+        # Tabella cambiata durante il download: righe salvate ma senza versione e
+        # cursore, così il prossimo sync la riscarica per intero
+        logger.warning(f"Mirror {tabella}: {len(righe)} righe scaricate, {remote} remote, versione non salvata")
+        versione = None
+        cursore = None
+    _scrivi(tabella, righe, True, modo, cursore, versione)
+    _stats["ricariche_complete"] += 1
+    logger.info(f"Mirror {tabella}: ricaricata ({len(righe)} righe)")
+    return True
+
+
+def sync_tabella(tabella: str, force: bool = False) -> bool:
+    """
+    Allinea una tabella. Ritorna True se il contenuto locale è cambiato.
+    force: ignora la versione salvata e riscarica la tabella intera.
+    """
+    modo, massimo, remote = _probe(tabella)
+    stato = _stato(tabella)
+
+    if modo == "completo":
+        return _ricarica(tabella, modo, None, None, stato)
+
+    probe = json.loads(json.dumps([modo, massimo, remote], default=str))
+    if not force and stato and _probe_salvato(stato) == probe:
+        if modo == "updated_at" or time.time() - stato[4] < MIRROR_VERIFICA_INTERVAL:
+            return False
+        # Modo id: (id massimo, righe) non vedono gli UPDATE sul posto, verifica del contenuto
+        return _ricarica(tabella, modo, massimo, remote, stato)
+
+    if not force and modo == "updated_at" and stato and stato[0] == "updated_at" and stato[1]:
+        # Incrementale: righe modificate dall'ultimo cursore in poi (upsert per chiave)
+        nuove = _scarica(tabella, "updated_at", dopo=stato[1])
+        cursore = max((r.get("updated_at") for r in nuove if r.get("updated_at")), default=stato[1])
+        versione = json.dumps([modo, massimo, remote, None], default=str)
+        n = _scrivi(tabella, nuove, False, modo, cursore, versione)
+        _stats["righe_scaricate"] += len(nuove)
+        if n == remote:
+            logger.info(f"Mirror {tabella}: {len(nuove)} righe aggiornate")
+            return True
+        logger.info(f"Mirror {tabella}: {n} righe locali, {remote} remote, ricarica completa")
+        stato = _stato(tabella)
+
+    return _ricarica(tabella, modo, massimo, remote, stato)
+
+
+def sync_all(force: bool = False) -> List[str]:
+    """
+    Allinea tutte le tabelle; ritorna quelle cambiate. Upstream non raggiungibile = dati locali invariati.
+    force: riscarica tutto ignorando le versioni salvate (/reload).
+    """
+    t0 = time.perf_counter()
+    cambiate = []
+    for tabella in TABELLE:
+        try:
+            if sync_tabella(tabella, force=force):
+                cambiate.append(tabella)
+        except Exception as e:
+            _stats["errori"] += 1
+            logger.warning(f"Sync mirror {tabella} non riuscito, uso i dati locali: {e}")
+    _stats["sync"] += 1
+    _stats["ultimo_sync_ms"] = (time.perf_counter() - t0) * 1000
+    return cambiate
+
+
+# ============ LETTURA ============
+
+def sincronizzata(tabella: str) -> bool:
+    """La tabella ha almeno un sync completato (altrimenti database.py usa Supabase)"""
+    try:
+        return _stato(tabella) is not None
+    except Exception as e:
+        logger.error(f"Errore mirror {tabella}: {e}")
+        return False
+
+
+def versione(tabella: str) -> Optional[tuple]:
+    """Versione locale della tabella (cambia ad ogni sync con modifiche), None se non sincronizzata"""
+    stato = _stato(tabella) if sincronizzata(tabella) else None
+    return (stato[2], stato[3]) if stato else None
+
+
+def _where(tabella: str, filtri) -> Tuple[str, list]:
+    """Clausola WHERE dai filtri; "=" confronta come testo (come PostgREST con id passati come stringa)"""
+    sql = " WHERE tabella = ?"
+    params: list = [tabella]
+    for campo, operatore, valore in filtri:
+        if operatore not in _OPERATORI:
+            raise ValueError(f"Operatore non valido: {operatore}")
+        if campo == "id" and operatore == "=":
+            sql += " AND chiave = ?"
+            params.append(str(valore))
+        elif operatore == "=":
+            sql += f" AND CAST({_campo(campo)} AS TEXT) = CAST(? AS TEXT)"
+            params.append(valore)
+        else:
+            sql += f" AND {_campo(campo)} {operatore} ?"
+            params.append(valore)
+    return sql, params
+
+
+def seleziona(tabella: str, filtri: List[tuple] = (), ordine=None, desc: bool = False,
+              limit: int = None, offset: int = 0) -> Optional[List[dict]]:
+    """
+    Righe filtrate come le query PostgREST di database.py.
+    filtri: [(campo, operatore, valore)] con operatore tra = < <= > >=
+    ordine: colonna o tupla di colonne
+    None se la tabella non è ancora sincronizzata (il chiamante usa Supabase).
+    """
+    if not sincronizzata(tabella):
+        return None
+
+    where, params = _where(tabella, filtri)
+    sql = "SELECT dati FROM righe" + where
+    if ordine:
+        # Come PostgREST: NULL in fondo; più colonne = ordinamenti successivi
+        colonne = (ordine,) if isinstance(ordine, str) else ordine
+        sql += " ORDER BY " + ", ".join(
+            f"{_campo(c)} IS NULL, {_campo(c)}{' DESC' if desc else ''}" for c in colonne
+        )
+    if limit or offset:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit if limit else -1, offset or 0]
+
+    try:
+        with _lock:
+            return [json.loads(r[0]) for r in _connessione().execute(sql, params)]
+    except sqlite3.Error as e:
+        logger.error(f"Errore lettura mirror {tabella}: {e}")
+        return None
+
+
+def conta(tabella: str, filtri: List[tuple] = ()) -> Optional[int]:
+    """Numero di righe che soddisfano i filtri (None se non sincronizzata)"""
+    if not sincronizzata(tabella):
+        return None
+
+    where, params = _where(tabella, filtri)
+    try:
+        with _lock:
+            return _connessione().execute("SELECT COUNT(*) FROM righe" + where, params).fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Errore lettura mirror {tabella}: {e}")
+        return None
+
+
+def righe(tabella: str) -> Optional[List[dict]]:
+    """Tutte le righe di una tabella (None se non sincronizzata)"""
+    return seleziona(tabella)
+
+
+def get_stats() -> dict:
+    try:
+        with _lock:
+            tabelle = dict(_connessione().execute("SELECT tabella, righe FROM sync").fetchall())
+    except Exception:
+        tabelle = {}
+    return dict(_stats, tabelle=len(tabelle), righe=sum(tabelle.values()))
@@ -0,0 +1,295 @@
+"""
+Indici in memoria delle tabelle orari_bus e fermate_bus (bus 23A/23B/96, traghetti 12/14/15)
+
+Le tabelle sono di fatto statiche: vengono caricate una volta all'avvio e ricaricate
+in background solo se cambia la versione dei dati (updated_at massimo + numero
+righe, o hash del contenuto calcolato dal database se la tabella non ha updated_at).
+- orari_bus: per ogni chiave (linea_codice, fermata_nome, direzione, tipo_giorno)
+  un array ordinato di minuti dalla mezzanotte; "prossime N corse" e
+  "prime corse di domani" sono una bisect, senza query al database
+- fermate_bus: per ogni linea gli offset tempo_da_capolinea delle fermate;
+  tempo di percorrenza e orario di arrivo tra due fermate sono una differenza, O(1)
+
+Se la tabella è nel mirror SQLite (mirror.py) versione e righe vengono da lì.
+"""
+import bisect
+import logging
+import time
+from typing import Optional, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Righe lette per pagina (limite PostgREST)
+PAGE_SIZE = 1000
+
+# Indice corrente, sostituito in blocco ad ogni ricarica (swap atomico)
+_indice = {
+    "per_tipo": {},      # (linea, fermata, direzione, tipo_giorno) -> (minuti, righe)
+    "per_fermata": {},   # (linea, fermata, direzione) -> (minuti, righe), tutti i tipi giorno
+    "versione": None,
+    "righe": 0,
+    "loaded_at": 0
+}
+
+# Indice fermate corrente, sostituito in blocco ad ogni ricarica
+_fermate = {
+    "per_nome": {},      # linea -> {nome fermata: riga}
+    "ordinate": {},      # linea -> righe ordinate per "ordine"
+    "offset": {},        # linea -> {nome fermata: minuti dal capolinea}
+    "versione": None,
+    "righe": 0,
+    "loaded_at": 0
+}
+
+
+def _minuti(ora: str) -> int:
+    """'HH:MM[:SS]' -> minuti dalla mezzanotte"""
+    return int(ora[0:2]) * 60 + int(ora[3:5])
+
+
+def _minuti_da(ora_min: str) -> int:
+    """
+    Soglia 'HH:MM[:SS]' in minuti, arrotondata per eccesso se ci sono secondi:
+    equivale al confronto ora >= ora_min sulle stringhe HH:MM:SS del database.
+    """
+    minuti = _minuti(ora_min)
+    if len(ora_min) > 5 and int(ora_min[6:8]) > 0:
+        minuti += 1
+    return minuti
+
+
+def _versione(tabella: str = "orari_bus") -> Optional[tuple]:
+    """
+    Versione dati: dal mirror se sincronizzato, altrimenti database.versione_remota
+    (max updated_at + righe, o md5 del contenuto calcolato dal database: una sola
+    query, mai la tabella intera). None se non determinabile.
+    """
+    import mirror
+    versione = mirror.versione(tabella)
+    if versione is not None:
+        return ("mirror",) + versione
+
+    from database import versione_remota
+    return versione_remota(tabella)
+
+
+def _carica_righe(tabella: str = "orari_bus", ordine: tuple = ("linea_codice", "fermata_nome", "direzione", "tipo_giorno", "ora")) -> List[dict]:
+    """Legge tutta la tabella a pagine (ordinamento stabile tra le pagine)"""
+    import mirror
+    righe = mirror.righe(tabella)
+    if righe is not None:
+        return righe
+
+    from database import supabase
+    righe = []
+    start = 0
+    while True:
+        query = supabase.table(tabella).select("*")
+        for colonna in ordine:
+            query = query.order(colonna)
+        response = query.range(start, start + PAGE_SIZE - 1).execute()
+        data = response.data or []
+        righe.extend(data)
+        if len(data) < PAGE_SIZE:
+            return righe
+        start += PAGE_SIZE
+
+
+def _costruisci(righe: List[dict]) -> Tuple[dict, dict]:
+    """Costruisce gli array ordinati per chiave"""
+    gruppi_tipo: Dict[tuple, list] = {}
+    gruppi_fermata: Dict[tuple, list] = {}
+
+    for riga in righe:
+        ora = riga.get("ora")
+        if not ora:
+            continue
+        riga = dict(riga)
+        riga["ora"] = ora[:5]  # "16:30:00" -> "16:30"
+        minuti = _minuti(ora)
+        chiave = (riga.get("linea_codice"), riga.get("fermata_nome"), riga.get("direzione"))
+        gruppi_tipo.setdefault(chiave + (riga.get("tipo_giorno"),), []).append((minuti, riga))
+        gruppi_fermata.setdefault(chiave, []).append((minuti, riga))
+
+    def compatta(gruppi):
+        indice = {}
+        for chiave, voci in gruppi.items():
+            voci.sort(key=lambda v: v[0])
+            indice[chiave] = ([v[0] for v in voci], [v[1] for v in voci])
+        return indice
+
+    return compatta(gruppi_tipo), compatta(gruppi_fermata)
+
+
+def carica(versione: Optional[tuple] = None) -> bool:
+    """Carica (o ricarica) l'intera tabella e sostituisce l'indice"""
+    global _indice
+    try:
+        t0 = time.perf_counter()
+        righe = _carica_righe()
+        per_tipo, per_fermata = _costruisci(righe)
+        _indice = {
+            "per_tipo": per_tipo,
+            "per_fermata": per_fermata,
+            "versione": versione if versione is not None else _versione(),
+            "righe": len(righe),
+            "loaded_at": time.time()
+        }
+        logger.info(f"Indice orari caricato: {len(righe)} righe, {len(per_tipo)} chiavi in {(time.perf_counter() - t0) * 1000:.0f}ms")
+        return True
+    except Exception as e:
+        logger.error(f"Errore caricamento indice orari: {e}")
+        return False
+
+
+def _costruisci_fermate(righe: List[dict]) -> Tuple[dict, dict, dict]:
+    """Raggruppa le fermate per linea: lookup per nome, ordine di linea, offset dal capolinea"""
+    ordinate: Dict[str, list] = {}
+    for riga in righe:
+        ordinate.setdefault(riga.get("linea_codice"), []).append(riga)
+
+    per_nome = {}
+    offset = {}
+    for linea, fermate in ordinate.items():
+        fermate.sort(key=lambda f: f.get("ordine") or 0)
+        per_nome[linea] = {}
+        offset[linea] = {}
+        for fermata in fermate:
+            nome = fermata.get("nome")
+            if nome in per_nome[linea]:
+                continue  # come la query originale: prima fermata con quel nome
+            per_nome[linea][nome] = fermata
+            offset[linea][nome] = fermata.get("tempo_da_capolinea", 0) or 0
+
+    return per_nome, ordinate, offset
+
+
+def carica_fermate(versione: Optional[tuple] = None) -> bool:
+    """Carica (o ricarica) fermate_bus e sostituisce l'indice fermate"""
+    global _fermate
+    try:
+        righe = _carica_righe("fermate_bus", ("linea_codice", "ordine"))
+        per_nome, ordinate, offset = _costruisci_fermate(righe)
+        _fermate = {
+            "per_nome": per_nome,
+            "ordinate": ordinate,
+            "offset": offset,
+            "versione": versione if versione is not None else _versione("fermate_bus"),
+            "righe": len(righe),
+            "loaded_at": time.time()
+        }
+        logger.info(f"Indice fermate caricato: {len(righe)} fermate su {len(ordinate)} linee")
+        return True
+    except Exception as e:
+        logger.error(f"Errore caricamento indice fermate: {e}")
+        return False
+
+
+def refresh() -> bool:
+    """Ricarica gli indici solo se la versione dei dati è cambiata. Ritorna True se ricaricato."""
+    ricaricato = False
+
+    versione = _versione()
+    if versione is None or versione != _indice["versione"] or not _indice["loaded_at"]:
+        ricaricato = carica(versione) or ricaricato
+
+    versione = _versione("fermate_bus")
+    if versione is None or versione != _fermate["versione"] or not _fermate["loaded_at"]:
+        ricaricato = carica_fermate(versione) or ricaricato
+
+    return ricaricato
+
+
+def is_loaded() -> bool:
+    return _indice["loaded_at"] > 0
+
+
+def fermate_loaded() -> bool:
+    return _fermate["loaded_at"] > 0
+
+
+def get_stats() -> dict:
+    return {
+        "righe": _indice["righe"],
+        "chiavi": len(_indice["per_tipo"]),
+        "fermate": _fermate["righe"],
+        "loaded_at": _indice["loaded_at"]
+    }
+
+
+def prossimi_orari(linea_codice: str, fermata_nome: str, direzione: str, ora_min: str,
+                   tipo_giorno: str, limit: int) -> Optional[list]:
+    """
+    Prossime `limit` corse da ora_min (HH:MM[:SS]); se non ce ne sono più oggi,
+    le prime `limit` di domani marcate con "domani": True.
+    None se l'indice non è caricato (il chiamante usa il database).
+    """
+    if not is_loaded():
+        return None
+
+    voce = _indice["per_tipo"].get((linea_codice, fermata_nome, direzione, tipo_giorno))
+    if not voce:
+        return []
+
+    minuti, righe = voce
+    i = bisect.bisect_left(minuti, _minuti_da(ora_min))
+    if i < len(righe):
+        return [dict(r) for r in righe[i:i + limit]]
+
+    return [dict(r, domani=True) for r in righe[:limit]]
+
+
+def orari_fermata(linea_codice: str, fermata_nome: str, direzione: str,
+                  ora_min: Optional[str], limit: int) -> Optional[list]:
+    """
+    Corse di una fermata (tutti i tipi giorno) da ora_min, o tutte se ora_min è None.
+    None se l'indice non è caricato.
+    """
+    if not is_loaded():
+        return None
+
+    voce = _indice["per_fermata"].get((linea_codice, fermata_nome, direzione))
+    if not voce:
+        return []
+
+    minuti, righe = voce
+    i = bisect.bisect_left(minuti, _minuti_da(ora_min)) if ora_min else 0
+    return [dict(r) for r in righe[i:i + limit]]
+
+
+def fermata(linea_codice: str, fermata_nome: str) -> Optional[dict]:
+    """Riga fermate_bus di una fermata (None se non esiste)"""
+    riga = _fermate["per_nome"].get(linea_codice, {}).get(fermata_nome)
+    return dict(riga) if riga else None
+
+
+def fermate_linea(linea_codice: str) -> list:
+    """Fermate di una linea ordinate per "ordine" """
+    return [dict(r) for r in _fermate["ordinate"].get(linea_codice, [])]
+
+
+def tempo_tra_fermate(linea_codice: str, fermata_partenza: str, fermata_arrivo: str) -> Optional[int]:
+    """Minuti tra due fermate della stessa linea (None se una delle due non esiste)"""
+    offset = _fermate["offset"].get(linea_codice)
+    if not offset:
+        return None
+    tempo_p = offset.get(fermata_partenza)
+    tempo_a = offset.get(fermata_arrivo)
+    if tempo_p is None or tempo_a is None:
+        return None
+    return abs(tempo_a - tempo_p)
+
+
+def arrivo_fermata(ora_partenza: str, linea_codice: str, fermata_partenza: str, fermata_arrivo: str) -> Optional[str]:
+    """Orario di arrivo (HH:MM) dato l'orario di partenza (HH:MM)"""
+    tempo = tempo_tra_fermate(linea_codice, fermata_partenza, fermata_arrivo)
+    if tempo is None:
+        return None
+    h, m = map(int, ora_partenza.split(":")[:2])
+    minuti = (h * 60 + m + tempo) % (24 * 60)
+    return f"{minuti // 60:02d}:{minuti % 60:02d}"
+
+
+def get_snapshot() -> Tuple[dict, dict]:
+    """Riferimenti correnti agli indici orari e fermate (da non modificare)"""
+    return _indice, _fermate
@@ -0,0 +1,407 @@
+"""
+Journey planner su orari reali (Connection Scan Algorithm)
+
+Rete costruita una volta dagli indici in memoria di orari_index (orari_bus +
+fermate_bus) per le linee bus 23A/23B/96 e i traghetti 12/14/15, usando solo
+gli orari reali di orari_bus (nessun orario ricavato da offset):
+- fermate di ogni linea/direzione nell'ordine di fermate_bus; per le linee che
+  non ci sono (traghetti) l'ordine è ricavato dagli orari stessi
+- orari_bus non ha un id corsa: le corse sono ricostruite concatenando ogni
+  orario a una fermata con l'orario alla fermata successiva più vicino al tempo
+  di percorrenza tipico (mediana dei distacchi osservati), entro TOLLERANZA_MINUTI
+- ogni corsa diventa una sequenza di connessioni tra orari reali consecutivi
+- tutte le connessioni sono ordinate per orario di partenza, una lista per
+  giorni feriali (tipo_giorno con "f") e una per festivi (con "F"); domeniche
+  e festività nazionali usano la lista festiva
+
+Una query "arrivo più presto" è una sola scansione lineare delle connessioni
+a partire dalla bisect sull'orario richiesto, con cambi reali tra bus e
+traghetto (tempo minimo di cambio a Punta Sabbioni). A parità di arrivo viene
+proposta la partenza più tardi, così non si aspetta un'ora all'imbarcadero.
+"""
+import bisect
+import logging
+import time
+from datetime import date, timedelta
+from typing import Optional, Dict, List
+
+import orari_index
+
+logger = logging.getLogger(__name__)
+
+LINEE_BUS = ("23A", "23B", "96")
+LINEE_TRAGHETTO = ("12", "14", "15")
+
+# Minuti minimi per cambiare mezzo (es. bus -> imbarcadero)
+CAMBIO_MINUTI = 5
+
+# Scarto massimo (minuti) dal tempo di percorrenza tipico per legare due orari alla stessa corsa
+TOLLERANZA_MINUTI = 10
+
+# Festività nazionali fisse (giorno, mese); Pasquetta è calcolata per anno
+FESTIVITA_FISSE = {(1, 1), (6, 1), (25, 4), (1, 5), (2, 6), (15, 8), (1, 11), (8, 12), (25, 12), (26, 12)}
+
+# Zona di partenza -> fermata (come _get_next_departures)
+ZONA_FERMATA = {
+    "cavallino": "Cavallino",
+    "ca_savio": "Ca' Savio",
+    "punta_sabbioni": "Punta Sabbioni",
+    "treporti": "Punta Sabbioni",
+    "ca_pasquali": "Ca' Pasquali",
+    "ca_vio": "Ca' Vio",
+    "ca_ballarin": "Ca' Ballarin",
+    "ca_di_valle": "Ca' Ballarin",
+}
+
+# Destinazione -> fermata di arrivo
+DESTINAZIONE_FERMATA = {
+    "venezia": "San Marco",
+    "lido": "Lido S.M.E.",
+    "burano": "Burano",
+    "murano": "Murano Faro",
+}
+
+_INF = 10 ** 9
+
+# Rete corrente, sostituita in blocco ad ogni ricostruzione
+_rete = {
+    "fermate": [],          # id -> nome
+    "fermata_id": {},       # nome -> id
+    "linee": [],            # id -> codice linea
+    "connessioni": {},      # "feriale"/"festivo" -> dict di liste parallele
+    "indice_loaded_at": 0,
+    "fermate_loaded_at": 0,
+    "built_at": 0
+}
+
+
+def _minuti_str(minuti: int) -> str:
+    minuti %= 24 * 60
+    return f"{minuti // 60:02d}:{minuti % 60:02d}"
+
+
+def _mediana(valori: List[int]) -> Optional[int]:
+    if not valori:
+        return None
+    valori = sorted(valori)
+    return valori[len(valori) // 2]
+
+
+def _ordine_fermate(linea: str, direzione: str, orari: Dict[str, List[int]], fermate: dict) -> List[str]:
+    """Fermate con orari nell'ordine di percorrenza (fermate_bus, altrimenti dagli orari)"""
+    ordinate = fermate["ordinate"].get(linea)
+    if ordinate:
+        nomi = list(dict.fromkeys(f.get("nome") for f in ordinate))
+        if direzione == "ritorno":
+            nomi.reverse()
+        return [nome for nome in nomi if nome in orari]
+
+    # Senza fermate_bus: capolinea = fermata con la prima partenza del giorno,
+    # le altre ordinate per distacco mediano dall'ultima partenza dal capolinea
+    capolinea = min(orari, key=lambda nome: orari[nome][0])
+    partenze = orari[capolinea]
+    distacchi = {}
+    for nome, minuti in orari.items():
+        valori = []
+        for m in minuti:
+            k = bisect.bisect_right(partenze, m) - 1
+            if k >= 0:
+                valori.append(m - partenze[k])
+        distacchi[nome] = _mediana(valori)
+    return sorted((nome for nome in orari if distacchi[nome] is not None), key=lambda nome: distacchi[nome])
+
+
+def _percorrenza(da: List[int], a: List[int], prevista: Optional[int]) -> Optional[int]:
+    """Minuti tipici tra due fermate: offset di fermate_bus o mediana dei distacchi osservati"""
+    if prevista is not None and prevista > 0:
+        return prevista
+    distacchi = []
+    for m in da:
+        k = bisect.bisect_right(a, m)
+        if k < len(a):
+            distacchi.append(a[k] - m)
+    return _mediana(distacchi)
+
+
+def _corse(fermate_ordinate: List[str], orari: Dict[str, List[int]], offset: Dict[str, int]) -> List[List[tuple]]:
+    """
+    Corse come liste di (fermata, minuti) consecutivi: ogni orario è legato al primo
+    orario libero della fermata successiva entro TOLLERANZA_MINUTI dalla percorrenza tipica.
+    """
+    aperte: Dict[int, list] = {}    # minuto alla fermata corrente -> corsa in corso
+    corse = []
+    for k, nome in enumerate(fermate_ordinate):
+        minuti = orari[nome]
+        if k:
+            precedente = fermate_ordinate[k - 1]
+            prevista = None
+            if precedente in offset and nome in offset:
+                prevista = abs(offset[nome] - offset[precedente])
+            durata = _percorrenza(orari[precedente], minuti, prevista)
+        liberi = list(minuti)
+        nuove: Dict[int, list] = {}
+        if k and durata is not None:
+            for m in sorted(aperte):
+                atteso = m + durata
+                j = bisect.bisect_left(liberi, atteso - TOLLERANZA_MINUTI)
+                candidati = [v for v in liberi[j:j + 2 * TOLLERANZA_MINUTI + 1]
+                             if v > m and abs(v - atteso) <= TOLLERANZA_MINUTI]
+                if not candidati:
+                    continue
+                scelto = min(candidati, key=lambda v: abs(v - atteso))
+                liberi.remove(scelto)
+                corsa = aperte[m]
+                corsa.append((nome, scelto))
+                nuove[scelto] = corsa
+        # Orari non legati a una corsa precedente: corse che iniziano qui
+        for m in liberi:
+            corsa = [(nome, m)]
+            corse.append(corsa)
+            nuove[m] = corsa
+        aperte = nuove
+    return [corsa for corsa in corse if len(corsa) > 1]
+
+
+def costruisci() -> bool:
+    """Ricostruisce la rete dagli indici correnti. False se gli orari non sono caricati."""
+    global _rete
+    indice, fermate = orari_index.get_snapshot()
+    if not indice["loaded_at"]:
+        return False
+
+    t0 = time.perf_counter()
+    nomi: List[str] = []
+    fermata_id: Dict[str, int] = {}
+    linee = list(LINEE_BUS + LINEE_TRAGHETTO)
+    linea_id = {l: i for i, l in enumerate(linee)}
+
+    def id_fermata(nome: str) -> int:
+        if nome not in fermata_id:
+            fermata_id[nome] = len(nomi)
+            nomi.append(nome)
+        return fermata_id[nome]
+
+    # Orari reali per (linea, direzione, tipo giorno rete) -> fermata -> minuti ("fF" vale per entrambi)
+    orari: Dict[tuple, Dict[str, set]] = {}
+    for (linea, fermata, direzione, tipo_giorno), (minuti, _) in indice["per_tipo"].items():
+        if linea not in linea_id:
+            continue
+        for tipo, c in (("feriale", "f"), ("festivo", "F")):
+            if c in (tipo_giorno or "fF"):
+                orari.setdefault((linea, direzione, tipo), {}).setdefault(fermata, set()).update(minuti)
+
+    grezze = {"feriale": [], "festivo": []}
+    n_corse = 0
+    scartate = 0
+    for (linea, direzione, tipo), per_fermata in orari.items():
+        per_fermata = {nome: sorted(minuti) for nome, minuti in per_fermata.items()}
+        ordine = _ordine_fermate(linea, direzione, per_fermata, fermate)
+        scartate += sum(len(m) for nome, m in per_fermata.items() if nome not in ordine)
+        if len(ordine) < 2:
+            continue
+        for corsa in _corse(ordine, per_fermata, fermate["offset"].get(linea, {})):
+            for (da, t_da), (a, t_a) in zip(corsa, corsa[1:]):
+                grezze[tipo].append((t_da, t_a, id_fermata(da), id_fermata(a), n_corse, linea_id[linea]))
+            n_corse += 1
+
+    connessioni = {}
+    for tipo, lista in grezze.items():
+        lista.sort()
+        connessioni[tipo] = {
+            "partenza": [c[0] for c in lista],
+            "arrivo": [c[1] for c in lista],
+            "da": [c[2] for c in lista],
+            "a": [c[3] for c in lista],
+            "corsa": [c[4] for c in lista],
+            "linea": [c[5] for c in lista],
+            "corse": len({c[4] for c in lista})
+        }
+
+    _rete = {
+        "fermate": nomi,
+        "fermata_id": fermata_id,
+        "linee": linee,
+        "connessioni": connessioni,
+        "indice_loaded_at": indice["loaded_at"],
+        "fermate_loaded_at": fermate["loaded_at"],
+        "built_at": time.time()
+    }
+    logger.info(f"Rete percorsi costruita: {n_corse} corse, {len(grezze['feriale'])} connessioni feriali, "
+                f"{len(grezze['festivo'])} festive, {scartate} orari senza fermata in {(time.perf_counter() - t0) * 1000:.0f}ms")
+    if scartate:
+        logger.warning(f"Rete percorsi: {scartate} orari su fermate non presenti nelle tratte")
+    return True
+
+
+def _rete_corrente() -> Optional[dict]:
+    """Rete aggiornata agli indici correnti (ricostruita se gli indici sono cambiati)"""
+    indice, fermate = orari_index.get_snapshot()
+    if not indice["loaded_at"]:
+        return None
+    if _rete["indice_loaded_at"] != indice["loaded_at"] or _rete["fermate_loaded_at"] != fermate["loaded_at"]:
+        costruisci()
+    return _rete
+
+
+# anno -> festività (date), calcolate una volta per anno
+_festivita: Dict[int, set] = {}
+
+
+def _pasqua(anno: int) -> date:
+    """Domenica di Pasqua (calendario gregoriano, algoritmo di Meeus/Jones/Butcher)"""
+    a, b, c = anno % 19, anno // 100, anno % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mese, giorno = divmod(h + l - 7 * m + 114, 31)
+    return date(anno, mese, giorno + 1)
+
+
+def _is_festivo(giorno: date) -> bool:
+    """Domeniche e festività nazionali (orari tipo_giorno "F")"""
+    if giorno.weekday() == 6:
+        return True
+    festivi = _festivita.get(giorno.year)
+    if festivi is None:
+        festivi = {date(giorno.year, m, g) for g, m in FESTIVITA_FISSE}
+        festivi.add(_pasqua(giorno.year) + timedelta(days=1))  # Pasquetta
+        _festivita[giorno.year] = festivi
+    return giorno in festivi
+
+
+def percorso(origine: str, destinazione: str, minuti: int, festivo: bool = False,
+             linea_bus: str = None) -> Optional[List[dict]]:
+    """
+    Percorso con arrivo più presto da `origine` a `destinazione` partendo da `minuti`
+    (minuti dalla mezzanotte). linea_bus limita i bus a quella linea.
+
+    Returns:
+        Lista di tratte [{linea, tipo, da, a, partenza, arrivo, partenza_min, arrivo_min}, ...]
+        o None se la destinazione non è raggiungibile in giornata
+    """
+    rete = _rete_corrente()
+    if not rete:
+        return None
+
+    s = rete["fermata_id"].get(origine)
+    target = rete["fermata_id"].get(destinazione)
+    if s is None or target is None or s == target:
+        return None
+
+    c = rete["connessioni"]["festivo" if festivo else "feriale"]
+    partenza, arrivo, da, a, corsa, linea = c["partenza"], c["arrivo"], c["da"], c["a"], c["corsa"], c["linea"]
+
+    escluse = set()
+    if linea_bus:
+        escluse = {i for i, l in enumerate(rete["linee"]) if l in LINEE_BUS and l != linea_bus}
+
+    n_fermate = len(rete["fermate"])
+    pronto = [_INF] * n_fermate       # minuto da cui si può salire alla fermata
+    arrivo_min = [_INF] * n_fermate   # arrivo più presto alla fermata
+    tratta_arrivo = [None] * n_fermate  # (connessione di salita, connessione di discesa)
+    salita: Dict[int, int] = {}       # corsa -> connessione di salita
+
+    pronto[s] = minuti
+    arrivo_min[s] = minuti
+
+    for i in range(bisect.bisect_left(partenza, minuti), len(partenza)):
+        if partenza[i] >= arrivo_min[target]:
+            break
+        trip = corsa[i]
+        if trip not in salita:
+            if pronto[da[i]] > partenza[i] or linea[i] in escluse:
+                continue
+            salita[trip] = i
+        f = a[i]
+        if arrivo[i] < arrivo_min[f]:
+            arrivo_min[f] = arrivo[i]
+            pronto[f] = arrivo[i] + CAMBIO_MINUTI
+            tratta_arrivo[f] = (salita[trip], i)
+
+    if tratta_arrivo[target] is None:
+        return None
+
+    # Ricostruzione a ritroso dalle tratte di arrivo
+    tratte = []
+    f = target
+    while f != s:
+        sale, scende = tratta_arrivo[f]
+        codice = rete["linee"][linea[sale]]
+        tratte.append({
+            "linea": codice,
+            "tipo": "bus" if codice in LINEE_BUS else "traghetto",
+            "da": rete["fermate"][da[sale]],
+            "a": rete["fermate"][a[scende]],
+            "partenza": _minuti_str(partenza[sale]),
+            "arrivo": _minuti_str(arrivo[scende]),
+            "partenza_min": partenza[sale],
+            "arrivo_min": arrivo[scende]
+        })
+        f = da[sale]
+    tratte.reverse()
+    return tratte
+
+
+def prossimi_percorsi(origine: str, destinazione: str, ora: str = None, n: int = 3,
+                      giorno: date = None, linea_bus: str = None) -> List[dict]:
+    """
+    Prossimi N percorsi (partenze successive) da `ora` (HH:MM); se in giornata non
+    ce ne sono più, i primi di domani marcati con "domani": True.
+
+    Returns:
+        [{tratte, partenza, arrivo, durata, domani}, ...]  ([] se nessun percorso o rete non caricata)
+    """
+    from datetime import datetime
+    import pytz
+
+    now = datetime.now(pytz.timezone("Europe/Rome"))
+    giorno = giorno or now.date()
+    if ora:
+        h, m = map(int, ora.replace("-", ":").split(":")[:2])
+        minuti = h * 60 + m
+    else:
+        minuti = now.hour * 60 + now.minute
+
+    risultati = []
+    domani = False
+    while len(risultati) < n:
+        tratte = percorso(origine, destinazione, minuti, _is_festivo(giorno), linea_bus)
+        if not tratte:
+            if risultati or domani:
+                break
+            # Nessun percorso oggi: prime partenze di domani
+            domani = True
+            giorno += timedelta(days=1)
+            minuti = 0
+            continue
+
+        # Stesso arrivo con una partenza più tardi: meno attesa al cambio
+        while True:
+            dopo = percorso(origine, destinazione, tratte[0]["partenza_min"] + 1, _is_festivo(giorno), linea_bus)
+            if not dopo or dopo[-1]["arrivo_min"] != tratte[-1]["arrivo_min"]:
+                break
+            tratte = dopo
+
+        risultati.append({
+            "tratte": tratte,
+            "partenza": tratte[0]["partenza"],
+            "arrivo": tratte[-1]["arrivo"],
+            "durata": tratte[-1]["arrivo_min"] - tratte[0]["partenza_min"],
+            "domani": domani
+        })
+        minuti = tratte[0]["partenza_min"] + 1
+
+    return risultati
+
+
+def get_stats() -> dict:
+    feriale = _rete["connessioni"].get("feriale", {})
+    return {
+        "corse": feriale.get("corse", 0),
+        "connessioni": len(feriale.get("partenza", [])),
+        "fermate": len(_rete["fermate"]),
+        "built_at": _rete["built_at"]
+    }
@@ -0,0 +1,134 @@
+"""
+Snapshot in memoria dei dati di riferimento trasporti
+
+Tabelle che cambiano poche volte a stagione (zone, destinazioni, operatori,
+linee, tariffe, percorsi): caricate tutte all'avvio in uno snapshot con indici
+per id e per codice, sostituito in blocco (swap atomico) dal job di refresh o
+dal comando admin /reload. Il refresh confronta prima una versione economica
+per tabella (max updated_at + numero righe) e ricarica solo se è cambiata.
+Se la tabella è nel mirror SQLite (mirror.py) versione e righe vengono da lì,
+così lo snapshot segue il sync del mirror e si carica anche con Supabase giù.
+
+Le righe dello snapshot non vanno modificate: le funzioni di database.py
+restituiscono copie.
+"""
+import logging
+import time
+from typing import Optional, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tabella -> (select, colonna di ordinamento), come le query di database.py
+TABELLE = {
+    "zone": ("*", "ordine_geografico"),
+    "destinazioni": ("*", "ordine"),
+    "operatori": ("*", "nome"),
+    "linee": ("*, operatori(nome, sito_web)", "codice"),
+    "tariffe": ("*", "prezzo"),
+    "percorsi": ("*, linee(nome, tipo, operatori(nome, link))", "durata"),
+}
+
+_snapshot = {
+    "tabelle": {},       # tabella -> tuple di righe ordinate
+    "per_id": {},        # tabella -> {id: riga}
+    "per_codice": {},    # tabella -> {codice: riga}
+    "versioni": {},      # tabella -> versione al caricamento
+    "loaded_at": 0
+}
+_stats = {"ricariche": 0, "controlli": 0, "ultimo_ms": 0.0}
+
+
+def _versione(tabella: str) -> Optional[Tuple]:
+    """Versione economica: (max updated_at, righe), o (max id, righe) se la tabella non ha updated_at"""
+    import mirror
+    versione = mirror.versione(tabella)
+    if versione is not None:
+        return ("mirror",) + versione
+
+    from database import supabase
+    for colonna in ("updated_at", "id"):
+        try:
+            response = supabase.table(tabella) \
+                .select(colonna, count="exact") \
+                .order(colonna, desc=True) \
+                .limit(1) \
+                .execute()
+            massimo = response.data[0][colonna] if response.data else None
+            return (colonna, massimo, response.count or 0)
+        except Exception:
+            continue
+    logger.warning(f"Versione {tabella} non disponibile")
+    return None
+
+
+def _ordina(righe: List[dict], colonna: str) -> Tuple[dict, ...]:
+    """Ordina come .order(colonna) di PostgREST (NULL in fondo)"""
+    return tuple(sorted(righe, key=lambda r: (r.get(colonna) is None, r.get(colonna) if r.get(colonna) is not None else 0)))
+
+
+def carica(versioni: Optional[dict] = None) -> bool:
+    """Carica tutte le tabelle e sostituisce lo snapshot"""
+    global _snapshot
+    import mirror
+    from database import supabase
+    try:
+        t0 = time.perf_counter()
+        tabelle = {}
+        for tabella, (select, ordine) in TABELLE.items():
+            data = mirror.righe(tabella)
+            if data is None:
+                data = supabase.table(tabella).select(select).execute().data
+            tabelle[tabella] = _ordina(data or [], ordine)
+
+        _snapshot = {
+            "tabelle": tabelle,
+            "per_id": {t: {r["id"]: r for r in righe if "id" in r} for t, righe in tabelle.items()},
+            "per_codice": {t: {r["codice"]: r for r in righe if r.get("codice")} for t, righe in tabelle.items()},
+            "versioni": versioni if versioni is not None else {t: _versione(t) for t in TABELLE},
+            "loaded_at": time.time()
+        }
+        _stats["ricariche"] += 1
+        _stats["ultimo_ms"] = (time.perf_counter() - t0) * 1000
+        logger.info(f"Dati di riferimento caricati: "
+                    f"{', '.join(f'{t} {len(r)}' for t, r in tabelle.items())} in {_stats['ultimo_ms']:.0f}ms")
+        return True
+    except Exception as e:
+        logger.error(f"Errore caricamento dati di riferimento: {e}")
+        return False
+
+
+def refresh(force: bool = False) -> bool:
+    """Ricarica lo snapshot se una tabella è cambiata (o sempre con force). True se ricaricato."""
+    _stats["controlli"] += 1
+    versioni = {t: _versione(t) for t in TABELLE}
+    if not force and _snapshot["loaded_at"] and None not in versioni.values() \
+            and versioni == _snapshot["versioni"]:
+        return False
+    return carica(versioni)
+
+
+def is_loaded() -> bool:
+    return _snapshot["loaded_at"] > 0
+
+
+def righe(tabella: str) -> Tuple[dict, ...]:
+    """Tutte le righe di una tabella, nell'ordine delle query originali"""
+    return _snapshot["tabelle"].get(tabella, ())
+
+
+def per_id(tabella: str, id_riga) -> Optional[dict]:
+    return _snapshot["per_id"].get(tabella, {}).get(id_riga)
+
+
+def per_codice(tabella: str, codice: str) -> Optional[dict]:
+    return _snapshot["per_codice"].get(tabella, {}).get(codice)
+
+
+def get_stats() -> dict:
+    return {
+        "righe": {t: len(r) for t, r in _snapshot["tabelle"].items()},
+        "loaded_at": _snapshot["loaded_at"],
+        "ricariche": _stats["ricariche"],
+        "controlli": _stats["controlli"],
+        "ultimo_ms": _stats["ultimo_ms"]
+    }
@@ -0,0 +1,202 @@
+"""
+Router callback_data: tabella dichiarativa di rotte su un trie di prefissi
+
+Ogni rotta è un prefisso (o una callback esatta) più un pattern per i parametri:
+    "tras_percorso_{destinazione_id:int}_{zona_id:zona?}_{linea_codice:str=23A}"
+
+Il testo prima del primo "{" è il prefisso (finisce sempre con "_"), inserito nel
+trie segmento per segmento; il resto è compilato una volta in una regex con
+convertitori tipizzati. La ricerca divide callback_data sui "_" e scende nel trie
+(O(lunghezza)), poi prova le rotte dal prefisso più lungo al più corto: se i
+parametri non sono validi si passa al prefisso più corto, come facevano gli
+if/startswith in sequenza.
+
+Tipi dei parametri (i segmenti sono separati da "_", come nello split di prima):
+- int     segmento convertito con int()
+- id      tutto il testo rimanente convertito con int()
+- num     solo cifre (come \\d+ nelle vecchie regex)
+- str     segmento senza "_"
+- w       caratteri di parola, anche "_" (come \\w+)
+- resto   tutto il testo rimanente, anche vuoto
+- zona    int, con "0" che vale None (nessuna zona)
+- ora     "HH-MM" -> "HH:MM", qualsiasi altro valore ("now") -> None
+- hhmm    come ora ma solo con esattamente 5 caratteri
+
+Altri tipi si aggiungono con registra_tipo (es. le callback compatte di
+callback_codec.py).
+
+"?" rende il parametro opzionale (None se manca), "=valore" gli dà un default;
+i parametri opzionali vanno in fondo. I segmenti in più in coda sono ignorati.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Tuple, NamedTuple
+
+# tipo -> (regex del segmento, convertitore)
+TIPI: Dict[str, Tuple[str, Callable]] = {
+    "int": (r"[^_]*", int),
+    "id": (r".*", int),
+    "num": (r"\d+", int),
+    "str": (r"[^_]*", str),
+    "w": (r"\w+", str),
+    "resto": (r".*", str),
+    "zona": (r"[^_]*", lambda v: None if v == "0" else int(v)),
+    "ora": (r"[^_]*", lambda v: v.replace("-", ":") if "-" in v else None),
+    "hhmm": (r"[^_]*", lambda v: v.replace("-", ":") if "-" in v and len(v) == 5 else None),
+}
+
+
+def registra_tipo(nome: str, segmento: str, converti: Callable) -> None:
+    """Aggiunge un tipo di parametro (prima di registrare le rotte che lo usano)"""
+    TIPI[nome] = (segmento, converti)
+
+
+_PARAMETRO = re.compile(r"\{(\w+):(\w+)(\?|=[^}]*)?\}")
+
+
+class Rotta(NamedTuple):
+    """Rotta registrata (introspezione: Router.rotte())"""
+    pattern: str
+    prefisso: str
+    esatta: bool
+    gestore: Callable
+    fissi: dict                    # parametri costanti passati al gestore
+    registra_update: bool          # db.queue_last_update_id dopo il gestore
+    regex: Optional["re.Pattern"]
+    convertitori: tuple            # (nome, convertitore, default, opzionale), nell'ordine dei gruppi
+    segmenti_max: Optional[int]    # segmenti dopo il prefisso oltre cui la rotta non vale
+
+    def parametri(self, resto: str) -> Optional[dict]:
+        """Parametri tipizzati dal testo dopo il prefisso (None se non validi)"""
+        if self.segmenti_max is not None and resto.count("_") >= self.segmenti_max:
+            return None
+        if self.regex is None:
+            return dict(self.fissi)
+        match = self.regex.match(resto)
+        if not match:
+            return None
+        parametri = dict(self.fissi)
+        try:
+            for (nome, converti, default, _), valore in zip(self.convertitori, match.groups()):
+                parametri[nome] = default if valore is None else converti(valore)
+        except (ValueError, TypeError):
+            return None
+        return parametri
+
+
+def _compila(pattern: str) -> Tuple[str, Optional["re.Pattern"], tuple]:
+    """Pattern -> (prefisso, regex dei parametri, convertitori)"""
+    inizio = pattern.find("{")
+    if inizio < 0:
+        return pattern, None, ()
+
+    regex = ""
+    convertitori = []
+    posizione = inizio
+    opzionali = 0
+    for match in _PARAMETRO.finditer(pattern, inizio):
+        letterale = pattern[posizione:match.start()]
+        nome, tipo, modificatore = match.groups()
+        if tipo not in TIPI:
+            raise ValueError(f"Tipo parametro sconosciuto in {pattern}: {tipo}")
+        segmento, converti = TIPI[tipo]
+        gruppo = f"(?P<{nome}>{segmento})"
+        if modificatore:
+            default = converti(modificatore[1:]) if modificatore.startswith("=") else None
+            regex += f"(?:{re.escape(letterale)}{gruppo}"
+            opzionali += 1
+        else:
+            if opzionali:
+                raise ValueError(f"Parametro obbligatorio dopo uno opzionale in {pattern}")
+            default = None
+            regex += re.escape(letterale) + gruppo
+        convertitori.append((nome, converti, default, bool(modificatore)))
+        posizione = match.end()
+    if pattern[posizione:]:
+        raise ValueError(f"Testo dopo l'ultimo parametro in {pattern}")
+    # Gruppi opzionali annidati: ognuno esiste solo se c'è il precedente
+    regex += ")?" * opzionali
+    return pattern[:inizio], re.compile(regex, re.DOTALL), tuple(convertitori)
+
+
+class _Nodo:
+    __slots__ = ("figli", "esatta", "prefissi")
+
+    def __init__(self):
+        self.figli: Dict[str, "_Nodo"] = {}
+        self.esatta: Optional[Rotta] = None
+        self.prefissi: List[Rotta] = []
+
+
+class Router:
+    """Trie dei segmenti di callback_data -> rotte"""
+
+    def __init__(self):
+        self._radice = _Nodo()
+        self._rotte: List[Rotta] = []
+
+    def aggiungi(self, pattern: str, gestore: Callable, esatta: bool = None,
+                 registra_update: bool = True, segmenti_max: int = None, **fissi) -> Rotta:
+        """
+        Registra una rotta. Senza parametri nel pattern la rotta è esatta
+        (callback_data == pattern); esatta=False la rende un prefisso senza parametri.
+        segmenti_max limita i segmenti dopo il prefisso (formati vecchi più corti).
+        I parametri fissi sono passati al gestore insieme a quelli del pattern.
+        """
+        prefisso, regex, convertitori = _compila(pattern)
+        if esatta is None:
+            esatta = regex is None
+        rotta = Rotta(pattern, prefisso, esatta, gestore, fissi, registra_update,
+                      regex, convertitori, segmenti_max)
+
+        if esatta:
+            segmenti = prefisso.split("_")
+        else:
+            if not prefisso.endswith("_"):
+                raise ValueError(f"Il prefisso deve finire con '_': {pattern}")
+            segmenti = prefisso[:-1].split("_")
+        nodo = self._radice
+        for segmento in segmenti:
+            nodo = nodo.figli.setdefault(segmento, _Nodo())
+        if esatta:
+            if nodo.esatta is not None:
+                raise ValueError(f"Rotta duplicata: {pattern}")
+            nodo.esatta = rotta
+        else:
+            nodo.prefissi.append(rotta)
+        self._rotte.append(rotta)
+        return rotta
+
+    def trova(self, callback_data: str) -> Optional[Tuple[Rotta, dict]]:
+        """(rotta, parametri) per callback_data, None se nessuna rotta corrisponde"""
+        segmenti = callback_data.split("_")
+        ultimo = len(segmenti) - 1
+        nodo = self._radice
+        candidati = []
+        posizione = 0
+        for i, segmento in enumerate(segmenti):
+            nodo = nodo.figli.get(segmento)
+            if nodo is None:
+                break
+            posizione += len(segmento) + 1
+            if i == ultimo:
+                if nodo.esatta is not None:
+                    return nodo.esatta, dict(nodo.esatta.fissi)
+            elif nodo.prefissi:
+                # Prefisso "<segmenti>_": il resto inizia dopo il separatore
+                candidati.append((posizione, nodo))
+
+        # Dal prefisso più lungo al più corto; a parità, in ordine di registrazione
+        for posizione, nodo in reversed(candidati):
+            resto = callback_data[posizione:]
+            for rotta in nodo.prefissi:
+                parametri = rotta.parametri(resto)
+                if parametri is not None:
+                    return rotta, parametri
+        return None
+
+    def rotte(self) -> List[Rotta]:
+        """Rotte registrate, in ordine di registrazione"""
+        return list(self._rotte)
+
+    def __len__(self) -> int:
+        return len(self._rotte)
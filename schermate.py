@@ -0,0 +1,92 @@
+"""
+Cache delle schermate statiche pre-renderizzate (testo HTML + tastiera)
+
+Le schermate che dipendono solo da lingua, dati costanti di handlers.py e testi
+del database (spiagge, ristoranti, fortini, idee...) sono costruite una volta
+per (schermata, lingua, parametri) e servite con un lookup su dict.
+I costruttori si registrano con @schermata in handlers.py e vengono eseguiti
+nel pool DB (possono leggere i testi con database.get_text); tutte le schermate
+sono pre-costruite all'avvio e ricostruite quando cambia la tabella testi.
+"""
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+LINGUE = ("it", "en", "de")
+
+# id schermata -> (costruttore, parametri da pre-costruire)
+_costruttori: Dict[str, Tuple[Callable, Callable[[], Iterable[tuple]]]] = {}
+
+_cache = {
+    "versione": 0,       # incrementata quando cambiano i testi
+    "voci": {}           # (id, lingua, parametri) -> (testo, tastiera)
+}
+_stats = {"hits": 0, "misses": 0, "costruzioni": 0, "ultimo_ms": 0.0}
+
+
+def schermata(schermata_id: str, parametri: Callable[[], Iterable[tuple]] = lambda: [()]):
+    """
+    Decoratore: registra il costruttore di una schermata.
+    Il costruttore riceve (lingua, *parametri) e ritorna (testo, tastiera) o None.
+    """
+    def registra(costruttore):
+        _costruttori[schermata_id] = (costruttore, parametri)
+        return costruttore
+    return registra
+
+
+def get(schermata_id: str, lingua: str, *parametri) -> Optional[tuple]:
+    """Schermata in cache (None se non ancora costruita per questa versione dei testi)"""
+    voce = _cache["voci"].get((schermata_id, lingua, parametri))
+    if voce is None:
+        _stats["misses"] += 1
+    else:
+        _stats["hits"] += 1
+    return voce
+
+
+def costruisci_voce(schermata_id: str, lingua: str, *parametri) -> Optional[tuple]:
+    """Costruisce e salva una schermata (nel pool DB: il costruttore può leggere i testi)"""
+    versione = _cache["versione"]
+    voci = _cache["voci"]
+    voce = _costruttori[schermata_id][0](lingua, *parametri)
+    # Se i testi sono cambiati durante la costruzione la voce non si salva
+    if voce is not None and versione == _cache["versione"]:
+        voci[(schermata_id, lingua, parametri)] = voce
+    return voce
+
+
+def costruisci() -> int:
+    """Pre-costruisce tutte le schermate registrate in tutte le lingue"""
+    t0 = time.perf_counter()
+    n = 0
+    for schermata_id, (_, parametri) in _costruttori.items():
+        for lingua in LINGUE:
+            for p in parametri():
+                try:
+                    if costruisci_voce(schermata_id, lingua, *p) is not None:
+                        n += 1
+                except Exception as e:
+                    logger.error(f"Errore costruzione schermata {schermata_id}/{lingua}{p}: {e}")
+    _stats["costruzioni"] += 1
+    _stats["ultimo_ms"] = (time.perf_counter() - t0) * 1000
+    logger.info(f"Schermate pre-costruite: {n} in {_stats['ultimo_ms']:.0f}ms")
+    return n
+
+
+def invalida():
+    """Testi cambiati: scarta tutte le schermate (nuova versione)"""
+    _cache["versione"] += 1
+    _cache["voci"] = {}
+
+
+def get_stats() -> dict:
+    totale = _stats["hits"] + _stats["misses"]
+    return dict(
+        _stats,
+        voci=len(_cache["voci"]),
+        versione=_cache["versione"],
+        hit_rate=(_stats["hits"] / totale * 100) if totale else 0.0
+    )
@@ -0,0 +1,182 @@
+"""
+Statistiche admin in memoria (/stats)
+
+Contatori tenuti dal processo, senza query al database sul percorso di /stats:
+- nuovi utenti e onboarding completati dall'ultima riconciliazione, sommati ai
+  totali letti dal database con una query aggregata (job periodico in main.py,
+  database.get_stats)
+- chat attive: HyperLogLog (1 KB, errore ~3%) per fascia di 10 minuti e per ora;
+  le finestre 1h/24h/7d sono l'unione (max dei registri) delle fasce, con le ore
+  già concluse unite una volta sola per ora
+- eventi mostrati agli utenti
+
+Le finestre di attività coprono solo il tempo dall'avvio del processo; gli attivi
+a 7 giorni "ufficiali" restano quelli del database (updated_at).
+"""
+import hashlib
+import logging
+import math
+import time
+from typing import Optional, Dict
+
+logger = logging.getLogger(__name__)
+
+# Precisione HyperLogLog: 2^10 registri (1 KB), errore standard ~1.04/sqrt(1024) = 3.2%
+HLL_PRECISIONE = 10
+
+FASCIA_BREVE = 600    # 10 minuti, per la finestra di 1 ora
+FASCIA_LUNGA = 3600   # 1 ora, per le finestre di 24 ore e 7 giorni
+ORE_MAX = 7 * 24
+
+
+class HyperLogLog:
+    """Stima del numero di elementi distinti in memoria costante"""
+
+    def __init__(self, precisione: int = HLL_PRECISIONE):
+        self.precisione = precisione
+        self.m = 1 << precisione
+        self.registri = bytearray(self.m)
+
+    def add(self, valore) -> None:
+        h = int.from_bytes(hashlib.blake2b(str(valore).encode(), digest_size=8).digest(), "big")
+        indice = h >> (64 - self.precisione)
+        resto = h & ((1 << (64 - self.precisione)) - 1)
+        rango = (64 - self.precisione) - resto.bit_length() + 1
+        if rango > self.registri[indice]:
+            self.registri[indice] = rango
+
+    def merge(self, altro: "HyperLogLog") -> "HyperLogLog":
+        """Nuovo HyperLogLog unione dei due"""
+        unione = HyperLogLog(self.precisione)
+        unione.registri = bytearray(map(max, self.registri, altro.registri))
+        return unione
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        stima = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registri)
+        zeri = self.registri.count(0)
+        if stima <= 2.5 * self.m and zeri:
+            # Correzione per cardinalità piccole (linear counting)
+            stima = self.m * math.log(self.m / zeri)
+        return int(round(stima))
+
+
+_contatori = {
+    "nuovi_utenti": 0,            # dall'avvio
+    "onboarding_completati": 0,   # dall'avvio
+    "eventi_serviti": 0,          # dall'avvio
+    "update": 0                   # dall'avvio
+}
+# Delta dall'ultima riconciliazione, sommati ai totali del database
+_delta = {"utenti_totali": 0, "utenti_completi": 0}
+_database: Optional[dict] = None       # ultimi conteggi letti dal database
+_riconciliato_at = 0.0
+
+_fasce_brevi: Dict[int, HyperLogLog] = {}   # fascia 10 minuti -> chat attive
+_fasce_ore: Dict[int, HyperLogLog] = {}     # ora -> chat attive
+_unioni: Dict[int, tuple] = {}              # ore finestra -> (ora corrente, unione ore concluse)
+
+
+def registra_attivita(chat_id: int) -> None:
+    """Update ricevuto da una chat (chiamato per ogni update non duplicato)"""
+    adesso = time.time()
+    breve = int(adesso // FASCIA_BREVE)
+    ora = int(adesso // FASCIA_LUNGA)
+
+    hll = _fasce_brevi.get(breve)
+    if hll is None:
+        hll = _fasce_brevi[breve] = HyperLogLog()
+        for vecchia in [f for f in _fasce_brevi if f < breve - FASCIA_LUNGA // FASCIA_BREVE]:
+            del _fasce_brevi[vecchia]
+    hll.add(chat_id)
+
+    hll = _fasce_ore.get(ora)
+    if hll is None:
+        hll = _fasce_ore[ora] = HyperLogLog()
+        for vecchia in [o for o in _fasce_ore if o <= ora - ORE_MAX]:
+            del _fasce_ore[vecchia]
+    hll.add(chat_id)
+
+    _contatori["update"] += 1
+
+
+def registra_nuovo_utente() -> None:
+    _contatori["nuovi_utenti"] += 1
+    _delta["utenti_totali"] += 1
+
+
+def registra_onboarding_completato() -> None:
+    _contatori["onboarding_completati"] += 1
+    _delta["utenti_completi"] += 1
+
+
+def registra_eventi_serviti(n: int = 1) -> None:
+    _contatori["eventi_serviti"] += n
+
+
+def _attivi_ore(ore: int) -> int:
+    """Chat distinte nelle ultime `ore` fasce orarie (inclusa quella in corso)"""
+    ora = int(time.time() // FASCIA_LUNGA)
+    cache = _unioni.get(ore)
+    if cache is None or cache[0] != ora:
+        # Ore concluse della finestra: unite una volta per ora
+        unione = HyperLogLog()
+        for o in range(ora - ore + 1, ora):
+            if o in _fasce_ore:
+                unione = unione.merge(_fasce_ore[o])
+        cache = _unioni[ore] = (ora, unione)
+    corrente = _fasce_ore.get(ora)
+    return (cache[1].merge(corrente) if corrente else cache[1]).count()
+
+
+def _attivi_ultima_ora() -> int:
+    breve = int(time.time() // FASCIA_BREVE)
+    unione = HyperLogLog()
+    for f in range(breve - FASCIA_LUNGA // FASCIA_BREVE + 1, breve + 1):
+        if f in _fasce_brevi:
+            unione = unione.merge(_fasce_brevi[f])
+    return unione.count()
+
+
+def delta_corrente() -> dict:
+    """Delta da passare a riconcilia(), letti prima di lanciare la query"""
+    return dict(_delta)
+
+
+def riconcilia(stats: dict, delta: dict) -> None:
+    """
+    Sostituisce i conteggi con quelli appena letti dal database (database.get_stats)
+    e toglie dai delta quelli già presenti prima della query: gli utenti registrati
+    mentre la query era in corso restano nei delta.
+    """
+    global _database, _riconciliato_at
+    for chiave, valore in delta.items():
+        _delta[chiave] -= valore
+    _database = stats
+    _riconciliato_at = time.time()
+    logger.debug(f"Statistiche riconciliate: {stats}")
+
+
+def is_ready() -> bool:
+    return _database is not None
+
+
+def snapshot() -> dict:
+    """Statistiche per /stats, senza query al database"""
+    import eventi_index
+    from datetime import date
+
+    stats = dict(_database or {})
+    stats["utenti_totali"] = stats.get("utenti_totali", 0) + _delta["utenti_totali"]
+    stats["utenti_completi"] = stats.get("utenti_completi", 0) + _delta["utenti_completi"]
+    if eventi_index.is_loaded():
+        oggi = date.today().isoformat()
+        stats["eventi_totali"] = eventi_index.get_stats()["totali"]
+        stats["eventi_attivi"] = eventi_index.conta(oggi, oggi)
+
+    stats.update(_contatori)
+    stats["attivi_1h"] = _attivi_ultima_ora()
+    stats["attivi_24h"] = _attivi_ore(24)
+    stats["attivi_7d"] = _attivi_ore(ORE_MAX)
+    stats["riconciliato_at"] = _riconciliato_at
+    return stats
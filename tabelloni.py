@@ -0,0 +1,148 @@
+"""
+Tabelloni partenze pre-calcolati, aggiornati ogni minuto (job in main.py)
+
+Per ogni (fermata, linea, direzione, lingua) delle linee bus tiene le prossime
+partenze a partire dal minuto corrente, già formattate (etichetta "domani"
+localizzata), e per ogni (zona, destinazione, linea) i prossimi percorsi del
+journey planner. I handler dei trasporti leggono da qui con un lookup su dict,
+senza strptime/pytz/timedelta per riga; se il tabellone non è del minuto
+corrente o non copre l'orario richiesto tornano al calcolo diretto.
+"""
+import bisect
+import logging
+import time
+from typing import Optional, Dict, List
+
+import orari_index
+import percorsi
+from config import TABELLONI_PARTENZE
+
+logger = logging.getLogger(__name__)
+
+LINGUE = ("it", "en", "de")
+DOMANI = {"it": "domani", "en": "tomorrow", "de": "morgen"}
+
+# Percorsi pre-calcolati per (zona, destinazione, linea bus)
+PERCORSI_PER_TABELLONE = 3
+
+_tabelloni = {
+    "minuto": -1,        # minuti epoch di generazione (time.time() // 60)
+    "inizio": 0,         # minuti dalla mezzanotte (ora di Roma) di generazione
+    "partenze": {},      # (fermata, linea, direzione, lingua) -> [{ora, etichetta, minuti, domani}]
+    "percorsi": {}       # (origine, destinazione, linea) -> risultati percorsi.prossimi_percorsi
+}
+_stats = {"generazioni": 0, "ultimo_ms": 0.0, "totale_ms": 0.0, "max_ms": 0.0}
+
+
+def _prossime(minuti: List[int], righe: List[dict], inizio: int, n: int) -> List[tuple]:
+    """Prossime n corse da `inizio`: prima quelle di oggi, poi le prime di domani"""
+    i = bisect.bisect_left(minuti, inizio)
+    voci = [(minuti[k], righe[k], False) for k in range(i, min(i + n, len(minuti)))]
+    for k in range(min(n - len(voci), len(minuti))):
+        voci.append((minuti[k] + 24 * 60, righe[k], True))
+    return voci
+
+
+def genera() -> bool:
+    """Rigenera tutti i tabelloni per il minuto corrente. False se gli orari non sono caricati."""
+    global _tabelloni
+    from datetime import datetime
+    import pytz
+
+    indice, _ = orari_index.get_snapshot()
+    if not indice["loaded_at"]:
+        return False
+
+    t0 = time.perf_counter()
+    now = datetime.now(pytz.timezone("Europe/Rome"))
+    inizio = now.hour * 60 + now.minute
+
+    partenze = {}
+    for (linea, fermata, direzione, tipo_giorno), (minuti, righe) in indice["per_tipo"].items():
+        # Come get_prossimi_orari_bus: solo corse "fF" delle linee bus
+        if linea not in percorsi.LINEE_BUS or tipo_giorno != "fF":
+            continue
+        voci = _prossime(minuti, righe, inizio, TABELLONI_PARTENZE)
+        for lingua in LINGUE:
+            partenze[(fermata, linea, direzione, lingua)] = [
+                {
+                    "ora": riga["ora"],
+                    "etichetta": f"{riga['ora']} ({DOMANI[lingua]})" if domani else riga["ora"],
+                    "minuti": m,
+                    "domani": domani
+                }
+                for m, riga, domani in voci
+            ]
+
+    percorsi_correnti = {}
+    for origine in set(percorsi.ZONA_FERMATA.values()):
+        for destinazione in percorsi.DESTINAZIONE_FERMATA.values():
+            for linea in percorsi.LINEE_BUS:
+                percorsi_correnti[(origine, destinazione, linea)] = percorsi.prossimi_percorsi(
+                    origine, destinazione, now.strftime("%H:%M"), PERCORSI_PER_TABELLONE,
+                    giorno=now.date(), linea_bus=linea
+                )
+
+    _tabelloni = {
+        "minuto": int(time.time() // 60),
+        "inizio": inizio,
+        "partenze": partenze,
+        "percorsi": percorsi_correnti
+    }
+
+    durata_ms = (time.perf_counter() - t0) * 1000
+    _stats["generazioni"] += 1
+    _stats["ultimo_ms"] = durata_ms
+    _stats["totale_ms"] += durata_ms
+    _stats["max_ms"] = max(_stats["max_ms"], durata_ms)
+    logger.debug(f"Tabelloni generati: {len(partenze)} partenze, {len(percorsi_correnti)} percorsi in {durata_ms:.1f}ms")
+    return True
+
+
+def _corrente() -> Optional[dict]:
+    """Tabelloni del minuto corrente (None se non aggiornati)"""
+    tabelloni = _tabelloni
+    if tabelloni["minuto"] != int(time.time() // 60):
+        return None
+    return tabelloni
+
+
+def get_partenze(fermata: str, linea: str, direzione: str, lingua: str,
+                 n: int = 3, offset_minuti: int = 0) -> Optional[List[dict]]:
+    """
+    Prossime n partenze da una fermata, da adesso + offset_minuti.
+    None se il tabellone non è aggiornato o non copre l'orario richiesto.
+    """
+    tabelloni = _corrente()
+    if tabelloni is None:
+        return None
+
+    voci = tabelloni["partenze"].get((fermata, linea, direzione, lingua if lingua in LINGUE else "it"))
+    if voci is None:
+        return None
+
+    inizio = tabelloni["inizio"] + max(0, offset_minuti)
+    risultato = [v for v in voci if v["minuti"] >= inizio][:n]
+    if len(risultato) < n and len(voci) >= TABELLONI_PARTENZE:
+        return None  # Orario oltre la finestra del tabellone
+    return risultato
+
+
+def get_percorsi(origine: str, destinazione: str, linea: str, n: int = 3) -> Optional[List[dict]]:
+    """Prossimi percorsi da adesso (None se non pre-calcolati per il minuto corrente)"""
+    tabelloni = _corrente()
+    if tabelloni is None or n > PERCORSI_PER_TABELLONE:
+        return None
+    risultati = tabelloni["percorsi"].get((origine, destinazione, linea))
+    return risultati[:n] if risultati is not None else None
+
+
+def get_stats() -> dict:
+    n = _stats["generazioni"]
+    return {
+        "generazioni": n,
+        "ultimo_ms": _stats["ultimo_ms"],
+        "medio_ms": _stats["totale_ms"] / n if n else 0.0,
+        "max_ms": _stats["max_ms"],
+        "voci": len(_tabelloni["partenze"])
+    }